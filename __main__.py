@@ -1,3 +1,3 @@
-from people_api import run
+from people_api.cli import main
 
-run()
+main()
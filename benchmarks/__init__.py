@@ -0,0 +1,4 @@
+"""BENCHMARKS
+Performance benchmarks of the API. They use an in-process Mongo stand-in (mongomock), so they do not require
+a running Mongo server
+"""
@@ -0,0 +1,111 @@
+"""BENCHMARKS - MAIN
+Run the benchmark suites, printing the results, and optionally saving them as JSON, to compare them with the results
+of other commits (see benchmarks.compare).
+- models: validation and serialization of the Person models
+- repository: PeopleRepository operations, for each collection size
+- api: requests sent to the FastAPI app through an in-process ASGI transport, for each collection size
+- startup: cold start of the API on new processes (import time, app startup and time to first request)
+
+Usage: python -m benchmarks [--suites models repository api startup] [--sizes 1000 10000 100000 1000000]
+                            [--storage memory mongomock] [--output FILE]
+The repositories use the in-memory storage engine, or an in-process Mongo stand-in (mongomock). The stand-in does
+not use indexes, so its queries on large collections are dominated by its own cost (measured by the repository
+suite as collection.* benchmarks)
+"""
+
+# # Native # #
+import sys
+import json
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+from typing import Optional, Iterator, List
+
+# # Installed # #
+import fastapi
+import pydantic
+import pymongo
+import mongomock
+
+# # Package # #
+from . import models, repository, api, startup
+from .measure import Result
+from .dataset import populate, STORAGES
+
+SUITES = ("models", "repository", "api", "startup")
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(("git", *args), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(options: argparse.Namespace) -> dict:
+    """Information about the environment of the run, so results from different runs can be told apart"""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": {
+            module.__name__: getattr(module, "__version__", None)
+            for module in (fastapi, pydantic, pymongo, mongomock)
+        },
+        "options": vars(options)
+    }
+
+
+def run(options: argparse.Namespace) -> Iterator[Result]:
+    if "models" in options.suites:
+        yield from models.run(options)
+    if "startup" in options.suites:
+        yield from startup.run(options)
+
+    sized_suites = [suite for suite in (repository, api) if suite.SUITE in options.suites]
+    if not sized_suites:
+        return
+    for storage in options.storage:
+        for size in options.sizes:
+            print(f"Populating {size} persons ({storage})...", file=sys.stderr)
+            dataset = populate(size, seed=options.seed, storage=storage)
+            for suite in sized_suites:
+                yield from suite.run(options, dataset)
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000], help="collection sizes")
+    parser.add_argument("--storage", nargs="+", choices=STORAGES, default=["memory"], help="storage engines")
+    parser.add_argument("--page-size", type=int, default=100, help="limit of the listed pages")
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimum time (seconds) to run each benchmark")
+    parser.add_argument("--max-samples", type=int, default=10000, help="maximum calls of each benchmark")
+    parser.add_argument("--startup-runs", type=int, default=5, help="processes started by the startup suite")
+    parser.add_argument(
+        "--startup-snapshot-size", type=int, default=1000, help="persons loaded on startup by the startup suite"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated data")
+    parser.add_argument("--output", help="JSON file where the results are saved")
+    options = parser.parse_args(args)
+
+    results = list()
+    for result in run(options):
+        print(result.format())
+        results.append(result)
+
+    if options.output:
+        with open(options.output, "w") as file:
+            data = {"metadata": metadata(options), "results": [result._asdict() for result in results]}
+            json.dump(data, file, indent=2)
+        print(f"Results saved to {options.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
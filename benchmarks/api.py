@@ -0,0 +1,89 @@
+"""BENCHMARKS - API
+End-to-end benchmarks of the API requests, sent to the FastAPI app through an in-process ASGI transport
+(no server nor sockets involved), on the populated in-process collection
+"""
+
+# # Native # #
+import asyncio
+from argparse import Namespace
+from typing import Iterator, List
+
+# # Installed # #
+import httpx
+from fastapi import status as statuscode
+
+# # Project # #
+from people_api import app
+
+# # Package # #
+from .measure import Result, measure_async
+from .dataset import Dataset, person_payload
+
+__all__ = ("run",)
+
+SUITE = "api"
+
+
+async def _expect(request, status_code: int) -> httpx.Response:
+    """Await the request, failing if the response status is not the expected (so errors are not benchmarked)"""
+    response = await request
+    if response.status_code != status_code:
+        raise AssertionError(f"{response.request.method} {response.request.url} returned {response.status_code}")
+    return response
+
+
+async def _run(options: Namespace, dataset: Dataset) -> List[Result]:
+    results = list()
+    limit = options.page_size
+    created = list()
+    transport = httpx.ASGITransport(app=app)
+
+    # Responses are not compressed, unless requested by the benchmark
+    headers = {"Accept-Encoding": "identity"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers=headers) as client:
+        person_id = dataset.person_ids[0]
+        etag = (await _expect(client.get(f"/people/{person_id}"), statuscode.HTTP_200_OK)).headers["ETag"]
+
+        async def create(payload):
+            response = await _expect(client.post("/people", json=payload), statuscode.HTTP_201_CREATED)
+            created.append(response.json()["person_id"])
+
+        benchmarks = (
+            ("get", lambda pid: _expect(client.get(f"/people/{pid}"), statuscode.HTTP_200_OK),
+             dataset.random_person_id),
+            ("get.not_modified", lambda: _expect(
+                client.get(f"/people/{person_id}", headers={"If-None-Match": etag}), statuscode.HTTP_304_NOT_MODIFIED
+            ), None),
+            ("list.page", lambda: _expect(
+                client.get("/people", params={"limit": limit}), statuscode.HTTP_200_OK
+            ), None),
+            ("list.page.gzip", lambda: _expect(
+                client.get("/people", params={"limit": limit}, headers={"Accept-Encoding": "gzip"}),
+                statuscode.HTTP_200_OK
+            ), None),
+            ("list.page.fields", lambda: _expect(
+                client.get("/people", params={"limit": limit, "fields": "name,age"}), statuscode.HTTP_200_OK
+            ), None),
+            ("search.prefix", lambda: _expect(
+                client.get("/people/search", params={"q": "person 0001", "mode": "prefix", "limit": 10}),
+                statuscode.HTTP_200_OK
+            ), None),
+            ("create", create, lambda: person_payload(dataset.rng, dataset.size)),
+            ("update", lambda pid: _expect(
+                client.patch(f"/people/{pid}", json={"name": f"Person {dataset.rng.randrange(dataset.size)}"}),
+                statuscode.HTTP_204_NO_CONTENT
+            ), dataset.random_person_id),
+        )
+        for name, operation, setup in benchmarks:
+            results.append(await measure_async(
+                SUITE, name, operation, setup=setup, params={**dataset.params, "page_size": limit},
+                min_time=options.min_time, max_samples=options.max_samples
+            ))
+
+    # Keep the size of the collection for the next benchmarks
+    dataset.collection.delete_many({"_id": {"$in": created}})
+    return results
+
+
+def run(options: Namespace, dataset: Dataset) -> Iterator[Result]:
+    yield from asyncio.run(_run(options, dataset))
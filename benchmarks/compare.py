@@ -0,0 +1,60 @@
+"""BENCHMARKS - COMPARE
+Compare the results of two benchmark runs (JSON files saved by `python -m benchmarks --output FILE`), by the median
+time of each benchmark present in both. Exits with status 1 if any benchmark is slower than the threshold.
+
+Usage: python -m benchmarks.compare BASELINE CURRENT [--threshold 0.1]
+"""
+
+# # Native # #
+import sys
+import json
+import argparse
+from typing import Optional, Dict, List
+
+# # Package # #
+from .measure import Result
+
+
+def load(path: str) -> Dict[str, Result]:
+    with open(path) as file:
+        data = json.load(file)
+    results = (Result(**result) for result in data["results"])
+    return {result.key: result for result in results}
+
+
+def compare(baseline: Dict[str, Result], current: Dict[str, Result], threshold: float) -> List[str]:
+    """Print the comparison of the common benchmarks, returning the keys of the ones that regressed"""
+    regressions = list()
+    for key in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[key].median, current[key].median
+        change = after / before - 1 if before else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  REGRESSION"
+            regressions.append(key)
+        elif change < -threshold:
+            mark = "  improvement"
+        print(f"{key}: {before * 1e6:.1f}us -> {after * 1e6:.1f}us ({change:+.1%}){mark}")
+
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f"{key}: only in {'baseline' if key in baseline else 'current'}")
+    return regressions
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.compare", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("baseline", help="JSON results of the reference run")
+    parser.add_argument("current", help="JSON results to compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown considered a regression")
+    options = parser.parse_args(args)
+
+    regressions = compare(load(options.baseline), load(options.current), options.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed more than {options.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""BENCHMARKS - DATASET
+Generation of deterministic persons, and population of the in-process collection used by the repositories:
+the in-memory storage engine, or an in-process Mongo stand-in (mongomock)
+"""
+
+# # Native # #
+import uuid
+import random
+from datetime import date, timedelta
+from typing import List
+
+# # Installed # #
+import mongomock
+from mongomock_motor import AsyncMongoMockClient
+
+# # Project # #
+from people_api import repositories
+from people_api.models import PersonCreate
+from people_api.models.indexes import PEOPLE_INDEXES
+from people_api.storage import MemoryCollection, AsyncMemoryCollection
+from people_api.utils import get_search_fields
+
+__all__ = ("Dataset", "person_payload", "populate", "STORAGES")
+
+STORAGES = ("memory", "mongomock")
+
+CITIES = 50
+"""Number of distinct cities of the generated persons (filtering by city matches size/CITIES persons)"""
+_CREATED_START = 1600000000
+_BIRTH_START = date(1940, 1, 1)
+
+
+def person_payload(rng: random.Random, index: int) -> dict:
+    """Body of a PersonCreate, with deterministic values given the random generator state"""
+    return {
+        "name": f"Person {index:07d}",
+        "address": {
+            "street": f"{rng.randint(1, 999)} Main Street",
+            "city": f"City {rng.randrange(CITIES)}",
+            "state": f"State {rng.randrange(10)}",
+            "zip_code": str(rng.randint(10000, 99999))
+        },
+        "birth": (_BIRTH_START + timedelta(days=rng.randrange(365 * 80))).isoformat()
+    }
+
+
+class Dataset:
+    """Persons inserted on the in-process Mongo collection used by the repositories"""
+    def __init__(self, size: int, seed: int, storage: str):
+        self.size = size
+        self.storage = storage
+        self.rng = random.Random(seed)
+        self.person_ids: List[str] = list()
+        if storage == "memory":
+            self.collection = MemoryCollection()
+            self.async_collection = AsyncMemoryCollection(self.collection)
+        else:
+            client = mongomock.MongoClient()
+            self.collection = client["benchmark"]["people"]
+            self.async_collection = AsyncMongoMockClient(mock_mongo_client=client)["benchmark"]["people"]
+
+    @property
+    def params(self) -> dict:
+        """Parameters of the benchmarks run on this dataset"""
+        return {"size": self.size, "storage": self.storage}
+
+    def random_person_id(self) -> str:
+        return self.rng.choice(self.person_ids)
+
+    def new_person_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def document(self, index: int) -> dict:
+        """Document of a new person, as written by the repositories"""
+        document = PersonCreate(**person_payload(self.rng, index)).dict()
+        document["created"] = document["updated"] = _CREATED_START + index
+        document["_id"] = self.new_person_id()
+        document["version"] = 1
+        document["search"] = get_search_fields(document["name"], document["address"]["city"])
+        return document
+
+    def insert(self) -> str:
+        """Insert a new person, returning its id"""
+        document = self.document(self.size + self.rng.randrange(self.size))
+        self.collection.insert_one(document)
+        return document["_id"]
+
+
+def populate(size: int, seed: int = 0, storage: str = "memory", batch_size: int = 10000) -> Dataset:
+    """Insert the given number of persons on a new in-process collection of the given storage, and set it as the
+    collection used by the (sync and async) repositories. The same seed always generates the same persons"""
+    dataset = Dataset(size, seed, storage)
+    dataset.collection.create_indexes(PEOPLE_INDEXES)
+    for start in range(0, size, batch_size):
+        documents = [dataset.document(index) for index in range(start, min(size, start + batch_size))]
+        dataset.collection.insert_many(documents)
+        dataset.person_ids.extend(document["_id"] for document in documents)
+
+    repositories.collection = dataset.collection
+    repositories.async_collection = dataset.async_collection
+    return dataset
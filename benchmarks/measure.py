@@ -0,0 +1,109 @@
+"""BENCHMARKS - MEASURE
+Timing of the benchmarked operations, and the results of the benchmarks
+"""
+
+# # Native # #
+import statistics
+from time import perf_counter
+from typing import Callable, Awaitable, Optional, Dict, NamedTuple, List, Any
+
+__all__ = ("Result", "measure", "measure_async", "summarize")
+
+Setup = Optional[Callable[[], Any]]
+"""Function called (untimed) before each call to the benchmarked operation, which is given its return value"""
+
+
+class Result(NamedTuple):
+    """Result of a benchmark. Times are given in seconds per operation"""
+    suite: str
+    name: str
+    params: Dict[str, Any]
+    samples: int
+    min: float
+    median: float
+    mean: float
+    p95: float
+    ops_per_second: float
+
+    @property
+    def key(self) -> str:
+        """Identifier of the benchmark, used to compare the results of different runs"""
+        params = ",".join(f"{key}={value}" for key, value in sorted(self.params.items()))
+        return f"{self.suite}.{self.name}[{params}]"
+
+    def format(self) -> str:
+        return (f"{self.key}: median {self.median * 1e6:.1f}us, min {self.min * 1e6:.1f}us, "
+                f"p95 {self.p95 * 1e6:.1f}us ({self.ops_per_second:.0f} ops/s, {self.samples} samples)")
+
+
+class _Timer:
+    """Collect the time of each call, until the minimum time and samples are reached"""
+    def __init__(self, min_time: float, min_samples: int, max_samples: int):
+        self.min_time = min_time
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.times: List[float] = list()
+        self.total = 0.0
+
+    @property
+    def done(self) -> bool:
+        samples = len(self.times)
+        return samples >= self.max_samples or (samples >= self.min_samples and self.total >= self.min_time)
+
+    def add(self, elapsed: float):
+        self.times.append(elapsed)
+        self.total += elapsed
+
+    def result(self, suite: str, name: str, params: Optional[Dict[str, Any]]) -> Result:
+        return summarize(suite, name, self.times, params)
+
+
+def summarize(suite: str, name: str, times: List[float], params: Optional[Dict[str, Any]] = None) -> Result:
+    """Build the result of a benchmark from the time of each call (for operations timed by themselves, like the ones
+    run on other processes)"""
+    times = sorted(times)
+    mean = statistics.mean(times)
+    return Result(
+        suite=suite, name=name, params=params or dict(), samples=len(times),
+        min=times[0], median=statistics.median(times), mean=mean,
+        p95=times[min(len(times) - 1, int(len(times) * 0.95))],
+        ops_per_second=1 / mean if mean else 0
+    )
+
+
+def measure(
+        suite: str, name: str, operation: Callable, setup: Setup = None, params: Optional[Dict[str, Any]] = None,
+        min_time: float = 0.5, min_samples: int = 3, max_samples: int = 10000, warmup: int = 3
+) -> Result:
+    """Time the calls to the given operation, until it ran for min_time seconds (and at least min_samples times).
+    If a setup function is given, the operation is called with its result"""
+    timer = _Timer(min_time, min_samples, max_samples)
+    for call in range(warmup + max_samples):
+        argument = setup() if setup else None
+        start = perf_counter()
+        operation(argument) if setup else operation()
+        elapsed = perf_counter() - start
+        if call >= warmup:
+            timer.add(elapsed)
+            if timer.done:
+                break
+    return timer.result(suite, name, params)
+
+
+async def measure_async(
+        suite: str, name: str, operation: Callable[..., Awaitable], setup: Setup = None,
+        params: Optional[Dict[str, Any]] = None,
+        min_time: float = 0.5, min_samples: int = 3, max_samples: int = 10000, warmup: int = 3
+) -> Result:
+    """Same as measure, for coroutine functions (the operation is awaited)"""
+    timer = _Timer(min_time, min_samples, max_samples)
+    for call in range(warmup + max_samples):
+        argument = setup() if setup else None
+        start = perf_counter()
+        await (operation(argument) if setup else operation())
+        elapsed = perf_counter() - start
+        if call >= warmup:
+            timer.add(elapsed)
+            if timer.done:
+                break
+    return timer.result(suite, name, params)
@@ -0,0 +1,47 @@
+"""BENCHMARKS - MODELS
+Micro-benchmarks of the validation and serialization of the Person models
+"""
+
+# # Native # #
+import random
+from argparse import Namespace
+from typing import Iterator
+
+# # Project # #
+from people_api.models import PersonCreate, PersonRead, PersonPartialRead
+
+# # Package # #
+from .measure import Result, measure
+from .dataset import person_payload
+
+__all__ = ("run",)
+
+SUITE = "models"
+
+
+def run(options: Namespace) -> Iterator[Result]:
+    rng = random.Random(options.seed)
+    payload = person_payload(rng, 0)
+    create = PersonCreate(**payload)
+    document = {
+        **create.dict(), "_id": "00000000-0000-4000-8000-000000000000",
+        "created": 1600000000, "updated": 1600000000, "version": 1
+    }
+    read = PersonRead(**document)
+    partial_document = {"name": document["name"], "updated": document["updated"], "version": document["version"]}
+
+    benchmarks = (
+        ("PersonCreate.validate", lambda: PersonCreate(**payload)),
+        ("PersonCreate.dict", create.dict),
+        ("PersonRead.validate", lambda: PersonRead(**document)),
+        ("PersonRead.construct_from_document", lambda: PersonRead.construct_from_document(document)),
+        ("PersonRead.dict", read.dict),
+        ("PersonRead.json", read.json),
+        ("PersonPartialRead.construct_from_document",
+         lambda: PersonPartialRead.construct_from_document(partial_document)),
+    )
+    for name, operation in benchmarks:
+        yield measure(
+            SUITE, name, operation,
+            min_time=options.min_time, max_samples=options.max_samples
+        )
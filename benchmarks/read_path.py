@@ -0,0 +1,96 @@
+"""BENCHMARK - READ PATH
+Compare the per-document cost of PeopleRepository.list() plus the response serialization, between:
+- before: validating the documents (PersonRead(**document)), and letting FastAPI validate and encode the result
+  against the response_model
+- after: building the trusted models without validation, and encoding them with FastJSONResponse (orjson)
+The time spent by the Mongo stand-in fetching the documents is measured separately and subtracted.
+
+Usage: python -m benchmarks.read_path [--documents N] [--rounds N]
+"""
+
+# # Native # #
+import asyncio
+import argparse
+from time import perf_counter
+from typing import Callable
+
+# # Installed # #
+import mongomock
+from fastapi.routing import APIRoute, serialize_response
+from fastapi.responses import JSONResponse
+
+# # Project # #
+from people_api import app, repositories
+from people_api.models import PersonCreate
+from people_api.repositories import PeopleRepository
+from people_api.responses import FastJSONResponse
+from people_api.settings import mongo_settings
+
+
+def populate(documents: int):
+    repositories.collection = mongomock.MongoClient()["benchmark"]["people"]
+    creates = [
+        PersonCreate(
+            name=f"Person {i}",
+            address=dict(street=f"{i} Main Street", city="Hamburg", state="Mordor", zip_code=str(10000 + i)),
+            birth="1990-01-01"
+        )
+        for i in range(documents)
+    ]
+    PeopleRepository.create_many(creates)
+
+
+def measure(function: Callable, rounds: int) -> float:
+    """Return the best time (seconds) of running the function the given number of rounds"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def fetch_only():
+    """Fetch the documents the same way PeopleRepository.list() does (sorted by creation time)"""
+    list(repositories.collection.find(sort=[("created", 1), ("_id", 1)]))
+
+
+def read_before():
+    mongo_settings.validate_reads = True
+    page = PeopleRepository.list()
+    content = asyncio.run(serialize_response(field=list_route.response_field, response_content=page))
+    JSONResponse(content)
+
+
+def read_after():
+    mongo_settings.validate_reads = False
+    page = PeopleRepository.list()
+    FastJSONResponse(page)
+
+
+list_route = next(r for r in app.routes if isinstance(r, APIRoute) and r.path == "/people" and "GET" in r.methods)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    populate(args.documents)
+    fetch = measure(fetch_only, args.rounds)
+    before = measure(read_before, args.rounds) - fetch
+    after = measure(read_after, args.rounds) - fetch
+
+    per_document = 1e6 / args.documents
+    print(
+        f"Documents: {args.documents} "
+        f"(best of {args.rounds} rounds, excluding {fetch * per_document:.1f}us/doc fetch)"
+    )
+    print(f"Before (validate + response_model + json): {before * per_document:.1f}us/doc")
+    print(f"After (construct + orjson): {after * per_document:.1f}us/doc")
+    print(f"Speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
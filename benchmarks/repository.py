@@ -0,0 +1,63 @@
+"""BENCHMARKS - REPOSITORY
+Benchmarks of the PeopleRepository operations, on the populated in-process collection.
+The raw queries on the collection (collection.*) are measured too, as reference of the time spent by the storage
+itself (the Mongo stand-in is not representative of a real Mongo server, as it does not use indexes)
+"""
+
+# # Native # #
+from argparse import Namespace
+from typing import Iterator
+
+# # Installed # #
+from pymongo import ASCENDING
+
+# # Project # #
+from people_api.models import PersonCreate, PersonUpdate, PersonField, PeopleFilters, PeopleSort, PeopleSearchMode
+from people_api.repositories import PeopleRepository
+
+# # Package # #
+from .measure import Result, measure
+from .dataset import Dataset, person_payload
+
+__all__ = ("run",)
+
+SUITE = "repository"
+
+
+def run(options: Namespace, dataset: Dataset) -> Iterator[Result]:
+    collection = dataset.collection
+    limit = options.page_size
+    fields = {PersonField.name, PersonField.age}
+    sorting = [(PeopleSort.created.value, ASCENDING), ("_id", ASCENDING)]
+    next_cursor = PeopleRepository.list(limit=limit).next_cursor
+    city_filters = PeopleFilters(city="City 1")
+    created = list()
+
+    benchmarks = (
+        ("collection.find_one", lambda person_id: collection.find_one({"_id": person_id}), dataset.random_person_id),
+        ("get", PeopleRepository.get, dataset.random_person_id),
+        ("get.fields", lambda person_id: PeopleRepository.get(person_id, fields), dataset.random_person_id),
+        ("get_revision", PeopleRepository.get_revision, dataset.random_person_id),
+        ("collection.find.page", lambda: list(collection.find(sort=sorting, limit=limit + 1)), None),
+        ("list.page", lambda: PeopleRepository.list(limit=limit), None),
+        ("list.page.fields", lambda: PeopleRepository.list(limit=limit, fields=fields), None),
+        ("list.next_page", lambda: PeopleRepository.list(limit=limit, cursor=next_cursor), None),
+        ("list.filter_city", lambda: PeopleRepository.list(filters=city_filters, limit=limit), None),
+        ("search.prefix", lambda: PeopleRepository.search("person 0001", PeopleSearchMode.prefix, limit=10), None),
+        ("search.prefix.city", lambda: PeopleRepository.search("city 1", PeopleSearchMode.prefix, limit=10), None),
+        *((("search.text", lambda: PeopleRepository.search("City 1", limit=10), None),)
+          if dataset.storage == "memory" else ()),  # text search is not available on the Mongo stand-in
+        ("create", lambda create: created.append(PeopleRepository.create(create).person_id),
+         lambda: PersonCreate(**person_payload(dataset.rng, dataset.size))),
+        ("update", lambda args: PeopleRepository.update(*args),
+         lambda: (dataset.random_person_id(), PersonUpdate(name=f"Person {dataset.rng.randrange(dataset.size)}"))),
+        ("delete", PeopleRepository.delete, dataset.insert),
+    )
+    for name, operation, setup in benchmarks:
+        yield measure(
+            SUITE, name, operation, setup=setup, params={**dataset.params, "page_size": limit},
+            min_time=options.min_time, max_samples=options.max_samples
+        )
+
+    # Keep the size of the collection for the next benchmarks
+    collection.delete_many({"_id": {"$in": created}})
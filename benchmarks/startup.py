@@ -0,0 +1,92 @@
+"""BENCHMARKS - STARTUP
+Cold start of the API: each run starts a new Python process (with the in-memory storage engine, loaded with the
+persons of a snapshot), which times the import of the package, the startup of the app (pool warm-up, indexes,
+snapshot load, OpenAPI schema), the first request, and the first request of the OpenAPI schema. The time to first
+request is measured from the start of the import to the first response
+"""
+
+# # Native # #
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+from argparse import Namespace
+from typing import Iterator, Dict, List
+
+# # Package # #
+from .measure import Result, summarize
+from .dataset import person_payload
+
+__all__ = ("run",)
+
+SUITE = "startup"
+
+_SCRIPT = """
+import sys, json, asyncio
+from time import perf_counter
+
+start = perf_counter()
+import people_api
+imported = perf_counter()
+
+import httpx
+
+
+async def main():
+    app = people_api.app
+    await app.router.startup()
+    started = perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.get("/people", params={"limit": 10})
+        first_request = perf_counter()
+        assert response.status_code == 200, response.text
+        openapi_start = perf_counter()
+        response = await client.get("/openapi.json")
+        openapi_end = perf_counter()
+        assert response.status_code == 200, response.text
+    await app.router.shutdown()
+    return {
+        "import": imported - start, "app_startup": started - imported, "first_request": first_request - started,
+        "time_to_first_request": first_request - start, "openapi_first_request": openapi_end - openapi_start
+    }
+
+
+json.dump(asyncio.run(main()), sys.stdout)
+"""
+"""Script run on each new process, writing the times of each part of the startup as JSON"""
+
+
+def _write_snapshot(path: str, size: int, seed: int):
+    """Write a snapshot file with the given number of persons, in the format exported by the API (NDJSON)"""
+    rng = random.Random(seed)
+    with open(path, "w") as file:
+        for i in range(size):
+            person = {**person_payload(rng, i), "person_id": f"{i:08d}-0000-4000-8000-000000000000",
+                      "created": 1600000000 + i, "updated": 1600000000 + i}
+            file.write(json.dumps(person) + "\n")
+
+
+def _run_process(env: Dict[str, str]) -> Dict[str, float]:
+    result = subprocess.run(
+        (sys.executable, "-c", _SCRIPT), env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def run(options: Namespace) -> Iterator[Result]:
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = os.path.join(directory, "snapshot.ndjson")
+        _write_snapshot(snapshot, options.startup_snapshot_size, options.seed)
+        env = {**os.environ, "STORAGE_ENGINE": "memory", "STORAGE_SNAPSHOT": snapshot}
+        params = {"snapshot_size": options.startup_snapshot_size}
+
+        times: Dict[str, List[float]] = dict()
+        for _ in range(options.startup_runs):
+            for name, elapsed in _run_process(env).items():
+                times.setdefault(name, list()).append(elapsed)
+
+    for name, samples in times.items():
+        yield summarize(SUITE, name, samples, params)
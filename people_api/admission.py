@@ -0,0 +1,216 @@
+"""ADMISSION
+Admission control of the requests: the number of requests processed at once is limited per route class (reads and
+writes), so when the database slows down the requests do not pile up (on the threadpool and the connection pool)
+until all of them time out. Requests over the limit wait for their turn on a bounded queue, and are rejected right
+away (503 with Retry-After) when the queue is full or they wait for too long. The limits can adapt to the latency
+of the requests (AIMD: additive increase, multiplicative decrease).
+Runs as an ASGI middleware, so a request holds its slot until its response body is completely sent (streamed
+responses keep reading from the database while their body is sent)
+"""
+
+# # Native # #
+import asyncio
+from time import monotonic
+from collections import deque
+from typing import Optional, Deque, Dict
+
+# # Installed # #
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+# # Package # #
+from .exceptions import ServiceOverloadedException
+from .metrics import admission_limit, admission_queued, admission_rejected
+from .profiling import span
+from .settings import admission_settings, metrics_settings, AdmissionSettings
+
+__all__ = ("AdmissionLimiter", "AdmissionController", "AdmissionMiddleware", "admission_controller", "route_class")
+
+ADMITTED_PREFIX = "/people"
+"""Path prefix of the requests subject to admission control (the internal endpoints are always admitted)"""
+EXEMPT_PATHS = ("/people/changes/stream",)
+"""Paths always admitted: long-lived streams, that would hold their slot for as long as the client is connected"""
+READ_METHODS = ("GET", "HEAD")
+
+
+class AdmissionLimiter:
+    """Limit of the requests of a route class processed at once, with a bounded FIFO queue of the requests waiting
+    for their turn. Runs on the event loop (not thread-safe).
+    With adaptive limits, the limit is decreased (multiplied by the backoff, at most once per request latency) when a
+    request takes longer than the latency target, and increased by one after a round of requests (as many as the limit)
+    completed within the target while at least half of the limit was in use"""
+    def __init__(
+            self, name: str, limit: int, queue_size: int, queue_timeout: float, retry_after: int = 1,
+            adaptive: bool = False, latency_target: float = 0.25, min_limit: int = 1, backoff: float = 0.9
+    ):
+        self.name = name
+        self.max_limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.adaptive = adaptive
+        self.latency_target = latency_target
+        self.min_limit = min(min_limit, limit)
+        self.backoff = backoff
+        self.in_flight = 0
+        self._limit = float(limit)
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._observe_limit()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Wait for a slot to process a request. Raises ServiceOverloadedException if the queue is full, or the request
+        waited for longer than the queue timeout"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._observe_queued()
+        try:
+            with span("admission_queue"):
+                done, _ = await asyncio.wait((future,), timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+        if not done:
+            self._abandon(future)
+            self._reject("queue_timeout")
+
+    def release(self, latency: Optional[float] = None):
+        """Free the slot of a processed request, that took the given time (in seconds), handing it to the next request
+        waiting (if any)"""
+        self.in_flight -= 1
+        if self.adaptive and latency is not None:
+            self._adapt(latency)
+        self._wake()
+
+    def _abandon(self, future: asyncio.Future):
+        """Stop waiting for a slot (timed out, or cancelled): if the slot was handed over meanwhile, it is freed"""
+        if future.done():
+            self.release()
+            return
+        future.cancel()
+        self._waiters.remove(future)
+        self._observe_queued()
+
+    def _wake(self):
+        woken = False
+        while self._waiters and self.in_flight < self.limit:
+            future = self._waiters.popleft()
+            woken = True
+            if not future.done():
+                future.set_result(None)
+                self.in_flight += 1
+        if woken:
+            self._observe_queued()
+
+    def _adapt(self, latency: float):
+        previous = self.limit
+        if latency > self.latency_target:
+            # Only decrease once per round trip, as the requests completing together suffered the same slowdown
+            now = monotonic()
+            if now - self._last_decrease >= latency:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_decrease = now
+        elif (self.in_flight + 1) * 2 >= self._limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        if self.limit != previous:
+            self._observe_limit()
+
+    def _reject(self, reason: str):
+        if metrics_settings.enabled:
+            admission_rejected.inc(self.name, reason)
+        raise ServiceOverloadedException(retry_after=self.retry_after)
+
+    def _observe_limit(self):
+        if metrics_settings.enabled:
+            admission_limit.set(self.name, value=self.limit)
+
+    def _observe_queued(self):
+        if metrics_settings.enabled:
+            admission_queued.set(self.name, value=len(self._waiters))
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Route class (read or write) of a request, or None if it is not subject to admission control"""
+    if not path.startswith(ADMITTED_PREFIX) or path in EXEMPT_PATHS:
+        return None
+    return "read" if method in READ_METHODS else "write"
+
+
+class AdmissionController:
+    """Limiters of each route class, from the settings"""
+    def __init__(self, settings: AdmissionSettings):
+        self.enabled = settings.enabled
+        options = dict(
+            queue_timeout=settings.queue_timeout_ms / 1000, retry_after=settings.retry_after_seconds,
+            adaptive=settings.adaptive,
+            latency_target=settings.latency_target_ms / 1000, min_limit=settings.min_limit, backoff=settings.backoff
+        )
+        self.limiters: Dict[str, AdmissionLimiter] = {
+            "read": AdmissionLimiter("read", settings.read_limit, settings.read_queue_size, **options),
+            "write": AdmissionLimiter("write", settings.write_limit, settings.write_queue_size, **options)
+        }
+
+    def limiter(self, scope: Scope) -> Optional[AdmissionLimiter]:
+        """Limiter of the route class of a request, or None if it is not subject to admission control"""
+        if not self.enabled or scope["type"] != "http":
+            return None
+        name = route_class(scope["method"], scope["path"])
+        return self.limiters[name] if name else None
+
+
+admission_controller = AdmissionController(admission_settings)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware processing each request within the limit of its route class (waiting for its turn if needed),
+    or rejecting it (503 with Retry-After) if it is not admitted. The slot is released once the last message of the
+    response body is sent (or the request fails), not when the route handler returns"""
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limiter = self.controller.limiter(scope)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except ServiceOverloadedException as ex:
+            await ex.response()(scope, receive, send)
+            return
+
+        start = monotonic()
+        released = False
+
+        def _release():
+            nonlocal released
+            if not released:
+                released = True
+                limiter.release(monotonic() - start)
+
+        async def _send(message: Message):
+            try:
+                await send(message)
+            finally:
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    _release()
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _release()
@@ -0,0 +1,69 @@
+"""AGE
+Calculation of the age of persons from their date of birth
+"""
+
+# # Native # #
+import time
+from calendar import isleap
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, List, Tuple
+
+__all__ = ("AgeCalculator", "age_calculator")
+
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _days_in_month(year: int, month: int) -> int:
+    return 29 if month == 2 and isleap(year) else _DAYS_IN_MONTH[month]
+
+
+class AgeCalculator:
+    """Calculate ages from dates of birth, with the same result as dateutil's relativedelta(today, birth).years,
+    but using integer arithmetic. The current date is cached, and refreshed when the (local) day changes"""
+    def __init__(self):
+        self._today = (0, 0, 0)
+        self._day_start = self._day_end = 0.0
+
+    @property
+    def today(self) -> Tuple[int, int, int]:
+        """Current local date, as (year, month, day)"""
+        now = time.time()
+        if not self._day_start <= now < self._day_end:
+            self._refresh(now)
+        return self._today
+
+    def _refresh(self, now: float):
+        today = datetime.fromtimestamp(now).date()
+        day_start = datetime.combine(today, datetime.min.time())
+        self._today = (today.year, today.month, today.day)
+        self._day_start = day_start.timestamp()
+        self._day_end = (day_start + timedelta(days=1)).timestamp()
+
+    @staticmethod
+    def _age(today: Tuple[int, int, int], birth: date) -> int:
+        year, month, day = today
+        birth_year, birth_month, birth_day = birth.year, birth.month, birth.day
+
+        if (birth_year, birth_month, birth_day) <= today:
+            # A birthday that does not exist on the current year (Feb 29) happens on the last day of the month
+            if birth_day > 28:
+                birth_day = min(birth_day, _days_in_month(year, birth_month))
+            return year - birth_year - ((month, day) < (birth_month, birth_day))
+
+        # Birth in the future: negative age, as relativedelta returns, counting the months back from the birth
+        if birth_day > 28:
+            birth_day = min(birth_day, _days_in_month(year, month))
+        months = (birth_year - year) * 12 + birth_month - month - (day > birth_day)
+        return -(months // 12)
+
+    def age(self, birth: date) -> int:
+        """Current age of someone born on the given date"""
+        return self._age(self.today, birth)
+
+    def ages(self, births: Iterable[Optional[date]]) -> List[Optional[int]]:
+        """Current ages for a batch of dates of birth (None for the missing dates)"""
+        today = self.today
+        return [None if birth is None else self._age(today, birth) for birth in births]
+
+
+age_calculator = AgeCalculator()
@@ -2,47 +2,378 @@
 FastAPI app definition, initialization and definition of routes
 """
 
+# # Native # #
+import os
+import inspect
+from datetime import date
+from typing import Optional, List, Set, Union
+
 # # Installed # #
-import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Body, Header, Depends, Request, Response
 from fastapi import status as statuscode
 
 # # Package # #
 from .models import *
 from .exceptions import *
-from .repositories import PeopleRepository
+from .repositories import PeopleRepository, AsyncPeopleRepository, ThreadedRepository, ProfiledRepository
+from .repositories import PublishingRepository, CoalescingRepository, CachedRepository
 from .middlewares import request_handler
-from .settings import api_settings as settings
+from .compression import CompressionMiddleware
+from .admission import AdmissionMiddleware
+from .responses import *
+from .database import create_indexes, load_snapshot, warm_up
+from .openapi import load_openapi_schema
+from .cache import LRUCache
+from .consistency import CausalContext, CAUSAL_TOKEN_HEADER, set_causal_context
+from .utils import get_etag, get_revision_etag, etag_matches, etag_revisions, get_time
+from .metrics import registry as metrics_registry
+from .profiling import profiler
+from .changes import change_feed, subscribe_change_feed, start_change_feed, stop_change_feed
+from .settings import api_settings as settings, mongo_settings, cache_settings, metrics_settings, profiling_settings
+from .settings import changes_settings, coalescing_settings, ChangesSource
 
 __all__ = ("app", "run")
 
 
+_worker_started: Optional[int] = None
+"""Unix timestamp when this worker process started serving (set on startup)"""
+_ready = False
+"""True once the worker finished its startup (connection pool warmed up, OpenAPI schema loaded), until it shuts down"""
+
+
+def _set_worker_started():
+    global _worker_started
+    _worker_started = get_time()
+
+
+def _worker_health() -> WorkerHealth:
+    return WorkerHealth(
+        status="ok",
+        ready=_ready,
+        pid=os.getpid(),
+        started=_worker_started,
+        uptime=get_time() - _worker_started,
+        workers=settings.workers
+    )
+
+
+def _load_openapi_schema():
+    load_openapi_schema(app)
+
+
+def _bind_cache():
+    """With multiple workers, the cache of each worker must see the writes of the other workers: its entries are
+    invalidated by the events of the change feed, when read from the Mongo change stream (that sees the writes of all
+    the processes). Without change stream, the cache is disabled, so the workers never serve stale persons"""
+    global repository
+    if not isinstance(repository, CachedRepository) or settings.workers == 1:
+        return
+    if changes_settings.enabled and change_feed.source == ChangesSource.change_stream:
+        change_feed.add_listener(lambda event: repository.cache.invalidate(event.person_id))
+    else:
+        repository = repository.wrapped
+
+
+def _set_ready():
+    global _ready
+    _ready = True
+
+
+def _set_not_ready():
+    global _ready
+    _ready = False
+
+
 app = FastAPI(
     title=settings.title
 )
+# The compression runs inside the request handler, so it gets the responses as sent by the routes (complete or
+# streamed), and the error responses built by the request handler are never compressed.
+# The admission control runs inside the request handler too (so the rejected requests are measured), holding the slot
+# of each request until the last (compressed) message of its body is sent
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
 app.middleware("http")(request_handler)
+app.on_event("startup")(_set_worker_started)
+app.on_event("startup")(warm_up)
+app.on_event("startup")(create_indexes)
+app.on_event("startup")(load_snapshot)
+app.on_event("startup")(start_change_feed)
+app.on_event("startup")(_bind_cache)
+app.on_event("startup")(_load_openapi_schema)
+app.on_event("startup")(_set_ready)
+app.on_event("shutdown")(_set_not_ready)
+app.on_event("shutdown")(stop_change_feed)
+
+repository = AsyncPeopleRepository if mongo_settings.async_driver else ThreadedRepository(PeopleRepository)
+"""Repository used by the route handlers. All its methods are coroutines: with the async driver they are natively async,
+otherwise the sync PeopleRepository methods run on the threadpool"""
+if profiling_settings.enabled:
+    repository = ProfiledRepository(repository)
+if changes_settings.enabled:
+    repository = PublishingRepository(repository, change_feed)
+if coalescing_settings.enabled:
+    # Under the cache, so the concurrent misses of the same person share a single read
+    repository = CoalescingRepository(repository)
+if cache_settings.enabled:
+    repository = CachedRepository(
+        repository,
+        cache=LRUCache(max_entries=cache_settings.max_entries, ttl=cache_settings.ttl),
+        not_found_ttl=cache_settings.not_found_ttl
+    )
+
+
+_fields_regex = "^({fields})(,({fields}))*$".format(fields="|".join(field.value for field in PersonField))
+
+
+def _person_fields(
+        fields: Optional[str] = Query(
+            None, regex=_fields_regex,
+            description="Comma-separated list of fields to return (all of them if not given). "
+                        f"Available fields: {', '.join(field.value for field in PersonField)}"
+        )
+) -> Optional[Set[PersonField]]:
+    """Dependency that parses the requested person fields from the query params"""
+    if not fields:
+        return None
+    return {PersonField(field) for field in fields.split(",")}
+
+
+def _etag(revision: str, fields: Optional[Set[PersonField]]) -> str:
+    """ETag of the representation of a person or page of persons: depends on the revision of the documents,
+    the requested fields, and the current date (as the age changes without the documents being updated)"""
+    fields_key = ",".join(sorted(field.value for field in fields)) if fields else ""
+    return get_etag(revision, fields_key, date.today().isoformat())
+
+
+def _person_etag(revision: str, fields: Optional[Set[PersonField]]) -> str:
+    """ETag of the representation of a single person: same as _etag, but the revision of the person can be read back
+    from it, so the conditional updates (If-Match) compare it on the same write"""
+    fields_key = ",".join(sorted(field.value for field in fields)) if fields else ""
+    return get_revision_etag(revision, fields_key, date.today().isoformat())
+
+
+def _prefers_representation(request: Request) -> bool:
+    """Check if the client asked for the written resource on the response of a write (Prefer: return=representation)"""
+    preferences = (item.split(";")[0].strip().lower() for item in request.headers.get("Prefer", "").split(","))
+    return "return=representation" in preferences
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=statuscode.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+async def _causal_context(
+        x_causal_token: Optional[str] = Header(
+            None, description="Causal consistency token returned by a previous request (on the X-Causal-Token header), "
+                              "to read its writes. Only used if causal consistency is enabled"
+        )
+) -> CausalContext:
+    """Dependency that sets the causal consistency token of the current request.
+    Must be async, so the context is set on the request task (and inherited by the threadpool)"""
+    return set_causal_context(x_causal_token)
+
+
+def _causal_headers(causal: CausalContext) -> dict:
+    """Headers returning the causal consistency token updated by the request (if any)"""
+    return {CAUSAL_TOKEN_HEADER: causal.token} if causal.token else dict()
+
+
+_not_modified_response = {statuscode.HTTP_304_NOT_MODIFIED: {
+    "description": "Not Modified (the ETag sent on the If-None-Match header is current)"
+}}
+
+
+def _people_filters(
+        name: Optional[str] = Query(None, description="Filter by exact name"),
+        name_prefix: Optional[str] = Query(None, min_length=1, description="Filter by names starting with"),
+        city: Optional[str] = Query(None, description="Filter by exact address city"),
+        state: Optional[str] = Query(None, description="Filter by exact address state"),
+        zip_code: Optional[str] = Query(None, description="Filter by exact address ZIP code"),
+        birth_from: Optional[date] = Query(None, description="Filter by date of birth, from this date (inclusive)"),
+        birth_to: Optional[date] = Query(None, description="Filter by date of birth, until this date (inclusive)"),
+        created_from: Optional[int] = Query(None, description="Filter by created time, from this Unix timestamp"),
+        created_to: Optional[int] = Query(None, description="Filter by created time, until this Unix timestamp"),
+        updated_from: Optional[int] = Query(None, description="Filter by updated time, from this Unix timestamp"),
+        updated_to: Optional[int] = Query(None, description="Filter by updated time, until this Unix timestamp")
+) -> PeopleFilters:
+    """Dependency that parses the list filters from the query params"""
+    return PeopleFilters(
+        name=name, name_prefix=name_prefix,
+        city=city, state=state, zip_code=zip_code,
+        birth_from=birth_from, birth_to=birth_to,
+        created_from=created_from, created_to=created_to,
+        updated_from=updated_from, updated_to=updated_to
+    )
 
 
 @app.get(
     "/people",
-    response_model=PeopleRead,
-    description="List all the available persons",
+    response_model=PeoplePage,
+    response_class=FastJSONResponse,
+    description="List the available persons, filtered and paginated. "
+                "Use the returned next_cursor as the cursor param to request the following page",
+    responses={
+        **_not_modified_response, **get_exception_responses(InvalidCursorException, InvalidCausalTokenException)
+    },
+    tags=["people"]
+)
+async def _list_people(
+        request: Request,
+        filters: PeopleFilters = Depends(_people_filters),
+        sort: PeopleSort = Query(PeopleSort.created, description="Field to sort the persons by"),
+        order: SortOrder = Query(SortOrder.asc, description="Sort order"),
+        limit: int = Query(settings.list_limit, ge=1, le=settings.list_max_limit, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+        fields: Optional[Set[PersonField]] = Depends(_person_fields),
+        causal: CausalContext = Depends(_causal_context)
+):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        revision = await repository.list_revision(filters=filters, sort=sort, order=order, limit=limit, cursor=cursor)
+        etag = _etag(revision, fields)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    page = await repository.list(filters=filters, sort=sort, order=order, limit=limit, cursor=cursor, fields=fields)
+    return FastJSONResponse(page, headers={"ETag": _etag(page.revision, fields), **_causal_headers(causal)})
+
+
+_person_schema = {"anyOf": [
+    {"$ref": "#/components/schemas/PersonPartialRead"},
+    {"$ref": "#/components/schemas/PersonRead"}
+]}
+"""OpenAPI schema of each person returned on export (partial if only some fields are requested)"""
+
+
+@app.get(
+    "/people/export",
+    response_class=NDJSONStreamingResponse,
+    description="Export all the available persons, streaming them as they are read from the database: "
+                "as newline-delimited JSON (one person per line), or as a JSON array",
+    responses={
+        statuscode.HTTP_200_OK: {
+            "content": {
+                NDJSONStreamingResponse.media_type: {"schema": _person_schema},
+                JSONStreamingResponse.media_type: {"schema": {"type": "array", "items": _person_schema}}
+            }
+        }
+    },
+    tags=["people"]
+)
+async def _export_people(
+        format: ExportFormat = Query(ExportFormat.ndjson, description="Output format"),
+        batch_size: int = Query(
+            settings.export_batch_size, ge=1, le=settings.export_max_batch_size,
+            description="Number of persons fetched from the database on each round trip"
+        ),
+        fields: Optional[Set[PersonField]] = Depends(_person_fields)
+):
+    people = await repository.iterate(batch_size, fields=fields)
+    if format == ExportFormat.json:
+        return JSONStreamingResponse(stream_json_array(people))
+    return NDJSONStreamingResponse(stream_ndjson(people))
+
+
+@app.get(
+    "/people/search",
+    response_model=PeoplePage,
+    response_class=FastJSONResponse,
+    description="Search persons. On text mode, by the words of their name and address fields, ranked by relevance. "
+                "On prefix mode (autocomplete), by the start of their name or city, case and diacritic insensitive. "
+                "Use the returned next_cursor as the cursor param to request the following page",
+    responses=get_exception_responses(InvalidCursorException, InvalidCausalTokenException),
     tags=["people"]
 )
-def _list_people():
-    # TODO Filters
-    return PeopleRepository.list()
+async def _search_people(
+        q: str = Query(..., min_length=1, max_length=settings.search_max_length, description="Text to search"),
+        mode: PeopleSearchMode = Query(PeopleSearchMode.text, description="How the persons are matched"),
+        limit: int = Query(settings.search_limit, ge=1, le=settings.list_max_limit, description="Page size"),
+        cursor: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+        fields: Optional[Set[PersonField]] = Depends(_person_fields),
+        causal: CausalContext = Depends(_causal_context)
+):
+    page = await repository.search(q, mode=mode, limit=limit, cursor=cursor, fields=fields)
+    return FastJSONResponse(page, headers=_causal_headers(causal))
+
+
+@app.get(
+    "/people/changes",
+    response_model=PeopleChanges,
+    response_class=FastJSONResponse,
+    description="Get the persons created or updated, and the ids of the persons deleted, since the sync token "
+                "returned by a previous request (all the persons, without sync token), to sync a copy of them. "
+                "While more is true, request the following changes right away with the returned sync token; "
+                "otherwise, keep it for the next sync. Changes can be returned more than once",
+    responses=get_exception_responses(
+        InvalidSyncTokenException, SyncTokenExpiredException, InvalidCausalTokenException
+    ),
+    tags=["people", "changes"]
+)
+async def _get_changes(
+        since: Optional[str] = Query(None, description="sync_token returned by the previous request"),
+        limit: int = Query(
+            settings.changes_limit, ge=1, le=settings.list_max_limit,
+            description="Maximum number of changes (persons plus deleted ids) to return"
+        ),
+        fields: Optional[Set[PersonField]] = Depends(_person_fields),
+        causal: CausalContext = Depends(_causal_context)
+):
+    changes = await repository.changes(since, limit=limit, fields=fields)
+    return FastJSONResponse(changes, headers=_causal_headers(causal))
+
+
+@app.get(
+    "/people/changes/stream",
+    response_class=EventStreamResponse,
+    description="Stream the persons created, updated and deleted as Server-Sent Events, as they happen: creates "
+                "include the created person, and updates the updated fields. Send the event_id (id) of the last event "
+                "received (Last-Event-ID header, or since query param) to resume the feed after it. "
+                "Only available if the change feed is enabled",
+    responses={
+        statuscode.HTTP_200_OK: {"model": PersonChange, "description": "Stream of events (data of each event)"},
+        **get_exception_responses(
+            ChangesDisabledException, InvalidResumeTokenException, ResumeTokenExpiredException
+        )
+    },
+    tags=["people", "changes"]
+)
+async def _stream_changes(
+        since: Optional[str] = Query(None, description="event_id of the last event received, to resume after it"),
+        last_event_id: Optional[str] = Header(
+            None, description="Same as since (sent by EventSource clients when reconnecting)"
+        )
+):
+    if not changes_settings.enabled:
+        raise ChangesDisabledException()
+    subscription = await subscribe_change_feed(last_event_id or since)
+    return EventStreamResponse(stream_events(subscription, changes_settings.heartbeat_seconds))
 
 
 @app.get(
     "/people/{person_id}",
-    response_model=PersonRead,
+    response_model=Union[PersonPartialRead, PersonRead],
+    response_class=FastJSONResponse,
     description="Get a single person by its unique ID",
-    responses=get_exception_responses(PersonNotFoundException),
+    responses={
+        **_not_modified_response, **get_exception_responses(PersonNotFoundException, InvalidCausalTokenException)
+    },
     tags=["people"]
 )
-def _get_person(person_id: str):
-    return PeopleRepository.get(person_id)
+async def _get_person(
+        person_id: str,
+        request: Request,
+        fields: Optional[Set[PersonField]] = Depends(_person_fields),
+        causal: CausalContext = Depends(_causal_context)
+):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        etag = _person_etag(await repository.get_revision(person_id), fields)
+        if etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+
+    person = await repository.get(person_id, fields=fields)
+    return FastJSONResponse(person, headers={"ETag": _person_etag(person.revision, fields), **_causal_headers(causal)})
 
 
 @app.post(
@@ -50,40 +381,229 @@ def _get_person(person_id: str):
     description="Create a new person",
     response_model=PersonRead,
     status_code=statuscode.HTTP_201_CREATED,
-    responses=get_exception_responses(PersonAlreadyExistsException),
+    responses=get_exception_responses(PersonAlreadyExistsException, InvalidCausalTokenException),
     tags=["people"]
 )
-def _create_person(create: PersonCreate):
-    return PeopleRepository.create(create)
+async def _create_person(
+        create: PersonCreate,
+        response: Response,
+        causal: CausalContext = Depends(_causal_context)
+):
+    person = await repository.create(create)
+    response.headers.update({"ETag": _person_etag(person.revision, None), **_causal_headers(causal)})
+    return person
+
+
+_bulk_items = dict(min_items=1, max_items=settings.bulk_max_items)
+"""Limits of the items sent on bulk requests"""
+
+
+@app.post(
+    "/people/bulk",
+    description="Create multiple persons. Returns the result of each one (the created person, or the error)",
+    response_model=BulkResults,
+    tags=["people", "bulk"]
+)
+async def _create_people(
+        response: Response,
+        creates: List[PersonCreate] = Body(..., **_bulk_items),
+        causal: CausalContext = Depends(_causal_context)
+):
+    results = await repository.create_many(creates)
+    response.headers.update(_causal_headers(causal))
+    return results
+
+
+@app.patch(
+    "/people/bulk",
+    description="Update multiple persons by their unique IDs, providing the fields to update on each one. "
+                "Returns the result of each one",
+    response_model=BulkResults,
+    tags=["people", "bulk"]
+)
+async def _update_people(
+        response: Response,
+        updates: List[PersonBulkUpdate] = Body(..., **_bulk_items),
+        causal: CausalContext = Depends(_causal_context)
+):
+    results = await repository.update_many(updates)
+    response.headers.update(_causal_headers(causal))
+    return results
+
+
+@app.delete(
+    "/people/bulk",
+    description="Delete multiple persons by their unique IDs. Returns the result of each one",
+    response_model=BulkResults,
+    tags=["people", "bulk"]
+)
+async def _delete_people(
+        response: Response,
+        person_ids: List[str] = Body(..., **_bulk_items),
+        causal: CausalContext = Depends(_causal_context)
+):
+    results = await repository.delete_many(person_ids)
+    response.headers.update(_causal_headers(causal))
+    return results
 
 
 @app.patch(
     "/people/{person_id}",
-    description="Update a single person by its unique ID, providing the fields to update",
+    description="Update a single person by its unique ID, providing the fields to update. "
+                "With an If-Match header (ETag of the person), the person is only updated if it was not modified "
+                "since (412 otherwise). With a Prefer: return=representation header, the updated person is returned "
+                "(200), instead of an empty response (204). The new ETag is returned on both cases",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(PersonNotFoundException, PersonAlreadyExistsException),
+    responses={
+        statuscode.HTTP_200_OK: {"model": PersonRead, "description": "Updated person (Prefer: return=representation)"},
+        **get_exception_responses(
+            PersonNotFoundException, PersonAlreadyExistsException, PersonModifiedException, InvalidCausalTokenException
+        )
+    },
     tags=["people"]
 )
-def _update_person(person_id: str, update: PersonUpdate):
-    PeopleRepository.update(person_id, update)
+async def _update_person(
+        person_id: str,
+        update: PersonUpdate,
+        request: Request,
+        causal: CausalContext = Depends(_causal_context)
+):
+    if_match = request.headers.get("If-Match")
+    revisions = etag_revisions(if_match) if if_match else None
+    person = await repository.update(person_id, update, revisions=revisions)
+    headers = {"ETag": _person_etag(person.revision, None), **_causal_headers(causal)}
+    if _prefers_representation(request):
+        return FastJSONResponse(person, headers={"Preference-Applied": "return=representation", **headers})
+    return Response(status_code=statuscode.HTTP_204_NO_CONTENT, headers=headers)
 
 
 @app.delete(
     "/people/{person_id}",
     description="Delete a single person by its unique ID",
     status_code=statuscode.HTTP_204_NO_CONTENT,
-    responses=get_exception_responses(PersonNotFoundException),
+    responses=get_exception_responses(PersonNotFoundException, InvalidCausalTokenException),
     tags=["people"]
 )
-def _delete_person(person_id: str):
-    PeopleRepository.delete(person_id)
+async def _delete_person(
+        person_id: str,
+        response: Response,
+        causal: CausalContext = Depends(_causal_context)
+):
+    await repository.delete(person_id)
+    response.headers.update(_causal_headers(causal))
+
+
+@app.get(
+    "/cache/stats",
+    response_model=CacheStats,
+    description="Get the counters of the in-process cache of persons (only available if the cache is enabled)",
+    responses=get_exception_responses(CacheDisabledException),
+    tags=["internal"]
+)
+async def _get_cache_stats():
+    if not isinstance(repository, CachedRepository):
+        raise CacheDisabledException()
+    return repository.cache.stats()
+
+
+@app.get(
+    "/metrics",
+    response_class=MetricsResponse,
+    description="Get the metrics of the requests and the Mongo clients of this process, in the Prometheus text format "
+                "(only available if the metrics are enabled)",
+    responses=get_exception_responses(MetricsDisabledException),
+    tags=["internal"]
+)
+async def _get_metrics():
+    if not metrics_settings.enabled:
+        raise MetricsDisabledException()
+    return MetricsResponse(metrics_registry.render())
+
+
+@app.get(
+    "/admin/profiling",
+    response_model=ProfilingStatus,
+    description="Get the status of the request profiler (only available if the profiling is enabled)",
+    responses=get_exception_responses(ProfilingDisabledException),
+    tags=["internal"]
+)
+async def _get_profiling_status():
+    if not profiling_settings.enabled:
+        raise ProfilingDisabledException()
+    return profiler.status()
+
+
+@app.patch(
+    "/admin/profiling",
+    response_model=ProfilingStatus,
+    description="Update the request profiler: enable/disable the sampling profiler for all the requests, "
+                "or change the threshold of the slow requests recorded "
+                "(only available if the profiling and its administration are enabled)",
+    responses=get_exception_responses(ProfilingDisabledException),
+    tags=["internal"]
+)
+async def _update_profiling(update: ProfilingUpdate):
+    if not profiling_settings.enabled:
+        raise ProfilingDisabledException()
+    if not profiling_settings.admin_enabled:
+        raise ProfilingDisabledException(message="The administration of the profiler is disabled")
+    return profiler.update(update)
+
+
+@app.get(
+    "/admin/profiling/requests",
+    response_model=List[ProfiledRequest],
+    description="Get the requests recorded by the profiler (slow or sampled), the most recent first, with the "
+                "breakdown of the time spent on each part of the pipeline",
+    responses=get_exception_responses(ProfilingDisabledException),
+    tags=["internal"]
+)
+async def _get_profiled_requests():
+    if not profiling_settings.enabled:
+        raise ProfilingDisabledException()
+    return FastJSONResponse(profiler.recorded())
+
+
+@app.get(
+    "/health",
+    response_model=WorkerHealth,
+    description="Get the health of the worker process that served the request (with multiple workers, each request "
+                "can be served by a different one)",
+    tags=["internal"]
+)
+async def _get_health():
+    return _worker_health()
+
+
+@app.get(
+    "/ready",
+    response_model=WorkerHealth,
+    description="Get the readiness of the worker process that served the request: only ready once it finished its "
+                "startup (connected to the database, and warmed up its connection pool), until it shuts down",
+    responses=get_exception_responses(NotReadyException),
+    tags=["internal"]
+)
+async def _get_readiness():
+    if not _ready:
+        raise NotReadyException()
+    return _worker_health()
 
 
 def run():
-    """Run the API using Uvicorn"""
+    """Run the API using Uvicorn. With more than one worker, Uvicorn runs them as supervised processes, importing
+    the app on each one (so each worker creates its own Mongo clients)"""
+    # Imported here, as the app does not need the server (nor its dependencies) to be imported
+    import uvicorn
+    # The health check timeout requires Uvicorn 0.37 (which requires Python 3.9): not given to older versions
+    options = dict()
+    if "timeout_worker_healthcheck" in inspect.signature(uvicorn.Config).parameters:
+        options["timeout_worker_healthcheck"] = settings.worker_healthcheck_timeout
     uvicorn.run(
-        app,
+        app if settings.workers == 1 else f"{__name__}:app",
         host=settings.host,
         port=settings.port,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
+        workers=settings.workers,
+        timeout_graceful_shutdown=settings.graceful_shutdown_timeout,
+        **options
     )
@@ -0,0 +1,78 @@
+"""CACHE
+In-process LRU cache with TTL expiration, used to cache reads from the repositories
+"""
+
+# # Native # #
+from time import monotonic
+from threading import Lock
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+# # Package # #
+from .models import CacheStats
+
+__all__ = ("LRUCache",)
+
+
+class LRUCache:
+    """Thread-safe cache with a maximum number of entries (evicting the least recently used ones) and a TTL per entry.
+    To avoid storing stale values, read the version before fetching a value from the source, and give it when
+    setting the value: if any key was invalidated meanwhile, the value is not stored"""
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key: (expiration time, value)
+        self._lock = Lock()
+        self._version = 0
+        self._stats = dict(hits=0, misses=0, evictions=0, expirations=0, invalidations=0)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Get a value from the cache. Returns a tuple of (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+
+            expires, value = entry
+            if expires <= monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, version: int, ttl: Optional[float] = None):
+        """Store a value on the cache, unless any key was invalidated after the given version was read"""
+        with self._lock:
+            if version != self._version:
+                return
+
+            self._entries[key] = (monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        """Remove a key from the cache, and prevent values read before this call from being stored"""
+        with self._lock:
+            self._version += 1
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(entries=len(self._entries), max_entries=self.max_entries, **self._stats)
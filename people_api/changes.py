@@ -0,0 +1,369 @@
+"""CHANGES
+Change feed of the persons: the persons created, updated and deleted are published as events on an in-process bus,
+and pushed to its subscribers (the clients of the change stream endpoint). Events come from the writes of the
+repositories, or from a Mongo change stream (that also sees the writes of other processes), when available.
+The events read from the change stream are identified by their resume token, so the clients can resume the feed
+on any process (or after a restart), as long as the changes are still available on the oplog
+"""
+
+# # Native # #
+import asyncio
+import logging
+import threading
+from functools import partial
+from collections import deque
+from typing import Optional, Callable, List, Set, Deque, Tuple
+
+# # Installed # #
+from starlette.concurrency import run_in_threadpool
+from pymongo.errors import PyMongoError, OperationFailure
+
+# # Package # #
+from .models import PersonChange, ChangeOperation, PersonRead, PersonUpdate, document_values
+from .exceptions import InvalidResumeTokenException, ResumeTokenExpiredException
+from .metrics import change_feed_subscribers, change_feed_events, change_feed_lagged_subscribers
+from .database import get_client, collection
+from .settings import changes_settings as settings, metrics_settings, ChangesSource
+from .utils import get_time, get_uuid, encode_token, decode_token
+
+__all__ = (
+    "ChangeFeed", "Subscription", "SubscriptionLagged", "ChangeStreamWatcher", "change_stream_event",
+    "change_event_id", "change_feed", "subscribe_change_feed", "start_change_feed", "stop_change_feed"
+)
+
+_CHANGE_STREAM_HISTORY_LOST = 286
+_DOCUMENT_OPERATIONS = ("insert", "update", "replace", "delete")
+"""Operations of the change stream on a single document (others, like drop or invalidate, have no documentKey)"""
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionLagged(Exception):
+    """Raised to a subscriber that did not consume its events fast enough, once it consumed the events queued before
+    its queue filled up. It must subscribe again, resuming after the last event it received"""
+
+
+class Subscription:
+    """Events of the feed pending to be consumed by a subscriber: the events published before subscribing (when
+    resuming the feed), followed by a bounded queue of the events published after. When the queue fills up,
+    the subscriber is lagged: it stops receiving events, so a slow subscriber never holds more than the queue size"""
+    def __init__(self, feed: "ChangeFeed", backlog: List[PersonChange], queue_size: int):
+        self._feed = feed
+        self._backlog = deque(backlog)
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._skipped: Set[str] = set()
+        self.lagged = False
+
+    def push(self, event: PersonChange):
+        if self.lagged:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            self._feed.unsubscribe(self)
+            if metrics_settings.enabled:
+                change_feed_lagged_subscribers.inc()
+
+    async def get(self, timeout: float) -> Optional[PersonChange]:
+        """Return the next event, or None if no event is published within the timeout (in seconds).
+        Raises SubscriptionLagged when lagged, and all the queued events were consumed"""
+        if self._backlog:
+            return self._backlog.popleft()
+        while True:
+            if self.lagged and self._queue.empty():
+                raise SubscriptionLagged()
+            try:
+                event = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            if event.event_id not in self._skipped:
+                return event
+            self._skipped.discard(event.event_id)
+
+    def catch_up(self, events: List[PersonChange]):
+        """Receive the given events (read from the change stream) before the ones published after subscribing.
+        The published events that were already received this way are skipped"""
+        self._backlog.extend(events)
+        self._skipped.update(event.event_id for event in events)
+
+    def close(self):
+        self._feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """In-process bus of the person change events. Each event gets an id (resume token): its sequence number on
+    this feed, or the resume token of the change (when read from the change stream). The recent events are kept, so
+    subscribers can resume the feed after the last event they received.
+    Events are published and consumed on the event loop (see publish_threadsafe to publish from other threads)"""
+    def __init__(self, history_size: int, queue_size: int):
+        self.feed_id = get_uuid()
+        self.queue_size = queue_size
+        self.source = ChangesSource.repository
+        """Where the published events come from (set on startup)"""
+        self._sequence = 0
+        self._history: Deque[Tuple[int, PersonChange]] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscription] = set()
+        self._listeners: List[Callable[[PersonChange], None]] = list()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def history_size(self) -> int:
+        return self._history.maxlen
+
+    def publish(
+            self, operation: ChangeOperation, person_id: str,
+            person: Optional[PersonRead] = None, update: Optional[PersonUpdate] = None, event_id: Optional[str] = None
+    ) -> PersonChange:
+        """Publish an event, pushing it to all the subscribers. The events read from the change stream are given
+        their id (see change_event_id)"""
+        self._sequence += 1
+        event = _change(event_id or encode_token([self.feed_id, self._sequence]), operation, person_id, person, update)
+        self._history.append((self._sequence, event))
+        for subscription in tuple(self._subscribers):
+            subscription.push(event)
+        for listener in self._listeners:
+            listener(event)
+        if metrics_settings.enabled:
+            change_feed_events.inc(operation.value)
+        return event
+
+    def publish_threadsafe(self, *args, **kwargs):
+        """Publish an event from a thread other than the event loop's (like the change stream watcher)"""
+        self._loop.call_soon_threadsafe(partial(self.publish, *args, **kwargs))
+
+    def subscribe(self, resume_token: Optional[str] = None) -> Subscription:
+        """Subscribe to the events published from now on. If the id of a previous event is given, the events
+        published after it are received first"""
+        backlog = self._events_after(resume_token) if resume_token else list()
+        subscription = Subscription(self, backlog, self.queue_size)
+        self._subscribers.add(subscription)
+        if metrics_settings.enabled:
+            change_feed_subscribers.inc()
+        return subscription
+
+    def add_listener(self, listener: Callable[[PersonChange], None]):
+        """Call the given function with every event published (on the event loop), like the invalidation of a cache.
+        Unlike subscribers, listeners are never lagged"""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            if metrics_settings.enabled:
+                change_feed_subscribers.dec()
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def _events_after(self, resume_token: str) -> List[PersonChange]:
+        try:
+            data = decode_token(resume_token)
+        except ValueError:
+            raise InvalidResumeTokenException()
+        if _change_stream_token(data) is not None:
+            # Read from the change stream: kept if read by this process (otherwise see subscribe_change_feed)
+            events = [event for _, event in self._history]
+            for index, event in enumerate(events):
+                if event.event_id == resume_token:
+                    return events[index + 1:]
+            raise ResumeTokenExpiredException()
+
+        try:
+            feed_id, sequence = data
+        except (ValueError, TypeError):
+            raise InvalidResumeTokenException()
+        if feed_id != self.feed_id:
+            # Published by another process, or a previous run of the API
+            raise ResumeTokenExpiredException()
+        if not isinstance(sequence, int) or not 0 <= sequence <= self._sequence:
+            raise InvalidResumeTokenException()
+
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence < oldest - 1:
+            raise ResumeTokenExpiredException()
+        return [event for event_sequence, event in self._history if event_sequence > sequence]
+
+
+def _person_update(fields: dict) -> Optional[PersonUpdate]:
+    """Build the update of a change event from the written fields of a document (None if no person field changed)"""
+    values = {
+        field: value for field, value in document_values(fields).items()
+        if field in PersonUpdate.__fields__ and value is not None
+    }
+    return PersonUpdate.construct(**values) if values else None
+
+
+def _change(
+        event_id: str, operation: ChangeOperation, person_id: str,
+        person: Optional[PersonRead] = None, update: Optional[PersonUpdate] = None
+) -> PersonChange:
+    return PersonChange.construct(
+        event_id=event_id, operation=operation, person_id=person_id, time=get_time(seconds_precision=False),
+        person=person, update=update
+    )
+
+
+def _change_stream_token(data) -> Optional[dict]:
+    """The resume token of a change stream, from the decoded id of an event (None if not read from a change stream)"""
+    if isinstance(data, dict) and isinstance(data.get("_data"), str):
+        return data
+    return None
+
+
+def change_event_id(change: dict) -> str:
+    """Id of the event of a change read from the Mongo change stream: its resume token, so the clients can resume the
+    feed on any process, resuming the change stream after it"""
+    return encode_token(change["_id"])
+
+
+def change_stream_event(change: dict) -> Optional[tuple]:
+    """Translate a change of a Mongo change stream into the arguments of ChangeFeed.publish
+    (None for the changes that are not relevant for the clients, like the backfill of the search fields, or the
+    changes on the collection instead of a document, like drop or invalidate)"""
+    operation_type = change["operationType"]
+    if operation_type not in _DOCUMENT_OPERATIONS:
+        return None
+    person_id = change["documentKey"]["_id"]
+    if operation_type == "insert":
+        return ChangeOperation.create, person_id, PersonRead.construct_from_document(change["fullDocument"])
+    if operation_type == "delete":
+        return ChangeOperation.delete, person_id
+    if operation_type == "update":
+        fields = change["updateDescription"]["updatedFields"]
+    elif operation_type == "replace":
+        fields = change["fullDocument"]
+    else:
+        return None
+    update = _person_update(fields)
+    return (ChangeOperation.update, person_id, None, update) if update else None
+
+
+class ChangeStreamWatcher(threading.Thread):
+    """Thread that reads the changes of the people collection from a Mongo change stream, publishing them on the feed.
+    If the stream fails (or an unexpected error happens), it is reopened, resuming after the last change read (if still
+    available on the oplog)"""
+    def __init__(self, feed: ChangeFeed, collection_=collection, retry_seconds: float = 1):
+        super().__init__(name="change-stream-watcher", daemon=True)
+        self.feed = feed
+        self._collection = collection_
+        self._retry_seconds = retry_seconds
+        self._resume_token = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                with self._collection.watch(resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+                    while not self._stopped.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._resume_token = stream.resume_token
+                            event = change_stream_event(change)
+                            if event:
+                                self.feed.publish_threadsafe(*event, event_id=change_event_id(change))
+            except OperationFailure as ex:
+                if ex.code == _CHANGE_STREAM_HISTORY_LOST:
+                    self._resume_token = None
+                self._stopped.wait(self._retry_seconds)
+            except PyMongoError:
+                self._stopped.wait(self._retry_seconds)
+            except Exception:
+                # The change that failed is skipped (the stream resumes after it), so the feed is never stopped
+                logger.exception("Unexpected error reading the change stream; reopening it")
+                self._stopped.wait(self._retry_seconds)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def _change_streams_available() -> bool:
+    """True if the Mongo server supports change streams (replica set or sharded cluster)"""
+    client = get_client()
+    if client is None:
+        return False
+    try:
+        hello = client.admin.command("hello")
+    except Exception:
+        # Server not available or not supporting the command: the feed falls back to the repository writes
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+def _read_change_stream(resume_token: dict, max_events: int, collection_=collection) -> List[PersonChange]:
+    """Read the events of the changes after the given resume token from the change stream, up to the present.
+    Raises ResumeTokenExpiredException if the changes are no longer available on the oplog, or there are more events
+    than the given maximum (as the events kept by the feed to resume it)"""
+    events = list()
+    try:
+        with collection_.watch(resume_after=resume_token, max_await_time_ms=100) as stream:
+            for change in iter(stream.try_next, None):
+                event = change_stream_event(change)
+                if event:
+                    events.append(_change(change_event_id(change), *event))
+                if len(events) > max_events:
+                    raise ResumeTokenExpiredException()
+    except OperationFailure as ex:
+        if ex.code == _CHANGE_STREAM_HISTORY_LOST:
+            raise ResumeTokenExpiredException()
+        # Not a resume token of this collection
+        raise InvalidResumeTokenException()
+    return events
+
+
+change_feed = ChangeFeed(history_size=settings.history_size, queue_size=settings.queue_size)
+_watcher: Optional[ChangeStreamWatcher] = None
+
+
+async def subscribe_change_feed(resume_token: Optional[str] = None, collection_=collection) -> Subscription:
+    """Subscribe to the change feed (see ChangeFeed.subscribe). When reading the change stream, the clients can also
+    resume after events not kept by this process (read by another process, or before a restart): the events after it
+    are read again from the change stream. The subscription starts before reading them, so no event is missed"""
+    try:
+        return change_feed.subscribe(resume_token)
+    except ResumeTokenExpiredException:
+        change_stream_token = _change_stream_token(decode_token(resume_token))
+        if change_feed.source != ChangesSource.change_stream or change_stream_token is None:
+            raise
+
+    subscription = change_feed.subscribe()
+    try:
+        events = await run_in_threadpool(
+            _read_change_stream, change_stream_token, change_feed.history_size, collection_
+        )
+    except BaseException:
+        subscription.close()
+        raise
+    subscription.catch_up(events)
+    return subscription
+
+
+async def start_change_feed():
+    """Bind the change feed to the event loop, and choose its source: start watching the change stream if configured
+    (or available, with the auto source); otherwise, the repositories publish their writes"""
+    global _watcher
+    if not settings.enabled:
+        return
+
+    change_feed.bind(asyncio.get_running_loop())
+    if settings.source == ChangesSource.change_stream and get_client() is None:
+        raise ValueError("The change_stream source of the change feed requires the mongo storage engine")
+    use_change_stream = settings.source == ChangesSource.change_stream or (
+        settings.source == ChangesSource.auto and await run_in_threadpool(_change_streams_available)
+    )
+    if use_change_stream:
+        change_feed.source = ChangesSource.change_stream
+        _watcher = ChangeStreamWatcher(change_feed)
+        _watcher.start()
+
+
+def stop_change_feed():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -0,0 +1,306 @@
+"""CLI
+Command line interface: serve the API (default), or import and export persons directly on the database, without
+going through the HTTP API.
+- import: read persons from a NDJSON file (one person per line, like the ones exported), streamed as it is read,
+  validating each one as a PersonCreate (the person_id of exported persons is kept; their age, created and updated
+  are ignored). Valid persons are created with batched unordered inserts, run on a pool of worker threads.
+  The errors of the persons not imported are printed by line number, and the progress and throughput while importing
+- export: write all the persons to stdout (or a file) as NDJSON or CSV, streamed from a database cursor fetching
+  large batches
+- backfill-search: set the normalized values used by the prefix search on the persons written before it was
+  available (a one-off migration, as it scans the whole collection)
+
+Usage: python . [serve]
+       python . import FILE [--batch-size 1000] [--workers 4]
+       python . export [--format ndjson|csv] [--output FILE] [--batch-size 10000] [--fields FIELDS]
+       python . backfill-search [--batch-size 1000]
+"""
+
+# # Native # #
+import io
+import os
+import sys
+import csv
+import argparse
+from time import perf_counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Iterable, Iterator, Callable, BinaryIO, List, Set, Tuple
+
+# # Installed # #
+import orjson
+import pydantic
+
+# # Package # #
+from .models import PersonCreate, PersonField, Address
+from .repositories import PeopleRepository, PersonAnyRead
+from .responses import stream_ndjson
+from .settings import api_settings, storage_settings, StorageEngine
+
+__all__ = ("ImportStats", "import_people", "export_people", "main")
+
+EXPORTED_FIELDS = ("age", "created", "updated")
+"""Read-only fields of the exported persons, ignored when importing them"""
+EXPORT_FORMATS = ("ndjson", "csv")
+
+Line = Tuple[int, bytes]
+"""Line of the imported file: line number (from 1) and content"""
+LineError = Tuple[int, str]
+"""Error of an imported person: line number and message"""
+
+
+class ImportStats:
+    """Counters of an import in progress"""
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.start = perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return perf_counter() - self.start
+
+    @property
+    def rate(self) -> float:
+        """Persons processed (imported or failed) per second"""
+        seconds = self.seconds
+        return (self.imported + self.failed) / seconds if seconds else 0.0
+
+    def format(self) -> str:
+        return (
+            f"{self.imported} persons imported, {self.failed} failed, in {self.seconds:.1f}s "
+            f"({self.rate:.0f} persons/s)"
+        )
+
+
+def _error_message(exception: ValueError) -> str:
+    if isinstance(exception, pydantic.ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(location) for location in error['loc'])}: {error['msg']}" for error in exception.errors()
+        )
+    return str(exception)
+
+
+def _parse(line: bytes) -> Tuple[PersonCreate, Optional[str]]:
+    """Validate an imported person, returning it and its person_id (if it was exported). Raises ValueError"""
+    data = orjson.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("A JSON object is required")
+    person_id = data.pop("person_id", None)
+    if person_id is not None and not isinstance(person_id, str):
+        raise ValueError("person_id: str type expected")
+    for field in EXPORTED_FIELDS:
+        data.pop(field, None)
+    return PersonCreate(**data), person_id
+
+
+def _import_batch(lines: List[Line]) -> Tuple[int, List[LineError]]:
+    """Validate and create a batch of persons, returning the number of persons of the batch, and the errors of the ones
+    not imported. Run by the workers"""
+    errors, creates, person_ids, numbers = list(), list(), list(), list()
+    for number, line in lines:
+        try:
+            create, person_id = _parse(line)
+        except ValueError as ex:
+            errors.append((number, _error_message(ex)))
+            continue
+        creates.append(create)
+        person_ids.append(person_id)
+        numbers.append(number)
+
+    if creates:
+        for index, exception in PeopleRepository.import_many(creates, person_ids).items():
+            errors.append((numbers[index], exception.message))
+    return len(lines), sorted(errors)
+
+
+def _batches(lines: Iterable[bytes], batch_size: int) -> Iterator[List[Line]]:
+    """Group the non-empty lines in batches, as they are read"""
+    batch = list()
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        batch.append((number, line))
+        if len(batch) == batch_size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+
+def import_people(
+        lines: Iterable[bytes], batch_size: int = 1000, workers: int = 4,
+        on_error: Optional[Callable[[int, str], None]] = None,
+        on_progress: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """Import the persons of the given NDJSON lines, in batches validated and inserted by a pool of worker threads.
+    The lines are read as the batches are imported (at most two batches per worker are pending), so the whole input
+    is never held in memory. The errors (line number and message) and the progress (after each batch) are given to the
+    callbacks"""
+    stats = ImportStats()
+
+    def _collect(futures: Iterable[Future]):
+        for future in futures:
+            count, errors = future.result()
+            stats.imported += count - len(errors)
+            stats.failed += len(errors)
+            if on_error:
+                for number, message in errors:
+                    on_error(number, message)
+            if on_progress:
+                on_progress(stats)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import") as executor:
+        pending = set()
+        for batch in _batches(lines, batch_size):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+            pending.add(executor.submit(_import_batch, batch))
+        _collect(wait(pending).done)
+    return stats
+
+
+def _csv_columns(fields: Optional[Set[PersonField]]) -> List[str]:
+    """Columns of the exported CSV: the requested fields (all of them by default), with the address flattened"""
+    columns = list()
+    for field in PersonField:
+        if fields and field not in fields:
+            continue
+        if field is PersonField.address:
+            columns.extend(f"address.{name}" for name in Address.__fields__)
+        else:
+            columns.append(field.value)
+    return columns
+
+
+def _csv_row(person: PersonAnyRead) -> dict:
+    row = person.dict()
+    for name, value in (row.pop("address", None) or dict()).items():
+        row[f"address.{name}"] = value
+    return row
+
+
+def export_people(
+        output: BinaryIO, format: str = "ndjson", batch_size: int = 10000, fields: Optional[Set[PersonField]] = None
+) -> int:
+    """Write all the persons to the output, as NDJSON or CSV, streamed from the database (fetching batches of the
+    given size). If fields are given, only those are exported. Returns the number of persons exported"""
+    people = PeopleRepository.iterate(batch_size, fields)
+    count = 0
+    if format == "csv":
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        writer = csv.DictWriter(text, fieldnames=_csv_columns(fields), extrasaction="ignore")
+        writer.writeheader()
+        for person in people:
+            writer.writerow(_csv_row(person))
+            count += 1
+        text.flush()
+        text.detach()
+    else:
+        for chunk in stream_ndjson(people):
+            output.write(chunk)
+            count += 1
+    return count
+
+
+def _fields(value: str) -> Set[PersonField]:
+    try:
+        return {PersonField(field.strip()) for field in value.split(",")}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"available fields: {', '.join(field.value for field in PersonField)}")
+
+
+def _run_import(options: argparse.Namespace):
+    from .database import create_indexes
+    if storage_settings.engine != StorageEngine.mongo:
+        sys.exit("The persons can only be imported with the Mongo storage engine (STORAGE_ENGINE=mongo)")
+    create_indexes()
+
+    last_progress = perf_counter()
+
+    def _print_error(number: int, message: str):
+        print(f"line {number}: {message}", file=sys.stderr)
+
+    def _print_progress(stats: ImportStats):
+        nonlocal last_progress
+        if perf_counter() - last_progress >= 1:
+            last_progress = perf_counter()
+            print(stats.format(), file=sys.stderr)
+
+    with (nullcontext(sys.stdin.buffer) if options.file == "-" else open(options.file, "rb")) as file:
+        stats = import_people(file, options.batch_size, options.workers, _print_error, _print_progress)
+    print(stats.format(), file=sys.stderr)
+    if stats.failed:
+        sys.exit(1)
+
+
+def _run_export(options: argparse.Namespace):
+    from .database import load_snapshot
+    load_snapshot()
+
+    start = perf_counter()
+    try:
+        with (nullcontext(sys.stdout.buffer) if options.output == "-" else open(options.output, "wb")) as output:
+            count = export_people(output, options.format, options.batch_size, options.fields)
+    except BrokenPipeError:
+        # The reader of stdout stopped reading (like head): stop without writing the pending output on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    seconds = perf_counter() - start
+    rate = count / seconds if seconds else 0.0
+    print(f"{count} persons exported in {seconds:.1f}s ({rate:.0f} persons/s)", file=sys.stderr)
+
+
+def _run_backfill_search(options: argparse.Namespace):
+    from .database import create_indexes, backfill_search_fields
+    if storage_settings.engine != StorageEngine.mongo:
+        sys.exit("The search fields can only be backfilled with the Mongo storage engine (STORAGE_ENGINE=mongo)")
+    create_indexes()
+
+    start = perf_counter()
+    count = backfill_search_fields(options.batch_size)
+    print(f"{count} persons backfilled in {perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+def _run_serve(options: argparse.Namespace):
+    from .app import run
+    run()
+
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python .", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.set_defaults(command=_run_serve)
+    commands = parser.add_subparsers(title="commands")
+    commands.add_parser("serve", help="serve the API (default)").set_defaults(command=_run_serve)
+
+    import_parser = commands.add_parser("import", help="import persons from a NDJSON file")
+    import_parser.set_defaults(command=_run_import)
+    import_parser.add_argument("file", help="NDJSON file with one person per line (- for stdin)")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="persons created on each insert")
+    import_parser.add_argument("--workers", type=int, default=4, help="threads validating and inserting batches")
+
+    export_parser = commands.add_parser("export", help="export all the persons")
+    export_parser.set_defaults(command=_run_export)
+    export_parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    export_parser.add_argument("--output", default="-", help="file to write the persons to (- for stdout)")
+    export_parser.add_argument(
+        "--batch-size", type=int, default=api_settings.export_max_batch_size,
+        help="persons fetched from the database on each round trip"
+    )
+    export_parser.add_argument("--fields", type=_fields, help="comma-separated list of fields to export (default all)")
+
+    backfill_parser = commands.add_parser(
+        "backfill-search", help="set the search fields of the persons written before the search was available"
+    )
+    backfill_parser.set_defaults(command=_run_backfill_search)
+    backfill_parser.add_argument("--batch-size", type=int, default=1000, help="persons updated on each bulk write")
+
+    options = parser.parse_args(args)
+    options.command(options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""COMPRESSION
+Compression of the response bodies (gzip, or brotli if installed), negotiated with the Accept-Encoding header of each
+request. Streamed responses are compressed chunk by chunk as they are sent, without buffering the whole body
+"""
+
+# # Native # #
+import zlib
+from time import perf_counter
+from typing import Optional, Sequence, Dict, Callable, List
+
+# # Installed # #
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+# # Package # #
+from .metrics import compressed_responses, compression_input_bytes, compression_output_bytes, compression_seconds
+from .settings import compression_settings, metrics_settings, CompressionSettings
+from .utils import get_encoded_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__all__ = ("CompressionMiddleware", "negotiate_encoding", "available_encodings")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+"""Content types (prefixes) of the compressed responses"""
+FLUSHED_TYPES = ("text/event-stream",)
+"""Content types of the streamed responses whose chunks must reach the client as soon as they are sent
+(compressed chunks are flushed, instead of waiting for the compressor to fill a block)"""
+
+
+class _Compressor:
+    """Incremental compressor of a response body"""
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        """Return all the data compressed so far, so the client can decompress it"""
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        raise NotImplementedError
+
+
+class _GzipCompressor(_Compressor):
+    def __init__(self, settings: CompressionSettings):
+        self._compressor = zlib.compressobj(settings.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor(_Compressor):
+    def __init__(self, settings: CompressionSettings):
+        self._compressor = brotli.Compressor(quality=settings.brotli_quality, mode=brotli.MODE_TEXT)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+_COMPRESSORS: Dict[str, Callable[[CompressionSettings], _Compressor]] = {"gzip": _GzipCompressor}
+if brotli is not None:
+    _COMPRESSORS["br"] = _BrotliCompressor
+
+
+def available_encodings(settings: CompressionSettings = compression_settings) -> List[str]:
+    """Encodings enabled on the settings that can be used, by preference"""
+    encodings = (encoding.strip() for encoding in settings.encodings.split(","))
+    return [encoding for encoding in encodings if encoding in _COMPRESSORS]
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Sequence[str]) -> Optional[str]:
+    """Choose the encoding of a response, among the given ones (by preference), from the Accept-Encoding header of the
+    request: the one with the highest quality value (q), or the preferred one on ties. None if none is accepted"""
+    qualities = dict()
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip()] = quality
+
+    default = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, default)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing the bodies of the successful responses with a compressible content type, with the
+    encoding negotiated with the client. Complete bodies smaller than the min_size are sent uncompressed"""
+    def __init__(self, app: ASGIApp, settings: CompressionSettings = compression_settings):
+        self.app = app
+        self.settings = settings
+        self.encodings = available_encodings(settings)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.settings.enabled or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        await self.app(scope, receive, _CompressionResponder(send, encoding, self.settings).send)
+
+
+class _CompressionResponder:
+    """Send function of a single response, compressing its body (if applicable) before sending it"""
+    def __init__(self, send: Send, encoding: Optional[str], settings: CompressionSettings):
+        self._send = send
+        self.encoding = encoding
+        self.settings = settings
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._flush = False
+        self._passthrough = False
+        self._input_bytes = 0
+        self._output_bytes = 0
+        self._seconds = 0.0
+
+    async def send(self, message: Message):
+        if self._passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            self._start_response(message)
+            if self._passthrough:
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self._compressor is None:
+            # First body message: the response is complete (sent at once) or streamed
+            if not more_body and len(body) < self.settings.min_size:
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+            self._begin_compression()
+
+        data = self._compress(body, more_body)
+        if self._start is not None:
+            headers = MutableHeaders(scope=self._start)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            await self._send(self._start)
+            self._start = None
+
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self._observe()
+
+    def _compress(self, body: bytes, more_body: bool) -> bytes:
+        start = perf_counter()
+        data = self._compressor.compress(body)
+        if not more_body:
+            data += self._compressor.finish()
+        elif self._flush:
+            data += self._compressor.flush()
+        self._seconds += perf_counter() - start
+        self._input_bytes += len(body)
+        self._output_bytes += len(data)
+        return data
+
+    def _start_response(self, message: Message):
+        """Keep the start of the response until its first body message is sent (to know if it must be compressed),
+        or send it right away (passthrough) if it must not"""
+        headers = Headers(raw=message["headers"])
+        content_type = headers.get("content-type", "")
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+        if compressible:
+            MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+
+        status = message["status"]
+        self._passthrough = (
+            self.encoding is None or not compressible or not 200 <= status < 300 or status in (204, 206)
+            or "content-encoding" in headers
+        )
+        self._flush = content_type.startswith(FLUSHED_TYPES)
+        self._start = message
+
+    def _begin_compression(self):
+        """Set the encoding on the start of the response (its length is set once known). A strong ETag gets the
+        encoding appended, as the encoded response differs from the unencoded one (see get_encoded_etag)"""
+        headers = MutableHeaders(scope=self._start)
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = get_encoded_etag(headers["etag"], self.encoding)
+        self._compressor = _COMPRESSORS[self.encoding](self.settings)
+
+    def _observe(self):
+        if metrics_settings.enabled:
+            compressed_responses.inc(self.encoding)
+            compression_input_bytes.inc(self.encoding, amount=self._input_bytes)
+            compression_output_bytes.inc(self.encoding, amount=self._output_bytes)
+            compression_seconds.inc(self.encoding, amount=self._seconds)
@@ -0,0 +1,112 @@
+"""CONSISTENCY
+Causal consistency between requests (read-your-writes, even when reading from secondaries), using Mongo causal
+sessions. The token sent by the client (returned by a previous response) is kept for the current request on a context
+variable, and the repositories run their operations on a causal session advanced to that token, then updating it.
+Only available with the Mongo storage engine, and if enabled on the settings
+"""
+
+# # Native # #
+import base64
+from contextvars import ContextVar
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Iterator, AsyncIterator, Tuple, Any
+
+# # Installed # #
+import bson
+from pymongo.client_session import ClientSession
+from pymongo.asynchronous.client_session import AsyncClientSession
+
+# # Package # #
+from .exceptions import InvalidCausalTokenException
+from .settings import mongo_settings
+
+__all__ = (
+    "CAUSAL_TOKEN_HEADER", "CausalContext", "set_causal_context", "causal_token_requested",
+    "causal_session", "async_causal_session"
+)
+
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+
+class CausalContext:
+    """Causal consistency token of the current request: the one sent by the client, updated after each operation"""
+    def __init__(self, token: Optional[str] = None):
+        self.requested = bool(token)
+        self.token = token
+
+
+_causal_context: ContextVar[Optional[CausalContext]] = ContextVar("causal_context", default=None)
+
+
+def set_causal_context(token: Optional[str]) -> CausalContext:
+    """Set the causal consistency token sent by the client for the current request (context)"""
+    context = CausalContext(token)
+    _causal_context.set(context)
+    return context
+
+
+def causal_token_requested() -> bool:
+    """Check if the current request must read the writes of a causal consistency token sent by the client"""
+    context = _causal_context.get()
+    return mongo_settings.causal_consistency and context is not None and context.requested
+
+
+def _encode_token(session: Any) -> Optional[str]:
+    if session.operation_time is None:
+        return None
+    data = {"operationTime": session.operation_time}
+    if session.cluster_time:
+        data["clusterTime"] = session.cluster_time
+    return base64.urlsafe_b64encode(bson.encode(data)).decode().rstrip("=")
+
+
+def _advance(session: Any, token: str):
+    """Advance the session to the operation and cluster times of the given token"""
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if "clusterTime" in data:
+            session.advance_cluster_time(data["clusterTime"])
+        session.advance_operation_time(data["operationTime"])
+    except Exception:
+        raise InvalidCausalTokenException()
+
+
+def _session_client(collection: Any) -> Tuple[Optional[CausalContext], Any]:
+    """Context of the current request and client to start causal sessions from, if the causal consistency
+    is enabled, and the collection is a Mongo collection (the memory engine does not have sessions)"""
+    context = _causal_context.get()
+    database = getattr(collection, "database", None)
+    if not mongo_settings.causal_consistency or context is None or database is None:
+        return None, None
+    return context, database.client
+
+
+@contextmanager
+def causal_session(collection: Any) -> Iterator[Optional[ClientSession]]:
+    """Start a causal session on the client of the given collection, advanced to the token of the current request,
+    and update the token after using it. If causal consistency is not used, the session is None"""
+    context, client = _session_client(collection)
+    if client is None:
+        yield None
+        return
+
+    with client.start_session(causal_consistency=True) as session:
+        if context.token:
+            _advance(session, context.token)
+        yield session
+        context.token = _encode_token(session) or context.token
+
+
+@asynccontextmanager
+async def async_causal_session(collection: Any) -> AsyncIterator[Optional[AsyncClientSession]]:
+    """Same as causal_session, for the async client"""
+    context, client = _session_client(collection)
+    if client is None:
+        yield None
+        return
+
+    async with client.start_session(causal_consistency=True) as session:
+        if context.token:
+            _advance(session, context.token)
+        yield session
+        context.token = _encode_token(session) or context.token
@@ -1,15 +1,235 @@
 """DATABASE
-MongoDB database initialization
+Storage initialization: MongoDB database, or the in-memory engine (depending on the storage engine setting)
 """
 
+# # Native # #
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Iterator, Callable, Any
+
 # # Installed # #
-from pymongo import MongoClient
-from pymongo.collection import Collection
+from pymongo import MongoClient, AsyncMongoClient, UpdateOne
+from pymongo.read_preferences import PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 
 # # Package # #
-from .settings import mongo_settings as settings
+from .models import PersonRead
+from .models.indexes import PEOPLE_INDEXES, TOMBSTONES_INDEXES
+from .utils import get_search_fields
+from .storage import StorageCollection, AsyncStorageCollection, MemoryCollection, AsyncMemoryCollection
+from .metrics import MongoCommandListener, MongoPoolListener
+from .profiling import ProfilingCommandListener
+from .settings import mongo_settings as settings, storage_settings, metrics_settings, profiling_settings
+from .settings import StorageEngine, ReadPreferenceMode
+
+__all__ = (
+    "get_client", "get_async_client", "collection", "async_collection", "read_preference",
+    "tombstones_collection", "async_tombstones_collection",
+    "create_indexes", "backfill_search_fields", "load_snapshot", "warm_up"
+)
+
+
+def _client_options() -> dict:
+    """Options of the Mongo clients (connection pool, timeouts, compression and write concern) from the settings.
+    Options not set are left to the driver defaults"""
+    write_concern = settings.write_concern
+    if write_concern and write_concern.isdigit():
+        write_concern = int(write_concern)
+
+    options = dict(
+        maxPoolSize=settings.max_pool_size,
+        minPoolSize=settings.min_pool_size,
+        maxIdleTimeMS=settings.max_idle_time_ms,
+        waitQueueTimeoutMS=settings.wait_queue_timeout_ms,
+        socketTimeoutMS=settings.socket_timeout_ms,
+        connectTimeoutMS=settings.connect_timeout_ms,
+        serverSelectionTimeoutMS=settings.server_selection_timeout_ms,
+        compressors=settings.compressors,
+        w=write_concern,
+        journal=settings.write_concern_journal,
+        wTimeoutMS=settings.write_concern_timeout_ms
+    )
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _event_listeners() -> list:
+    """Listeners of the Mongo clients, collecting the metrics of the commands and connection pools, and the duration
+    of the commands of the profiled requests (if enabled)"""
+    listeners = list()
+    if metrics_settings.enabled:
+        listeners.extend((MongoCommandListener(), MongoPoolListener()))
+    if profiling_settings.enabled:
+        listeners.append(ProfilingCommandListener())
+    return listeners
+
+
+def _read_preference():
+    """Read preference of the reads performed by the GET endpoints, from the settings (None for primary)"""
+    if settings.read_preference == ReadPreferenceMode.primary:
+        return None
+    read_preference_class = {
+        ReadPreferenceMode.primary_preferred: PrimaryPreferred,
+        ReadPreferenceMode.secondary: Secondary,
+        ReadPreferenceMode.secondary_preferred: SecondaryPreferred,
+        ReadPreferenceMode.nearest: Nearest
+    }[settings.read_preference]
+    max_staleness = settings.max_staleness_seconds
+    return read_preference_class(max_staleness=max_staleness if max_staleness is not None else -1)
+
+
+class _Clients:
+    """Mongo clients (sync and async) of the current process, created on first use. The clients are not fork-safe
+    (connection pools and monitor threads), so they are not created on import: each worker process creates its own
+    ones, and a process forked after using them (like the workers of a pre-fork process manager) discards them"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client: Optional[MongoClient] = None
+        self._async_client: Optional[AsyncMongoClient] = None
+        os.register_at_fork(after_in_child=self.reset)
+
+    def client(self) -> MongoClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = MongoClient(settings.uri, event_listeners=_event_listeners(), **_client_options())
+        return self._client
+
+    def async_client(self) -> AsyncMongoClient:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncMongoClient(
+                        settings.uri, event_listeners=_event_listeners(), **_client_options()
+                    )
+        return self._async_client
+
+    def reset(self):
+        """Forget the clients inherited from the parent process (they must not be used nor closed on the child)"""
+        self._lock = threading.Lock()
+        self._client = self._async_client = None
+
+
+class _LazyCollection:
+    """Collection of a Mongo client of the current process (see _Clients), resolved when its attributes are accessed,
+    so the collections can be imported by the modules using them before the clients exist"""
+    def __init__(self, get_client: Callable[[], Any], name: str):
+        self._get_client = get_client
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = self._get_client()
+        if client is not self._client:
+            self._collection = client[settings.database][self._name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, item: str):
+        return getattr(self._resolve(), item)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._name!r})"
+
+
+_clients: Optional[_Clients] = None
+collection: StorageCollection
+async_collection: AsyncStorageCollection
+tombstones_collection: StorageCollection
+"""Ids of the deleted persons, kept for some time (see the tombstones_ttl setting) for the changes endpoint"""
+async_tombstones_collection: AsyncStorageCollection
+read_preference = _read_preference()
+"""Read preference of the reads that can be served by secondaries, set per operation by the repositories
+(None for reading from the primary)"""
+
+if storage_settings.engine == StorageEngine.memory:
+    collection = MemoryCollection()
+    async_collection = AsyncMemoryCollection(collection)
+    tombstones_collection = MemoryCollection()
+    async_tombstones_collection = AsyncMemoryCollection(tombstones_collection)
+else:
+    _clients = _Clients()
+    collection = _LazyCollection(_clients.client, settings.collection)
+    tombstones_collection = _LazyCollection(_clients.client, settings.tombstones_collection)
+    async_collection = _LazyCollection(_clients.async_client, settings.collection)
+    async_tombstones_collection = _LazyCollection(_clients.async_client, settings.tombstones_collection)
+
+
+def get_client() -> Optional[MongoClient]:
+    """Sync Mongo client of the current process, created on first call (None with the memory engine)"""
+    return _clients.client() if _clients is not None else None
+
+
+def get_async_client() -> Optional[AsyncMongoClient]:
+    """Async Mongo client of the current process, created on first call (None with the memory engine)"""
+    return _clients.async_client() if _clients is not None else None
+
+
+async def warm_up():
+    """Create the Mongo client used by the requests (sync or async, depending on the async_driver setting) and open
+    the configured number of connections on its pool, before the worker is ready to serve requests"""
+    count = min(settings.warmup_connections, settings.max_pool_size)
+    if _clients is None or not count:
+        return
+
+    if settings.async_driver:
+        client = get_async_client()
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(count)))
+        return
+
+    # Each concurrent ping checks out (and opens) a different connection of the pool
+    client = get_client()
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=count, thread_name_prefix="mongo-warmup") as executor:
+        await asyncio.gather(*(loop.run_in_executor(executor, client.admin.command, "ping") for _ in range(count)))
+
+
+def create_indexes():
+    """Create the indexes required by the repositories on the people and tombstones collections,
+    if they do not exist"""
+    collection.create_indexes(PEOPLE_INDEXES)
+    tombstones_collection.create_indexes(TOMBSTONES_INDEXES)
+
+
+def backfill_search_fields(batch_size: int = 1000) -> int:
+    """Set the normalized values used by the prefix search on the documents of the persons written before the search
+    was available (Mongo engine only: the memory engine is loaded with them). Returns the number of persons updated.
+    It scans the whole collection, so it is run once, as a migration (python . backfill-search), not on startup"""
+    if storage_settings.engine != StorageEngine.mongo:
+        return 0
+
+    count = 0
+    query = {"search": {"$exists": False}}
+    documents = collection.find(query, projection={"name": True, "address.city": True}, batch_size=batch_size)
+    operations = list()
+    for document in documents:
+        search = get_search_fields(document.get("name", ""), document.get("address", dict()).get("city"))
+        operations.append(UpdateOne({"_id": document["_id"], **query}, {"$set": {"search": search}}))
+        if len(operations) == batch_size:
+            count += collection.bulk_write(operations, ordered=False).modified_count
+            operations = list()
+    if operations:
+        count += collection.bulk_write(operations, ordered=False).modified_count
+    return count
+
+
+def _snapshot_documents(path: str) -> Iterator[dict]:
+    """Read the documents of the persons from a file exported by the API (JSON array or NDJSON)"""
+    with open(path) as file:
+        content = file.read().strip()
+    items = json.loads(content) if content.startswith("[") else (json.loads(line) for line in content.splitlines())
+    for item in items:
+        person = PersonRead(**item)
+        document = person.dict(exclude={"person_id", "age"})
+        document["_id"] = person.person_id
+        document["version"] = 1
+        document["search"] = get_search_fields(person.name, person.address.city)
+        yield document
 
-__all__ = ("client", "collection")
 
-client = MongoClient(settings.uri)
-collection: Collection = client[settings.database][settings.collection]
+def load_snapshot():
+    """Load the persons of the configured snapshot file (if any) on the in-memory engine"""
+    if storage_settings.engine == StorageEngine.memory and storage_settings.snapshot:
+        collection.insert_many(list(_snapshot_documents(storage_settings.snapshot)), ordered=False)
@@ -17,9 +17,12 @@ from .models.errors import *
 
 __all__ = (
     "BaseAPIException", "BaseIdentifiedException",
-    "NotFoundException", "AlreadyExistsException",
-    "PersonNotFoundException", "PersonAlreadyExistsException",
-    "get_exception_responses"
+    "NotFoundException", "AlreadyExistsException", "ModifiedException",
+    "PersonNotFoundException", "PersonAlreadyExistsException", "PersonModifiedException",
+    "InvalidCursorException", "InvalidCausalTokenException", "CacheDisabledException", "MetricsDisabledException",
+    "ProfilingDisabledException", "ChangesDisabledException", "InvalidResumeTokenException",
+    "ResumeTokenExpiredException", "InvalidSyncTokenException", "SyncTokenExpiredException",
+    "NotReadyException", "ServiceOverloadedException", "get_exception_responses"
 )
 
 
@@ -72,6 +75,14 @@ class AlreadyExistsException(BaseIdentifiedException):
     model = AlreadyExistsError
 
 
+class ModifiedException(BaseIdentifiedException):
+    """Base error for exceptions raised because an entity was modified since the revision given on a conditional write
+    (If-Match header)"""
+    message = "The entity was modified"
+    code = statuscode.HTTP_412_PRECONDITION_FAILED
+    model = ModifiedError
+
+
 class PersonNotFoundException(NotFoundException):
     """Error raised when a person does not exist"""
     message = "The person does not exist"
@@ -82,6 +93,96 @@ class PersonAlreadyExistsException(AlreadyExistsException):
     message = "The person already exists"
 
 
+class PersonModifiedException(ModifiedException):
+    """Error raised when a person was modified since the revision given on a conditional write"""
+    message = "The person was modified; read it again and retry"
+
+
+class InvalidCursorException(BaseAPIException):
+    """Error raised when a pagination cursor is not valid, or was not generated for the current sorting"""
+    message = "The pagination cursor is not valid"
+    code = statuscode.HTTP_400_BAD_REQUEST
+
+
+class InvalidCausalTokenException(BaseAPIException):
+    """Error raised when the causal consistency token sent by the client is not valid"""
+    message = "The causal consistency token is not valid"
+    code = statuscode.HTTP_400_BAD_REQUEST
+
+
+class CacheDisabledException(BaseAPIException):
+    """Error raised when requesting info about the cache, when it is disabled"""
+    message = "The cache is disabled"
+    code = statuscode.HTTP_404_NOT_FOUND
+
+
+class MetricsDisabledException(BaseAPIException):
+    """Error raised when requesting the metrics, when they are disabled"""
+    message = "The metrics are disabled"
+    code = statuscode.HTTP_404_NOT_FOUND
+
+
+class ProfilingDisabledException(BaseAPIException):
+    """Error raised when requesting the profiler, when it is disabled"""
+    message = "The profiling is disabled"
+    code = statuscode.HTTP_404_NOT_FOUND
+
+
+class ChangesDisabledException(BaseAPIException):
+    """Error raised when requesting the change feed, when it is disabled"""
+    message = "The change feed is disabled"
+    code = statuscode.HTTP_404_NOT_FOUND
+
+
+class InvalidResumeTokenException(BaseAPIException):
+    """Error raised when the event id sent to resume the change feed is not valid"""
+    message = "The change feed resume token is not valid"
+    code = statuscode.HTTP_400_BAD_REQUEST
+
+
+class ResumeTokenExpiredException(BaseAPIException):
+    """Error raised when the change feed cannot be resumed from the event id sent, as the events after it are no
+    longer available (too old, or published by a previous run of the API). The client must resync its persons"""
+    message = "The change feed cannot be resumed from this token; the persons must be read again"
+    code = statuscode.HTTP_410_GONE
+
+
+class InvalidSyncTokenException(BaseAPIException):
+    """Error raised when the sync token sent to the changes endpoint is not valid"""
+    message = "The sync token is not valid"
+    code = statuscode.HTTP_400_BAD_REQUEST
+
+
+class SyncTokenExpiredException(BaseAPIException):
+    """Error raised when the sync token sent to the changes endpoint is older than the deleted persons are kept.
+    The client must read all the persons again (requesting the changes without sync token)"""
+    message = "The sync token expired; the persons must be read again"
+    code = statuscode.HTTP_410_GONE
+
+
+class NotReadyException(BaseAPIException):
+    """Error raised by the readiness endpoint while the worker is starting up or shutting down"""
+    message = "The API is not ready to serve requests"
+    code = statuscode.HTTP_503_SERVICE_UNAVAILABLE
+
+
+class ServiceOverloadedException(BaseAPIException):
+    """Error raised when a request is not admitted because too many requests are being processed, and it could not
+    wait for its turn (the wait queue is full, or it waited for too long). Clients should retry after the time
+    given on the Retry-After header"""
+    message = "The API is overloaded; retry later"
+    code = statuscode.HTTP_503_SERVICE_UNAVAILABLE
+
+    def __init__(self, retry_after: int, **kwargs):
+        super().__init__(**kwargs)
+        self.retry_after = retry_after
+
+    def response(self):
+        response = super().response()
+        response.headers["Retry-After"] = str(self.retry_after)
+        return response
+
+
 def get_exception_responses(*args: Type[BaseAPIException]) -> dict:
     """Given BaseAPIException classes, return a dict of responses used on FastAPI endpoint definition, with the format:
     {statuscode: schema, statuscode: schema, ...}"""
@@ -0,0 +1,280 @@
+"""METRICS
+In-process metrics (counters, gauges and histograms) exposed in the Prometheus text format, and the listeners that
+collect them from the Mongo clients (command timings and errors, connection pool checkouts)
+"""
+
+# # Native # #
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Tuple, Sequence, Iterator
+
+# # Installed # #
+from pymongo import monitoring
+
+__all__ = (
+    "Counter", "Gauge", "Histogram", "MetricsRegistry",
+    "MongoCommandListener", "MongoPoolListener",
+    "registry", "http_requests", "http_request_duration", "http_requests_in_flight",
+    "mongo_command_duration", "mongo_command_errors",
+    "mongo_pool_checkout_wait", "mongo_pool_checkout_failures", "mongo_pool_connections_in_use",
+    "change_feed_subscribers", "change_feed_events", "change_feed_lagged_subscribers",
+    "compressed_responses", "compression_input_bytes", "compression_output_bytes", "compression_seconds",
+    "coalescing_reads", "admission_limit", "admission_queued", "admission_rejected"
+)
+
+Labels = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Upper bounds (in seconds) of the buckets of the latency histograms"""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base of the metrics: a value (or set of values) per combination of label values.
+    Updates only take a lock and change a few numbers; the exposition text is built when rendering"""
+    type = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, object] = dict()
+        self._lock = Lock()
+
+    def _labels_text(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Value that only increases (like number of requests)"""
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{self._labels_text(labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can increase and decrease (like requests in progress)"""
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (like latencies), counted on buckets with the given upper bounds.
+    The count of each bucket is kept individually, and made cumulative (as Prometheus expects) when rendering"""
+    type = "histogram"
+
+    def __init__(
+            self, name: str, description: str,
+            labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, *labels: str):
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # Counts of each bucket, followed by the sum of the values
+                counts = self._values[labels] = [0] * len(self.buckets) + [0.0]
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def get(self, *labels: str) -> Tuple[int, float]:
+        """Return the count and sum of the values observed with the given labels"""
+        counts = self._values.get(labels)
+        if counts is None:
+            return 0, 0.0
+        return sum(counts[:-1]), counts[-1]
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        for labels, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = self._labels_text(labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{self._labels_text(labels)} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{self._labels_text(labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together on the metrics endpoint"""
+    def __init__(self):
+        self._metrics: List[_Metric] = list()
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests: Counter = registry.register(Counter(
+    "http_requests_total", "Number of requests processed, by method, route and response status",
+    labels=("method", "route", "status")
+))
+http_request_duration: Histogram = registry.register(Histogram(
+    "http_request_duration_seconds", "Time until the response starts (headers sent), by method and route",
+    labels=("method", "route")
+))
+http_requests_in_flight: Gauge = registry.register(Gauge(
+    "http_requests_in_flight", "Number of requests being processed"
+))
+compressed_responses: Counter = registry.register(Counter(
+    "http_compressed_responses_total", "Number of compressed responses, by encoding",
+    labels=("encoding",)
+))
+compression_input_bytes: Counter = registry.register(Counter(
+    "http_compression_input_bytes_total", "Bytes of the response bodies before compression, by encoding",
+    labels=("encoding",)
+))
+compression_output_bytes: Counter = registry.register(Counter(
+    "http_compression_output_bytes_total", "Bytes of the response bodies after compression, by encoding",
+    labels=("encoding",)
+))
+compression_seconds: Counter = registry.register(Counter(
+    "http_compression_seconds_total", "Time spent compressing response bodies, by encoding",
+    labels=("encoding",)
+))
+admission_limit: Gauge = registry.register(Gauge(
+    "admission_limit", "Current limit of requests processed at once, by route class (read or write)",
+    labels=("route_class",)
+))
+admission_queued: Gauge = registry.register(Gauge(
+    "admission_queued", "Number of requests waiting to be admitted, by route class",
+    labels=("route_class",)
+))
+admission_rejected: Counter = registry.register(Counter(
+    "admission_rejected_total", "Number of requests rejected by the admission control (503), by route class and "
+                                "reason (queue_full or queue_timeout)",
+    labels=("route_class", "reason")
+))
+coalescing_reads: Counter = registry.register(Counter(
+    "repository_coalescing_reads_total", "Number of reads (get or list) by method and outcome: executed on the "
+                                         "database, or coalesced (sharing an identical read in flight)",
+    labels=("method", "outcome")
+))
+mongo_command_duration: Histogram = registry.register(Histogram(
+    "mongo_command_duration_seconds", "Duration of the Mongo commands (succeeded or failed), by command",
+    labels=("command",)
+))
+mongo_command_errors: Counter = registry.register(Counter(
+    "mongo_command_errors_total", "Number of failed Mongo commands, by command",
+    labels=("command",)
+))
+mongo_pool_checkout_wait: Histogram = registry.register(Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time waited to check out a connection from the Mongo connection pool"
+))
+mongo_pool_checkout_failures: Counter = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Number of failed checkouts from the Mongo connection pool, by reason",
+    labels=("reason",)
+))
+mongo_pool_connections_in_use: Gauge = registry.register(Gauge(
+    "mongo_pool_connections_in_use", "Number of connections checked out from the Mongo connection pools"
+))
+change_feed_subscribers: Gauge = registry.register(Gauge(
+    "change_feed_subscribers", "Number of subscribers of the change feed"
+))
+change_feed_events: Counter = registry.register(Counter(
+    "change_feed_events_total", "Number of events published on the change feed, by operation",
+    labels=("operation",)
+))
+change_feed_lagged_subscribers: Counter = registry.register(Counter(
+    "change_feed_lagged_subscribers_total", "Number of subscribers disconnected because their queue of pending "
+                                            "events filled up"
+))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Listener registered on the Mongo clients, collecting the duration and errors of each command"""
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name)
+        mongo_command_errors.inc(event.command_name)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Listener registered on the Mongo clients, collecting the connection pool checkout wait times and failures,
+    and the connections in use"""
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent):
+        mongo_pool_checkout_wait.observe(event.duration)
+        mongo_pool_connections_in_use.inc()
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent):
+        mongo_pool_checkout_wait.observe(event.duration)
+        mongo_pool_checkout_failures.inc(str(event.reason))
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent):
+        mongo_pool_connections_in_use.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
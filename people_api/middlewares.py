@@ -2,19 +2,62 @@
 Functions that run as something gets processed
 """
 
+# # Native # #
+from time import perf_counter
+from typing import Optional
+
 # # Installed # #
 from fastapi import Request
 
 # # Package # #
 from .exceptions import *
+from .metrics import http_requests, http_request_duration, http_requests_in_flight
+from .profiling import profiler, span
+from .settings import metrics_settings, profiling_settings
 
 __all__ = ("request_handler",)
 
+UNMATCHED_ROUTE = "<unmatched>"
+"""Route label of the metrics of requests not matching any route (so random paths do not create new series)"""
+
 
 async def request_handler(request: Request, call_next):
-    """Middleware used to process each request on FastAPI, to provide error handling (convert exceptions to responses).
+    """Middleware used to process each request on FastAPI, to provide error handling (convert exceptions to responses),
+    collect the metrics of the requests (labeled by the route path template), and profile them (if enabled).
     TODO: add logging and individual request traceability
     """
+    if not metrics_settings.enabled and not profiling_settings.enabled:
+        return await _handle_errors(request, call_next)
+
+    start = perf_counter()
+    status = 500
+    profile = profiler.start(sample=_sampling_requested(request)) if profiling_settings.enabled else None
+    if metrics_settings.enabled:
+        http_requests_in_flight.inc()
+    try:
+        with span("handler"):
+            response = await _handle_errors(request, call_next)
+        status = response.status_code
+        return response
+
+    finally:
+        duration = perf_counter() - start
+        route = request.scope.get("route")
+        route = route.path if route is not None else None
+        if metrics_settings.enabled:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(duration, request.method, route or UNMATCHED_ROUTE)
+            http_requests.inc(request.method, route or UNMATCHED_ROUTE, str(status))
+        if profile is not None:
+            profiler.finish(profile, request.method, request.url.path, route, status, duration)
+
+
+def _sampling_requested(request: Request) -> bool:
+    header: Optional[str] = profiling_settings.sampling_header
+    return bool(header and request.headers.get(header))
+
+
+async def _handle_errors(request: Request, call_next):
     try:
         return await call_next(request)
 
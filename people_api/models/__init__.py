@@ -1,4 +1,12 @@
 from .person_update import *
 from .person_create import *
 from .person_read import *
+from .person_partial_read import *
 from .person_address import *
+from .people_list import *
+from .bulk import *
+from .cache_stats import *
+from .profiling import *
+from .people_changes import *
+from .changes import *
+from .health import *
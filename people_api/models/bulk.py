@@ -0,0 +1,37 @@
+"""MODELS - BULK
+Models used on bulk write requests (create, update and delete multiple persons on a single request) and responses
+"""
+
+# # Native # #
+from typing import Optional, Union, List
+
+# # Package # #
+from .common import BaseModel
+from .errors import BaseError, BaseIdentifiedError
+from .fields import PersonFields, BulkFields
+from .person_read import PersonRead
+from .person_update import PersonUpdate
+
+__all__ = ("PersonBulkUpdate", "BulkResult", "BulkResults")
+
+
+class PersonBulkUpdate(BaseModel):
+    """Item of Person bulk PATCH requests"""
+    person_id: str = PersonFields.person_id
+    update: PersonUpdate = BulkFields.update
+
+
+class BulkResult(BaseModel):
+    """Result of a single item of a bulk request"""
+    index: int = BulkFields.index
+    status_code: int = BulkFields.status_code
+    person_id: Optional[str] = PersonFields.person_id
+    person: Optional[PersonRead] = BulkFields.person
+    error: Optional[Union[BaseIdentifiedError, BaseError]] = BulkFields.error
+
+
+class BulkResults(BaseModel):
+    """Body of bulk requests responses"""
+    succeeded: int = BulkFields.succeeded
+    failed: int = BulkFields.failed
+    results: List[BulkResult] = BulkFields.results
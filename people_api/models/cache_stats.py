@@ -0,0 +1,20 @@
+"""MODELS - CACHE STATS
+Counters of the in-process read cache
+"""
+
+# # Package # #
+from .common import BaseModel
+from .fields import CacheStatsFields
+
+__all__ = ("CacheStats",)
+
+
+class CacheStats(BaseModel):
+    """Body of Cache stats GET responses"""
+    entries: int = CacheStatsFields.entries
+    max_entries: int = CacheStatsFields.max_entries
+    hits: int = CacheStatsFields.hits
+    misses: int = CacheStatsFields.misses
+    evictions: int = CacheStatsFields.evictions
+    expirations: int = CacheStatsFields.expirations
+    invalidations: int = CacheStatsFields.invalidations
@@ -0,0 +1,31 @@
+"""MODELS - CHANGES
+Models of the change feed: events of the persons created, updated and deleted
+"""
+
+# # Native # #
+from enum import Enum
+from typing import Optional
+
+# # Package # #
+from .common import BaseModel
+from .person_read import PersonRead
+from .person_update import PersonUpdate
+from .fields import ChangeFields
+
+__all__ = ("ChangeOperation", "PersonChange")
+
+
+class ChangeOperation(str, Enum):
+    create = "create"
+    update = "update"
+    delete = "delete"
+
+
+class PersonChange(BaseModel):
+    """Event of the change feed. Creates include the created person, and updates only the updated fields"""
+    event_id: str = ChangeFields.event_id
+    operation: ChangeOperation = ChangeFields.operation
+    person_id: str = ChangeFields.person_id
+    time: float = ChangeFields.time
+    person: Optional[PersonRead] = ChangeFields.person
+    update: Optional[PersonUpdate] = ChangeFields.update
@@ -2,10 +2,13 @@
 Common variables and base classes for the models
 """
 
+# # Native # #
+from typing import Optional
+
 # # Installed # #
 import pydantic
 
-__all__ = ("BaseModel",)
+__all__ = ("BaseModel", "RevisionedModel")
 
 
 class BaseModel(pydantic.BaseModel):
@@ -26,3 +29,17 @@ class BaseModel(pydantic.BaseModel):
     class Config:
         extra = pydantic.Extra.forbid  # forbid sending additional fields/properties
         anystr_strip_whitespace = True  # strip whitespaces from strings
+
+
+class RevisionedModel(BaseModel):
+    """Models read from the database inherit from this class. They keep the revision of the document/s they were
+    read from (set by the repositories), used to generate the ETags of the responses"""
+    _revision: Optional[str] = pydantic.PrivateAttr(None)
+
+    @property
+    def revision(self) -> Optional[str]:
+        return self._revision
+
+    def set_revision(self, revision: str):
+        self._revision = revision
+        return self
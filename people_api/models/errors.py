@@ -5,7 +5,7 @@ Models for Error responses. Custom exceptions must be associated with one of the
 # # Installed # #
 from pydantic import BaseModel, Field
 
-__all__ = ("BaseError", "BaseIdentifiedError", "NotFoundError", "AlreadyExistsError")
+__all__ = ("BaseError", "BaseIdentifiedError", "NotFoundError", "AlreadyExistsError", "ModifiedError")
 
 
 class BaseError(BaseModel):
@@ -24,3 +24,8 @@ class NotFoundError(BaseIdentifiedError):
 class AlreadyExistsError(BaseIdentifiedError):
     """An entity being created already exists"""
     pass
+
+
+class ModifiedError(BaseIdentifiedError):
+    """An entity was modified since the revision a conditional write was based on"""
+    pass
@@ -11,7 +11,10 @@ from pydantic import Field
 # # Package # #
 from ..utils import get_time, get_uuid
 
-__all__ = ("PersonFields", "AddressFields")
+__all__ = (
+    "PersonFields", "AddressFields", "PeopleListFields", "BulkFields", "CacheStatsFields", "ProfilingFields",
+    "ChangeFields", "PeopleChangesFields", "HealthFields"
+)
 
 _string = dict(min_length=1)
 """Common attributes for all String fields"""
@@ -82,3 +85,111 @@ class AddressFields:
         example="19823",
         **_string
     )
+
+
+class PeopleListFields:
+    people = Field(
+        description="Persons on this page"
+    )
+    next_cursor = Field(
+        description="Opaque token to request the next page (through the cursor query param). "
+                    "Not returned if this is the last page",
+        example="WyJjcmVhdGVkIiwgImFzYyIsIDE1ODU2OTkyMDAsICIuLi4iXQ"
+    )
+
+
+class BulkFields:
+    update = Field(
+        description="Fields to update on the person"
+    )
+    index = Field(
+        description="Position of the item on the request body"
+    )
+    status_code = Field(
+        description="Status code of the item, same as it would be returned if requested individually",
+        example=201
+    )
+    person = Field(
+        description="The created person (only on create)"
+    )
+    error = Field(
+        description="Error of the item, if failed"
+    )
+    succeeded = Field(
+        description="Number of items that succeeded"
+    )
+    failed = Field(
+        description="Number of items that failed"
+    )
+    results = Field(
+        description="Results of all the items, in the same order as sent"
+    )
+
+
+class CacheStatsFields:
+    entries = Field(description="Current number of cached entries")
+    max_entries = Field(description="Maximum number of cached entries")
+    hits = Field(description="Reads served from the cache")
+    misses = Field(description="Reads not found on the cache (including expired entries)")
+    evictions = Field(description="Entries removed to keep the cache under its maximum size")
+    expirations = Field(description="Entries removed because their TTL expired")
+    invalidations = Field(description="Entries removed because the cached entity was written")
+
+
+class ProfilingFields:
+    span_name = Field(
+        description="Part of the request pipeline: handler, serialization, models (construction of the Read models), "
+                    "repository.<method> or mongo.<command>",
+        example="repository.list"
+    )
+    span_count = Field(description="Number of times this part ran during the request")
+    duration_ms = Field(description="Time spent, in milliseconds")
+    method = Field(description="HTTP method of the request", example="GET")
+    path = Field(description="Path of the request", example="/people")
+    route = Field(description="Route template matched by the request", example="/people/{person_id}")
+    status_code = Field(description="Status code of the response", example=200)
+    started = Field(description="Unix timestamp when the request started", example=get_time())
+    spans = Field(description="Breakdown of the time spent on each part of the request pipeline")
+    sampled = Field(description="True if the request was profiled with the sampling profiler")
+    samples = Field(
+        description="Stacks sampled while the request ran (folded format, outermost frame first; "
+                    "as used by flame graph tools), with the number of samples of each stack"
+    )
+    sampling = Field(description="If true, all the requests are profiled with the sampling profiler")
+    slow_threshold_ms = Field(description="Requests slower than this (in milliseconds) are recorded")
+    recorded = Field(description="Number of requests currently recorded")
+    max_recorded = Field(description="Maximum number of recorded requests (the oldest are discarded)")
+
+
+class ChangeFields:
+    event_id = Field(
+        description="Opaque identifier of the event. Send it to resume the feed after this event "
+                    "(through the Last-Event-ID header or the since query param)",
+        example="WyIzZjJhIiwgMTJd"
+    )
+    operation = Field(description="Operation performed on the person", example="update")
+    person_id = Field(description="Unique identifier of the written person", example=get_uuid())
+    time = Field(description="Unix timestamp when the event was published", example=get_time())
+    person = Field(description="The created person (only on create)")
+    update = Field(description="The updated fields of the person (only on update)")
+
+
+class PeopleChangesFields:
+    people = Field(description="Persons created or updated since the sync token (all of them without sync token)")
+    deleted = Field(description="Persons deleted since the sync token (none without sync token)")
+    deleted_time = Field(description="When the person was deleted (Unix timestamp)", **_unix_ts)
+    sync_token = Field(
+        description="Opaque token to request the following changes (through the since query param): the next page "
+                    "if there are more changes, or the changes written from now on otherwise",
+        example="WzE1ODU2OTkyMDAsbnVsbCwicGVvcGxlIixudWxsLG51bGxd"
+    )
+    more = Field(description="True if there are more changes, to be requested right away with the sync token")
+
+
+class HealthFields:
+    status = Field(description="Health of the worker process that served the request", example="ok")
+    ready = Field(description="True if the worker finished its startup (and it is not shutting down)")
+    pid = Field(description="Process id of the worker", example=1234)
+    started = Field(description="Unix timestamp when the worker started", **_unix_ts)
+    uptime = Field(description="Seconds since the worker started", example=3600)
+    workers = Field(description="Number of worker processes configured", example=4)
@@ -0,0 +1,19 @@
+"""MODELS - HEALTH
+Health of the worker process serving the API
+"""
+
+# # Package # #
+from .common import BaseModel
+from .fields import HealthFields
+
+__all__ = ("WorkerHealth",)
+
+
+class WorkerHealth(BaseModel):
+    """Body of Health GET responses"""
+    status: str = HealthFields.status
+    ready: bool = HealthFields.ready
+    pid: int = HealthFields.pid
+    started: int = HealthFields.started
+    uptime: int = HealthFields.uptime
+    workers: int = HealthFields.workers
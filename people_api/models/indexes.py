@@ -0,0 +1,39 @@
+"""MODELS - INDEXES
+Definition of the indexes of the people and tombstones collections, required to serve the queries performed by the
+repositories. They are created (if they do not exist) on the API startup
+"""
+
+# # Installed # #
+from pymongo import IndexModel, ASCENDING, TEXT
+
+__all__ = ("PEOPLE_INDEXES", "TOMBSTONES_INDEXES")
+
+PEOPLE_INDEXES = [
+    # Pagination (sorting by each field, with _id as tiebreaker)
+    IndexModel([("created", ASCENDING), ("_id", ASCENDING)], name="created_id"),
+    IndexModel([("updated", ASCENDING), ("_id", ASCENDING)], name="updated_id"),
+    IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+    # Filters (name, created and updated filters are served by the pagination indexes);
+    # the address filters are equality matches, so can be followed by the default sorting
+    IndexModel([("address.city", ASCENDING), ("created", ASCENDING), ("_id", ASCENDING)], name="city_created_id"),
+    IndexModel([("address.state", ASCENDING), ("created", ASCENDING), ("_id", ASCENDING)], name="state_created_id"),
+    IndexModel([("address.zip_code", ASCENDING), ("created", ASCENDING), ("_id", ASCENDING)], name="zip_created_id"),
+    IndexModel([("birth", ASCENDING)], name="birth"),
+    # Search: full-text (words of the name and address, with the name weighted higher), and prefix (autocomplete)
+    # on the normalized name and city, as anchored range scans that also serve the sorting of the results
+    IndexModel(
+        [("name", TEXT), ("address.street", TEXT), ("address.city", TEXT), ("address.state", TEXT),
+         ("address.zip_code", TEXT)],
+        weights={"name": 10, "address.city": 5, "address.state": 2}, default_language="none", name="search_text"
+    ),
+    IndexModel([("search.name", ASCENDING), ("_id", ASCENDING)], name="search_name_id"),
+    IndexModel([("search.city", ASCENDING), ("_id", ASCENDING)], name="search_city_id"),
+]
+
+TOMBSTONES_INDEXES = [
+    # Deleted persons since a time (changes endpoint), paginated with _id as tiebreaker
+    IndexModel([("deleted", ASCENDING), ("_id", ASCENDING)], name="deleted_id"),
+    # TTL: each tombstone expires at its expires date (set when deleted, so changing the TTL setting does not require
+    # changing the index)
+    IndexModel([("expires", ASCENDING)], expireAfterSeconds=0, name="expires"),
+]
@@ -0,0 +1,31 @@
+"""MODELS - PEOPLE - CHANGES
+Models of the changes endpoint (incremental sync): the persons changed since a sync token, and the deleted ones
+"""
+
+# # Native # #
+from typing import List, Union
+
+# # Package # #
+from .common import BaseModel
+from .person_read import PersonRead
+from .person_partial_read import PersonPartialRead
+from .fields import PersonFields, PeopleChangesFields
+
+__all__ = ("PersonTombstone", "PeopleChanges")
+
+
+class PersonTombstone(BaseModel):
+    """Id of a deleted person"""
+    person_id: str = PersonFields.person_id
+    deleted: int = PeopleChangesFields.deleted_time
+
+
+class PeopleChanges(BaseModel):
+    """Body of the changes endpoint responses"""
+    people: List[Union[PersonPartialRead, PersonRead]] = PeopleChangesFields.people
+    deleted: List[PersonTombstone] = PeopleChangesFields.deleted
+    sync_token: str = PeopleChangesFields.sync_token
+    more: bool = PeopleChangesFields.more
+
+    class Config(BaseModel.Config):
+        smart_union = True  # keep the PersonRead objects as they are
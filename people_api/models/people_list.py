@@ -0,0 +1,72 @@
+"""MODELS - PEOPLE - LIST
+Models used on the list and search of persons: filters, sorting, search and export options (query params)
+and the paginated response
+"""
+
+# # Native # #
+from enum import Enum
+from datetime import date
+from typing import Optional, List, Union
+
+# # Installed # #
+import pydantic
+
+# # Package # #
+from .common import BaseModel, RevisionedModel
+from .person_read import PersonRead
+from .person_partial_read import PersonPartialRead
+from .fields import PeopleListFields
+
+__all__ = ("PeopleSort", "SortOrder", "PeopleFilters", "PeopleSearchMode", "PeoplePage", "ExportFormat")
+
+
+class PeopleSort(str, Enum):
+    """Fields that the list of persons can be sorted by"""
+    created = "created"
+    updated = "updated"
+    name = "name"
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+class PeopleFilters(pydantic.BaseModel):
+    """Filters for the list of persons. All of them are optional, and the given ones are combined.
+    Ranges are inclusive. This model inherits from pydantic BaseModel, as having no filters is valid"""
+    name: Optional[str] = None
+    name_prefix: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    zip_code: Optional[str] = None
+    birth_from: Optional[date] = None
+    birth_to: Optional[date] = None
+    created_from: Optional[int] = None
+    created_to: Optional[int] = None
+    updated_from: Optional[int] = None
+    updated_to: Optional[int] = None
+
+
+class PeopleSearchMode(str, Enum):
+    """How the search of persons matches the query"""
+    text = "text"
+    """Full-text search of words on the name and address fields, ranked by relevance"""
+    prefix = "prefix"
+    """Autocomplete: names or cities starting with the query (case and diacritic insensitive),
+    names first, sorted alphabetically"""
+
+
+class PeoplePage(RevisionedModel):
+    """Body of People list GET responses: a page of persons, and the cursor to request the next page"""
+    people: List[Union[PersonPartialRead, PersonRead]] = PeopleListFields.people
+    next_cursor: Optional[str] = PeopleListFields.next_cursor
+
+    class Config(BaseModel.Config):
+        smart_union = True  # keep the PersonRead objects as they are
+
+
+class ExportFormat(str, Enum):
+    """Formats to stream the whole list of persons on export"""
+    ndjson = "ndjson"
+    json = "json"
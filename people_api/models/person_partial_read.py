@@ -0,0 +1,76 @@
+"""MODELS - PERSON - PARTIAL READ
+Person Partial Read model, returned when only some fields of the persons are requested (sparse fieldsets).
+All its fields are Optional, and the computed ones (age) are only set if requested
+"""
+
+# # Native # #
+from enum import Enum
+from datetime import date
+from typing import Optional
+
+# # Installed # #
+import pydantic
+
+# # Package # #
+from .common import BaseModel, RevisionedModel
+from .fields import PersonFields
+from .person_address import Address
+from .person_read import document_values
+
+__all__ = ("PersonField", "PersonPartialRead")
+
+
+class PersonField(str, Enum):
+    """Fields of PersonRead that can be requested"""
+    person_id = "person_id"
+    name = "name"
+    address = "address"
+    birth = "birth"
+    age = "age"
+    created = "created"
+    updated = "updated"
+
+    @property
+    def document_field(self) -> str:
+        """Name of the field on the Mongo documents"""
+        return "_id" if self is PersonField.person_id else self.value
+
+
+class PersonPartialRead(RevisionedModel):
+    """Body of Person GET responses, when only some fields are requested"""
+    person_id: Optional[str] = PersonFields.person_id
+    name: Optional[str] = PersonFields.name
+    address: Optional[Address] = PersonFields.address
+    birth: Optional[date] = PersonFields.birth
+    age: Optional[int] = PersonFields.age
+    created: Optional[int] = PersonFields.created
+    updated: Optional[int] = PersonFields.updated
+
+    @pydantic.root_validator(pre=True)
+    def _min_properties(cls, data):
+        """Override the BaseModel validator: a partial read can be empty, if none of the requested fields are set"""
+        return data
+
+    @pydantic.root_validator(pre=True)
+    def _set_person_id(cls, data):
+        """Swap the field _id to person_id (same as PersonRead)"""
+        document_id = data.pop("_id", None)
+        if document_id:
+            data["person_id"] = document_id
+        return data
+
+    def dict(self, **kwargs):
+        # Same as PersonUpdate: the "birth" field must be converted to string (isoformat)
+        d = super().dict(**kwargs)
+        if d.get("birth"):
+            d["birth"] = d["birth"].isoformat()
+        return d
+
+    @classmethod
+    def construct_from_document(cls, document: dict) -> "PersonPartialRead":
+        """Build the model from a trusted (part of a) document, without validating it (same as PersonRead)"""
+        values = document_values(document)
+        return cls.construct(**{field: value for field, value in values.items() if field in cls.__fields__})
+
+    class Config(BaseModel.Config):
+        extra = pydantic.Extra.ignore
@@ -3,21 +3,37 @@ Person Read model. Inherits from PersonCreate and adds the person_id field, whic
 """
 
 # # Native # #
-from datetime import datetime
+from datetime import date
 from typing import Optional, List
 
 # # Installed # #
 import pydantic
-from dateutil.relativedelta import relativedelta
 
 # # Package # #
+from .common import RevisionedModel
 from .person_create import PersonCreate
+from .person_address import Address
 from .fields import PersonFields
+from ..utils import get_age
 
-__all__ = ("PersonRead", "PeopleRead")
+__all__ = ("PersonRead", "PeopleRead", "document_values")
 
 
-class PersonRead(PersonCreate):
+def document_values(document: dict) -> dict:
+    """Convert the fields of a Person document (or part of it) to the types of the Read models attributes,
+    as they would be after validation. The document must be trusted (written by the repositories)"""
+    values = dict(document)
+    document_id = values.pop("_id", None)
+    if document_id:
+        values["person_id"] = document_id
+    if values.get("birth"):
+        values["birth"] = date.fromisoformat(values["birth"])
+    if values.get("address"):
+        values["address"] = Address.construct(**values["address"])
+    return values
+
+
+class PersonRead(PersonCreate, RevisionedModel):
     """Body of Person GET and POST responses"""
     person_id: str = PersonFields.person_id
     age: Optional[int] = PersonFields.age
@@ -38,10 +54,18 @@ class PersonRead(PersonCreate):
         """Calculate the current age of the person from the date of birth, if any"""
         birth = data.get("birth")
         if birth:
-            today = datetime.now().date()
-            data["age"] = relativedelta(today, birth).years
+            data["age"] = get_age(birth)
         return data
 
+    @classmethod
+    def construct_from_document(cls, document: dict, age: Optional[int] = None) -> "PersonRead":
+        """Build the model from a trusted document (written by the repositories), without validating it,
+        which is much faster than PersonRead(**document). The age is calculated from birth, unless given"""
+        values = document_values(document)
+        if values.get("birth"):
+            values["age"] = get_age(values["birth"]) if age is None else age
+        return cls.construct(**{field: value for field, value in values.items() if field in cls.__fields__})
+
     class Config(PersonCreate.Config):
         extra = pydantic.Extra.ignore  # if a read document has extra fields, ignore them
 
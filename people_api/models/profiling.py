@@ -0,0 +1,46 @@
+"""MODELS - PROFILING
+Models of the profiling admin endpoints: requests recorded by the profiler, and profiler status
+"""
+
+# # Native # #
+from typing import Optional, List, Dict
+
+# # Package # #
+from .common import BaseModel
+from .fields import ProfilingFields
+
+__all__ = ("ProfiledSpan", "ProfiledRequest", "ProfilingStatus", "ProfilingUpdate")
+
+
+class ProfiledSpan(BaseModel):
+    """Time spent on a part of the request pipeline"""
+    name: str = ProfilingFields.span_name
+    count: int = ProfilingFields.span_count
+    duration_ms: float = ProfilingFields.duration_ms
+
+
+class ProfiledRequest(BaseModel):
+    """Request recorded by the profiler (slow, or profiled with the sampling profiler)"""
+    method: str = ProfilingFields.method
+    path: str = ProfilingFields.path
+    route: Optional[str] = ProfilingFields.route
+    status_code: int = ProfilingFields.status_code
+    started: float = ProfilingFields.started
+    duration_ms: float = ProfilingFields.duration_ms
+    spans: List[ProfiledSpan] = ProfilingFields.spans
+    sampled: bool = ProfilingFields.sampled
+    samples: Optional[Dict[str, int]] = ProfilingFields.samples
+
+
+class ProfilingStatus(BaseModel):
+    """Body of Profiling status GET responses"""
+    sampling: bool = ProfilingFields.sampling
+    slow_threshold_ms: float = ProfilingFields.slow_threshold_ms
+    recorded: int = ProfilingFields.recorded
+    max_recorded: int = ProfilingFields.max_recorded
+
+
+class ProfilingUpdate(BaseModel):
+    """Body of Profiling PATCH requests"""
+    sampling: Optional[bool] = ProfilingFields.sampling
+    slow_threshold_ms: Optional[float] = ProfilingFields.slow_threshold_ms
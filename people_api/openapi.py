@@ -0,0 +1,41 @@
+"""OPENAPI
+OpenAPI schema of the API. FastAPI generates it on the first request to /openapi.json or /docs (and caches it);
+the workers load it on startup instead, from a file precomputed at build time (see the openapi_file setting),
+or generating it before they are ready.
+
+Usage: python -m people_api.openapi FILE
+"""
+
+# # Native # #
+import sys
+import json
+
+# # Installed # #
+from fastapi import FastAPI
+
+# # Package # #
+from .settings import api_settings as settings
+
+__all__ = ("load_openapi_schema",)
+
+
+def load_openapi_schema(app: FastAPI):
+    """Set the OpenAPI schema served by the app: the precomputed one, if configured, or the generated one"""
+    if settings.openapi_file:
+        with open(settings.openapi_file) as file:
+            app.openapi_schema = json.load(file)
+    else:
+        app.openapi()
+
+
+def main(path: str):
+    """Generate the OpenAPI schema of the API, and write it to the given file"""
+    from .app import app
+    with open(path, "w") as file:
+        json.dump(app.openapi(), file, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    main(sys.argv[1])
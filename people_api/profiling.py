@@ -0,0 +1,223 @@
+"""PROFILING
+Request profiler: measures the time spent on each part of the request pipeline (handler, repository calls, Mongo
+commands, construction of the Read models, serialization), recording the slow requests on a bounded ring buffer.
+Single requests can also be profiled with a sampling profiler, that periodically samples the stacks of the threads
+running them
+"""
+
+# # Native # #
+import sys
+import time
+import threading
+from time import perf_counter
+from functools import wraps
+from collections import deque, Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Set, Iterator, Callable
+
+# # Installed # #
+from pymongo import monitoring
+
+# # Package # #
+from .models import ProfiledSpan, ProfiledRequest, ProfilingStatus, ProfilingUpdate
+from .settings import profiling_settings as settings
+
+__all__ = (
+    "RequestProfile", "StackSampler", "Profiler", "ProfilingCommandListener",
+    "profiler", "span", "profiled", "sampled_thread"
+)
+
+
+class StackSampler(threading.Thread):
+    """Thread that periodically samples the stacks of the given threads, counting each stack in folded format
+    (outermost frame first, separated by ';'). The set of threads can be extended while sampling"""
+    def __init__(self, threads: Set[int], interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.threads = threads
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in tuple(self.threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples[_folded_stack(frame)] += 1
+
+    def stop(self) -> Dict[str, int]:
+        """Stop sampling, and return the number of samples of each stack"""
+        self._stopped.set()
+        self.join()
+        return dict(self.samples)
+
+
+def _folded_stack(frame) -> str:
+    names = list()
+    while frame is not None:
+        code = frame.f_code
+        # co_qualname (with the class of methods) is only available since Python 3.11
+        name = getattr(code, "co_qualname", code.co_name)
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfile:
+    """Time spent on each part (span) of the pipeline of a request. The parts of a request run sequentially
+    (even when some of them run on the threadpool), so no locking is required"""
+    def __init__(self, sampler: Optional[StackSampler] = None):
+        self.spans: Dict[str, List[float]] = dict()  # name: [count, seconds]
+        self.active: Set[str] = set()
+        self.sampler = sampler
+
+    def add(self, name: str, seconds: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Measure the time spent on the wrapped block as part of the profile of the current request (if any).
+    Nested spans with the same name are only measured once (by the outermost one)"""
+    profile = _profile.get()
+    if profile is None or name in profile.active:
+        yield
+        return
+
+    profile.active.add(name)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, perf_counter() - start)
+        profile.active.discard(name)
+
+
+@contextmanager
+def sampled_thread() -> Iterator[None]:
+    """Sample the current thread while running the wrapped block, if the current request is being sampled.
+    Used for the parts of the requests that run on other threads (like the threadpool)"""
+    profile = _profile.get()
+    thread_id = threading.get_ident()
+    if profile is None or profile.sampler is None or thread_id in profile.sampler.threads:
+        yield
+        return
+
+    profile.sampler.threads.add(thread_id)
+    try:
+        yield
+    finally:
+        profile.sampler.threads.discard(thread_id)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """Decorator to measure the calls to a (sync) function as a span of the given name. When no request is being
+    profiled, or the span is already measured by an outer call, the function is called directly"""
+    def _decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def _profiled_function(*args, **kwargs):
+            profile = _profile.get()
+            if profile is None or name in profile.active:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+        return _profiled_function
+    return _decorator
+
+
+class Profiler:
+    """Start and finish the profiles of the requests, recording the slow ones (or the sampled ones) on a ring buffer.
+    Sampling can be requested per request, or enabled for all the requests (toggle)"""
+    def __init__(self, slow_threshold_ms: float, max_recorded: int, sampling_interval_ms: float):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.sampling_interval = sampling_interval_ms / 1000
+        self.sampling = False
+        self._recorded = deque(maxlen=max_recorded)
+        self._lock = threading.Lock()
+
+    def start(self, sample: bool = False) -> RequestProfile:
+        """Start the profile of the current request (context), with the sampling profiler if requested
+        (or enabled for all the requests)"""
+        sampler = None
+        if sample or self.sampling:
+            sampler = StackSampler({threading.get_ident()}, self.sampling_interval)
+            sampler.start()
+        profile = RequestProfile(sampler)
+        _profile.set(profile)
+        return profile
+
+    def finish(
+            self, profile: RequestProfile, method: str, path: str, route: Optional[str], status_code: int,
+            duration: float
+    ):
+        """Finish the profile of a request, recording it if it was slow or sampled"""
+        samples = profile.sampler.stop() if profile.sampler is not None else None
+        duration_ms = duration * 1000
+        if samples is None and duration_ms < self.slow_threshold_ms:
+            return
+
+        spans = [
+            ProfiledSpan.construct(name=name, count=count, duration_ms=seconds * 1000)
+            for name, (count, seconds) in profile.spans.items()
+        ]
+        recorded = ProfiledRequest.construct(
+            method=method, path=path, route=route, status_code=status_code,
+            started=time.time() - duration, duration_ms=duration_ms,
+            spans=spans, sampled=samples is not None, samples=samples
+        )
+        with self._lock:
+            self._recorded.append(recorded)
+
+    def recorded(self) -> List[ProfiledRequest]:
+        """Return the recorded requests, the most recent first"""
+        with self._lock:
+            return list(reversed(self._recorded))
+
+    def status(self) -> ProfilingStatus:
+        return ProfilingStatus(
+            sampling=self.sampling, slow_threshold_ms=self.slow_threshold_ms,
+            recorded=len(self._recorded), max_recorded=self._recorded.maxlen
+        )
+
+    def update(self, update: ProfilingUpdate) -> ProfilingStatus:
+        if update.sampling is not None:
+            self.sampling = update.sampling
+        if update.slow_threshold_ms is not None:
+            self.slow_threshold_ms = update.slow_threshold_ms
+        return self.status()
+
+
+profiler = Profiler(
+    slow_threshold_ms=settings.slow_threshold_ms,
+    max_recorded=settings.max_recorded,
+    sampling_interval_ms=settings.sampling_interval_ms
+)
+
+
+class ProfilingCommandListener(monitoring.CommandListener):
+    """Listener registered on the Mongo clients, adding the duration of each command to the profile of the request
+    that ran it. Commands run on the context of the request (the threadpool copies it), so it is available here"""
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._add(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._add(event)
+
+    @staticmethod
+    def _add(event):
+        profile = _profile.get()
+        if profile is not None:
+            profile.add(f"mongo.{event.command_name}", event.duration_micros / 1e6)
@@ -2,57 +2,1258 @@
 Methods to interact with the database
 """
 
+# # Native # #
+import re
+import asyncio
+from datetime import date, datetime, timezone
+from typing import Optional, List, Set, Tuple, Dict, Union, Iterator, AsyncIterator
+from typing import Awaitable, Callable, Hashable, Any
+
+# # Installed # #
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
+from fastapi import status as statuscode
+from starlette.concurrency import run_in_threadpool
+
 # # Package # #
 from .models import *
 from .exceptions import *
-from .database import collection
-from .utils import get_time, get_uuid
+from .database import collection, async_collection, tombstones_collection, async_tombstones_collection
+from .database import read_preference
+from .changes import ChangeFeed
+from .consistency import causal_session, async_causal_session, causal_token_requested
+from .profiling import span, profiled, sampled_thread
+from .cache import LRUCache
+from .metrics import coalescing_reads
+from .age import age_calculator
+from .settings import api_settings, mongo_settings, metrics_settings, ChangesSource
+from .utils import get_time, get_uuid, get_age, encode_token, decode_token, normalize_search, get_search_fields
+
+__all__ = (
+    "PeopleRepository", "AsyncPeopleRepository", "ThreadedRepository", "ProfiledRepository", "PublishingRepository",
+    "CoalescingRepository", "CachedRepository"
+)
+
+Fields = Optional[Set[PersonField]]
+"""Fields of the persons to read (None for all the fields)"""
+PersonAnyRead = Union[PersonRead, PersonPartialRead]
 
-__all__ = ("PeopleRepository",)
+_DUPLICATE_KEY_ERROR = 11000
 
 
 class PeopleRepository:
+    """Methods to read and write persons. The reads of the GET endpoints use the configured read preference
+    (can be served by secondaries), while writes use the primary. All the operations (but iterate) run on a causal
+    session, when causal consistency is used"""
     @staticmethod
-    def get(person_id: str) -> PersonRead:
-        """Retrieve a single Person by its unique id"""
-        document = collection.find_one({"_id": person_id})
-        if not document:
-            raise PersonNotFoundException(person_id)
-        return PersonRead(**document)
+    def get(person_id: str, fields: Fields = None) -> PersonAnyRead:
+        """Retrieve a single Person by its unique id. If fields are given, only those are read"""
+        with causal_session(collection) as session:
+            document = _reads(collection).find_one(
+                {"_id": person_id}, projection=_projection(fields, "_id"), session=session
+            )
+        return _read(_found(document, person_id), fields)
+
+    @staticmethod
+    def get_revision(person_id: str) -> str:
+        """Retrieve the current revision of a single Person, without reading the whole document"""
+        with causal_session(collection) as session:
+            document = _reads(collection).find_one({"_id": person_id}, projection=_REVISION_PROJECTION, session=session)
+        return _document_revision(_found(document, person_id))
+
+    @staticmethod
+    def list(
+            filters: Optional[PeopleFilters] = None,
+            sort: PeopleSort = PeopleSort.created,
+            order: SortOrder = SortOrder.asc,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None,
+            fields: Fields = None
+    ) -> PeoplePage:
+        """Retrieve a page of persons matching the filters (if any), sorted by the given field,
+        starting after the given cursor (if any). If no limit is given, all the (remaining) persons are returned.
+        If fields are given, only those are read"""
+        find = _list_find(filters, sort, order, limit, cursor, _projection(fields, "_id", sort.value))
+        with causal_session(collection) as session:
+            documents = list(_reads(collection).find(**find, session=session))
+        return _list_page(documents, sort, order, limit, fields)
+
+    @staticmethod
+    def list_revision(
+            filters: Optional[PeopleFilters] = None,
+            sort: PeopleSort = PeopleSort.created,
+            order: SortOrder = SortOrder.asc,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None
+    ) -> str:
+        """Retrieve the current revision of a page of persons (same args as list),
+        without reading the whole documents"""
+        find = _list_find(filters, sort, order, limit, cursor, {**_REVISION_PROJECTION, sort.value: True})
+        with causal_session(collection) as session:
+            documents = list(_reads(collection).find(**find, session=session))
+        return _page_revision(*_split_page(documents, sort, order, limit))
+
+    @staticmethod
+    def search(
+            query: str,
+            mode: PeopleSearchMode = PeopleSearchMode.text,
+            limit: int = 20,
+            cursor: Optional[str] = None,
+            fields: Fields = None
+    ) -> PeoplePage:
+        """Search persons by the words of their name and address (text mode, ranked by relevance), or by the prefix
+        of their name or city (prefix mode, for autocomplete). If fields are given, only those are read"""
+        with causal_session(collection) as session:
+            if mode == PeopleSearchMode.text:
+                find, offset = _text_search(query, cursor, limit, fields)
+                documents = list(_reads(collection).find(**find, session=session))
+                return _text_search_page(documents, query, offset, limit, fields)
+
+            prefix = normalize_search(query)
+            found = list()
+            for stage, find in _prefix_searches(prefix, cursor, fields):
+                documents = _reads(collection).find(**find, limit=limit + 1 - len(found), session=session)
+                found.extend((stage, document) for document in documents)
+                if len(found) > limit:
+                    break
+        return _prefix_search_page(found, prefix, limit, fields)
+
+    @staticmethod
+    def changes(since: Optional[str] = None, limit: int = 1000, fields: Fields = None) -> PeopleChanges:
+        """Retrieve the persons created or updated, and the ids of the persons deleted, since the given sync token
+        (all the persons if not given). Changes are paginated, returning first the persons (by updated time),
+        then the deleted ids (by deleted time). If fields are given, only those are read"""
+        since_time, started, stage, after = _changes_position(since)
+        documents, tombstones = list(), list()
+        with causal_session(collection) as session:
+            find = _changes_people_find(stage, since_time, after, limit, fields)
+            if find:
+                documents = list(_reads(collection).find(**find, session=session))
+            find = _changes_tombstones_find(stage, since_time, after, limit - len(documents))
+            if find:
+                tombstones = list(_reads(tombstones_collection).find(**find, session=session))
+        return _changes_page(documents, tombstones, since_time, started, limit, fields)
 
     @staticmethod
-    def list() -> PeopleRead:
-        """Retrieve all the available persons"""
-        cursor = collection.find()
-        return [PersonRead(**document) for document in cursor]
+    def iterate(batch_size: int, fields: Fields = None) -> Iterator[PersonAnyRead]:
+        """Iterate over all the available persons, without holding them in memory.
+        The documents are fetched from the database in batches of the given size. If fields are given,
+        only those are read"""
+        documents = _reads(collection).find(projection=_projection(fields), batch_size=batch_size)
+        return (_read(document, fields) for document in documents)
 
     @staticmethod
     def create(create: PersonCreate) -> PersonRead:
         """Create a person and return its Read object"""
-        document = create.dict()
-        document["created"] = document["updated"] = get_time()
-        document["_id"] = get_uuid()
-        # The time and id could be inserted as a model's Field default factory,
-        # but would require having another model for Repository only to implement it
+        document = _new_document(create)
+        with causal_session(collection) as session:
+            result = collection.insert_one(document, session=session)
+            assert result.acknowledged
+        # The response is built from the inserted document, without reading it back
+        return _read(document, None)
 
-        result = collection.insert_one(document)
-        assert result.acknowledged
+    @staticmethod
+    def update(person_id: str, update: PersonUpdate, revisions: Optional[List[str]] = None) -> PersonRead:
+        """Update a person by giving only the fields to update, returning the updated person (on the same operation).
+        If revisions are given, only update it if its current revision is one of them (compare-and-set)"""
+        query = _update_query(person_id, revisions)
+        document, exists = None, False
+        with causal_session(collection) as session:
+            if query is not None:
+                document = collection.find_one_and_update(
+                    query, _update_operation(update), return_document=ReturnDocument.AFTER, session=session
+                )
+            if document is None and revisions is not None:
+                # Only when a conditional update fails: tell a modified person from a missing one
+                exists = collection.find_one({"_id": person_id}, projection=_ID_PROJECTION, session=session) is not None
+        return _read(_updated(document, exists, person_id), None)
 
-        return PeopleRepository.get(result.inserted_id)
+    @staticmethod
+    def delete(person_id: str):
+        """Delete a person given its unique id, keeping its tombstone"""
+        with causal_session(collection) as session:
+            document = collection.find_one_and_delete(
+                {"_id": person_id}, projection=_REVISION_PROJECTION, session=session
+            )
+            if document:
+                try:
+                    tombstones_collection.insert_many(_tombstones([document]), ordered=False, session=session)
+                except BulkWriteError as ex:
+                    _check_tombstones_error(ex)
+        _deleted(document, person_id)
 
     @staticmethod
-    def update(person_id: str, update: PersonUpdate):
-        """Update a person by giving only the fields to update"""
-        document = update.dict()
-        document["updated"] = get_time()
+    def create_many(creates: List[PersonCreate]) -> BulkResults:
+        """Create multiple persons with a single unordered insert, returning the result of each one"""
+        documents = [_new_document(create) for create in creates]
+        try:
+            with causal_session(collection) as session:
+                collection.insert_many(documents, ordered=False, session=session)
+            write_errors = list()
+        except BulkWriteError as ex:
+            write_errors = ex.details["writeErrors"]
+        return _created_results(documents, write_errors)
 
-        result = collection.update_one({"_id": person_id}, {"$set": document})
-        if not result.modified_count:
-            raise PersonNotFoundException(identifier=person_id)
+    @staticmethod
+    def import_many(
+            creates: List[PersonCreate], person_ids: Optional[List[Optional[str]]] = None
+    ) -> Dict[int, BaseAPIException]:
+        """Create multiple persons with a single unordered insert, without building their Read models (used by the
+        import command). The ids can be given for each person (like the ones of exported persons), or are generated.
+        Returns the errors of the persons not created, by index"""
+        person_ids = person_ids or [None] * len(creates)
+        documents = [_new_document(create, person_id) for create, person_id in zip(creates, person_ids)]
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as ex:
+            return {
+                error["index"]: _write_error_exception(error, documents[error["index"]]["_id"])
+                for error in ex.details["writeErrors"]
+            }
+        return dict()
 
     @staticmethod
-    def delete(person_id: str):
-        """Delete a person given its unique id"""
-        result = collection.delete_one({"_id": person_id})
-        if not result.deleted_count:
-            raise PersonNotFoundException(identifier=person_id)
+    def update_many(updates: List[PersonBulkUpdate]) -> BulkResults:
+        """Update multiple persons, one write each (so the result of each one is told by its own write),
+        returning the result of each one"""
+        results = list()
+        with causal_session(collection) as session:
+            for index, (query, operation, person_id) in enumerate(_bulk_updates(updates)):
+                try:
+                    matched, write_error = collection.update_one(query, operation, session=session).matched_count, None
+                except OperationFailure as ex:
+                    matched, write_error = 0, _failure_error(ex)
+                results.append(_identified_result(index, person_id, matched, write_error))
+        return _bulk_results(results)
+
+    @staticmethod
+    def delete_many(person_ids: List[str]) -> BulkResults:
+        """Delete multiple persons given their unique ids (keeping their tombstones), one write each (so only the
+        persons removed by this request get a tombstone), returning the result of each one"""
+        with causal_session(collection) as session:
+            documents = [
+                collection.find_one_and_delete({"_id": person_id}, projection=_REVISION_PROJECTION, session=session)
+                for person_id in person_ids
+            ]
+            deleted = [document for document in documents if document]
+            if deleted:
+                try:
+                    tombstones_collection.insert_many(_tombstones(deleted), ordered=False, session=session)
+                except BulkWriteError as ex:
+                    _check_tombstones_error(ex)
+        return _deleted_results(person_ids, documents)
+
+
+class AsyncPeopleRepository:
+    """Same as PeopleRepository, but using the async Mongo client, so methods must be awaited"""
+    @staticmethod
+    async def get(person_id: str, fields: Fields = None) -> PersonAnyRead:
+        """Retrieve a single Person by its unique id. If fields are given, only those are read"""
+        async with async_causal_session(async_collection) as session:
+            document = await _reads(async_collection).find_one(
+                {"_id": person_id}, projection=_projection(fields, "_id"), session=session
+            )
+        return _read(_found(document, person_id), fields)
+
+    @staticmethod
+    async def get_revision(person_id: str) -> str:
+        """Retrieve the current revision of a single Person, without reading the whole document"""
+        async with async_causal_session(async_collection) as session:
+            document = await _reads(async_collection).find_one(
+                {"_id": person_id}, projection=_REVISION_PROJECTION, session=session
+            )
+        return _document_revision(_found(document, person_id))
+
+    @staticmethod
+    async def list(
+            filters: Optional[PeopleFilters] = None,
+            sort: PeopleSort = PeopleSort.created,
+            order: SortOrder = SortOrder.asc,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None,
+            fields: Fields = None
+    ) -> PeoplePage:
+        """Retrieve a page of persons matching the filters (if any), sorted by the given field,
+        starting after the given cursor (if any). If no limit is given, all the (remaining) persons are returned.
+        If fields are given, only those are read"""
+        find = _list_find(filters, sort, order, limit, cursor, _projection(fields, "_id", sort.value))
+        async with async_causal_session(async_collection) as session:
+            documents = [document async for document in _reads(async_collection).find(**find, session=session)]
+        return _list_page(documents, sort, order, limit, fields)
+
+    @staticmethod
+    async def list_revision(
+            filters: Optional[PeopleFilters] = None,
+            sort: PeopleSort = PeopleSort.created,
+            order: SortOrder = SortOrder.asc,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None
+    ) -> str:
+        """Retrieve the current revision of a page of persons (same args as list),
+        without reading the whole documents"""
+        find = _list_find(filters, sort, order, limit, cursor, {**_REVISION_PROJECTION, sort.value: True})
+        async with async_causal_session(async_collection) as session:
+            documents = [document async for document in _reads(async_collection).find(**find, session=session)]
+        return _page_revision(*_split_page(documents, sort, order, limit))
+
+    @staticmethod
+    async def search(
+            query: str,
+            mode: PeopleSearchMode = PeopleSearchMode.text,
+            limit: int = 20,
+            cursor: Optional[str] = None,
+            fields: Fields = None
+    ) -> PeoplePage:
+        """Search persons by the words of their name and address (text mode, ranked by relevance), or by the prefix
+        of their name or city (prefix mode, for autocomplete). If fields are given, only those are read"""
+        async with async_causal_session(async_collection) as session:
+            if mode == PeopleSearchMode.text:
+                find, offset = _text_search(query, cursor, limit, fields)
+                documents = [document async for document in _reads(async_collection).find(**find, session=session)]
+                return _text_search_page(documents, query, offset, limit, fields)
+
+            prefix = normalize_search(query)
+            found = list()
+            for stage, find in _prefix_searches(prefix, cursor, fields):
+                documents = _reads(async_collection).find(**find, limit=limit + 1 - len(found), session=session)
+                found.extend([(stage, document) async for document in documents])
+                if len(found) > limit:
+                    break
+        return _prefix_search_page(found, prefix, limit, fields)
+
+    @staticmethod
+    async def changes(since: Optional[str] = None, limit: int = 1000, fields: Fields = None) -> PeopleChanges:
+        """Retrieve the persons created or updated, and the ids of the persons deleted, since the given sync token
+        (all the persons if not given). Changes are paginated, returning first the persons (by updated time),
+        then the deleted ids (by deleted time). If fields are given, only those are read"""
+        since_time, started, stage, after = _changes_position(since)
+        documents, tombstones = list(), list()
+        async with async_causal_session(async_collection) as session:
+            find = _changes_people_find(stage, since_time, after, limit, fields)
+            if find:
+                documents = [document async for document in _reads(async_collection).find(**find, session=session)]
+            find = _changes_tombstones_find(stage, since_time, after, limit - len(documents))
+            if find:
+                tombstones = _reads(async_tombstones_collection).find(**find, session=session)
+                tombstones = [tombstone async for tombstone in tombstones]
+        return _changes_page(documents, tombstones, since_time, started, limit, fields)
+
+    @staticmethod
+    async def iterate(batch_size: int, fields: Fields = None) -> AsyncIterator[PersonAnyRead]:
+        """Iterate over all the available persons, without holding them in memory.
+        The documents are fetched from the database in batches of the given size. If fields are given,
+        only those are read"""
+        documents = _reads(async_collection).find(projection=_projection(fields), batch_size=batch_size)
+        return (_read(document, fields) async for document in documents)
+
+    @staticmethod
+    async def create(create: PersonCreate) -> PersonRead:
+        """Create a person and return its Read object"""
+        document = _new_document(create)
+        async with async_causal_session(async_collection) as session:
+            result = await async_collection.insert_one(document, session=session)
+            assert result.acknowledged
+        return _read(document, None)
+
+    @staticmethod
+    async def update(person_id: str, update: PersonUpdate, revisions: Optional[List[str]] = None) -> PersonRead:
+        """Update a person by giving only the fields to update, returning the updated person (on the same operation).
+        If revisions are given, only update it if its current revision is one of them (compare-and-set)"""
+        query = _update_query(person_id, revisions)
+        document, exists = None, False
+        async with async_causal_session(async_collection) as session:
+            if query is not None:
+                document = await async_collection.find_one_and_update(
+                    query, _update_operation(update), return_document=ReturnDocument.AFTER, session=session
+                )
+            if document is None and revisions is not None:
+                # Only when a conditional update fails: tell a modified person from a missing one
+                exists = await async_collection.find_one(
+                    {"_id": person_id}, projection=_ID_PROJECTION, session=session
+                ) is not None
+        return _read(_updated(document, exists, person_id), None)
+
+    @staticmethod
+    async def delete(person_id: str):
+        """Delete a person given its unique id, keeping its tombstone"""
+        async with async_causal_session(async_collection) as session:
+            document = await async_collection.find_one_and_delete(
+                {"_id": person_id}, projection=_REVISION_PROJECTION, session=session
+            )
+            if document:
+                try:
+                    await async_tombstones_collection.insert_many(
+                        _tombstones([document]), ordered=False, session=session
+                    )
+                except BulkWriteError as ex:
+                    _check_tombstones_error(ex)
+        _deleted(document, person_id)
+
+    @staticmethod
+    async def create_many(creates: List[PersonCreate]) -> BulkResults:
+        """Create multiple persons with a single unordered insert, returning the result of each one"""
+        documents = [_new_document(create) for create in creates]
+        try:
+            async with async_causal_session(async_collection) as session:
+                await async_collection.insert_many(documents, ordered=False, session=session)
+            write_errors = list()
+        except BulkWriteError as ex:
+            write_errors = ex.details["writeErrors"]
+        return _created_results(documents, write_errors)
+
+    @staticmethod
+    async def update_many(updates: List[PersonBulkUpdate]) -> BulkResults:
+        """Update multiple persons, one write each (so the result of each one is told by its own write),
+        returning the result of each one"""
+        results = list()
+        async with async_causal_session(async_collection) as session:
+            for index, (query, operation, person_id) in enumerate(_bulk_updates(updates)):
+                try:
+                    result = await async_collection.update_one(query, operation, session=session)
+                    matched, write_error = result.matched_count, None
+                except OperationFailure as ex:
+                    matched, write_error = 0, _failure_error(ex)
+                results.append(_identified_result(index, person_id, matched, write_error))
+        return _bulk_results(results)
+
+    @staticmethod
+    async def delete_many(person_ids: List[str]) -> BulkResults:
+        """Delete multiple persons given their unique ids (keeping their tombstones), one write each (so only the
+        persons removed by this request get a tombstone), returning the result of each one"""
+        async with async_causal_session(async_collection) as session:
+            documents = [
+                await async_collection.find_one_and_delete(
+                    {"_id": person_id}, projection=_REVISION_PROJECTION, session=session
+                )
+                for person_id in person_ids
+            ]
+            deleted = [document for document in documents if document]
+            if deleted:
+                try:
+                    await async_tombstones_collection.insert_many(_tombstones(deleted), ordered=False, session=session)
+                except BulkWriteError as ex:
+                    _check_tombstones_error(ex)
+        return _deleted_results(person_ids, documents)
+
+
+def _reads(collection_: Any) -> Any:
+    """Collection to perform the reads of the GET endpoints: with the configured read preference, if any"""
+    return collection_.with_options(read_preference=read_preference) if read_preference else collection_
+
+
+_ID_PROJECTION = {"_id": True}
+_REVISION_PROJECTION = {"_id": True, "updated": True, "version": True}
+
+
+def _found(document: Optional[dict], person_id: str) -> dict:
+    """Check the document of a person read by its id was found"""
+    if not document:
+        raise PersonNotFoundException(person_id)
+    return document
+
+
+def _new_document(create: PersonCreate, person_id: Optional[str] = None) -> dict:
+    """Build the document of a new person, with the given id (or a new one)"""
+    document = create.dict()
+    document["created"] = document["updated"] = get_time()
+    document["_id"] = person_id or get_uuid()
+    document["version"] = 1
+    document["search"] = get_search_fields(create.name, create.address.city)
+    # The time and id could be inserted as a model's Field default factory,
+    # but would require having another model for Repository only to implement it
+    return document
+
+
+def _update_operation(update: PersonUpdate) -> dict:
+    """Build the Mongo update operation to update a person"""
+    document = update.dict()
+    document["updated"] = get_time()
+    # Keep the normalized values used by the prefix search up to date
+    search = get_search_fields(update.name or "", update.address.city if update.address else None)
+    if update.name is not None:
+        document["search.name"] = search["name"]
+    if update.address is not None:
+        document["search.city"] = search["city"]
+    return {"$set": document, "$inc": {"version": 1}}
+
+
+def _update_query(person_id: str, revisions: Optional[List[str]]) -> Optional[dict]:
+    """Build the Mongo filter to update a person, only if its current revision is one of the given ones (if any).
+    None if no revision can match (none of them is valid)"""
+    if revisions is None:
+        return {"_id": person_id}
+    conditions = list()
+    for revision in revisions:
+        updated, _, version = revision.partition(".")
+        try:
+            updated, version = int(updated), int(version)
+        except ValueError:
+            continue
+        # Documents written before the version field existed have revision version 0 (see _document_revision)
+        conditions.append({"updated": updated, "version": version or None})
+    return {"_id": person_id, "$or": conditions} if conditions else None
+
+
+def _updated(document: Optional[dict], exists: bool, person_id: str) -> dict:
+    """Check the document returned by the update of a person (None if not updated), telling a modified person
+    (exists, but its revision did not match) from a missing one"""
+    if document is None:
+        if exists:
+            raise PersonModifiedException(identifier=person_id)
+        raise PersonNotFoundException(identifier=person_id)
+    return document
+
+
+def _deleted(document: Optional[dict], person_id: str):
+    """Check the delete of a person by its id removed it (returning its document)"""
+    if not document:
+        raise PersonNotFoundException(identifier=person_id)
+
+
+def _bulk_updates(updates: List[PersonBulkUpdate]) -> List[Tuple[dict, dict, str]]:
+    """Build the Mongo filter and update operation of each item of a bulk update, with the id of its person"""
+    return [({"_id": item.person_id}, _update_operation(item.update), item.person_id) for item in updates]
+
+
+def _write_error_exception(write_error: dict, person_id: str) -> BaseAPIException:
+    """Translate an error of a bulk write into an API exception"""
+    if write_error.get("code") == _DUPLICATE_KEY_ERROR:
+        return PersonAlreadyExistsException(identifier=person_id)
+    return BaseAPIException(message=write_error.get("errmsg", BaseAPIException.message))
+
+
+def _failure_error(failure: OperationFailure) -> dict:
+    """Error document (like the write errors of a bulk write) of a failed write"""
+    return failure.details or {"code": failure.code, "errmsg": str(failure)}
+
+
+def _bulk_results(results: List[BulkResult]) -> BulkResults:
+    """Build the response of a bulk request from the results of its items"""
+    failed = sum(1 for result in results if result.error)
+    return BulkResults(succeeded=len(results) - failed, failed=failed, results=results)
+
+
+def _bulk_error(index: int, person_id: str, exception: BaseAPIException) -> BulkResult:
+    """Build the failed result of an item of a bulk request from the exception it caused"""
+    return BulkResult(index=index, status_code=exception.code, person_id=person_id, error=exception.data)
+
+
+def _created_results(documents: List[dict], write_errors: List[dict]) -> BulkResults:
+    """Build the results of a bulk create, from the inserted documents and the errors of the insert"""
+    errors = {error["index"]: error for error in write_errors}
+    results = list()
+    for index, document in enumerate(documents):
+        person_id = document["_id"]
+        error = errors.get(index)
+        if error:
+            results.append(_bulk_error(index, person_id, _write_error_exception(error, person_id)))
+        else:
+            results.append(BulkResult(
+                index=index, status_code=statuscode.HTTP_201_CREATED,
+                person_id=person_id, person=_read(document, None)
+            ))
+    return _bulk_results(results)
+
+
+def _identified_result(index: int, person_id: str, written: int, write_error: Optional[dict]) -> BulkResult:
+    """Build the result of an item of a bulk update or delete, from the number of persons its write matched (0 or 1)
+    and its error (if failed)"""
+    if write_error:
+        return _bulk_error(index, person_id, _write_error_exception(write_error, person_id))
+    if not written:
+        return _bulk_error(index, person_id, PersonNotFoundException(identifier=person_id))
+    return BulkResult(index=index, status_code=statuscode.HTTP_204_NO_CONTENT, person_id=person_id)
+
+
+def _deleted_results(person_ids: List[str], documents: List[Optional[dict]]) -> BulkResults:
+    """Build the results of a bulk delete, from the documents removed by the delete of each person (None if not
+    found)"""
+    return _bulk_results([
+        _identified_result(index, person_id, int(document is not None), None)
+        for index, (person_id, document) in enumerate(zip(person_ids, documents))
+    ])
+
+
+def _document_revision(document: dict) -> str:
+    """Revision of a person document. The version is incremented on every write, as the updated timestamp has
+    seconds precision (documents written before the version field existed have no version)"""
+    return f"{document['updated']}.{document.get('version', 0)}"
+
+
+def _projection(fields: Fields, *required: str) -> Optional[dict]:
+    """Build the Mongo projection to read the given fields (None for all of them).
+    Age is computed from the birth. The required document fields, and the fields to compute the revision,
+    are always read"""
+    if not fields:
+        return None
+
+    projection = {field.document_field: True for field in fields if field is not PersonField.age}
+    if PersonField.age in fields:
+        projection["birth"] = True
+    projection.update({field: True for field in required})
+    projection.update(updated=True, version=True)
+    projection.setdefault("_id", False)
+    return projection
+
+
+@profiled("models")
+def _read(document: dict, fields: Fields, age: Optional[int] = None) -> PersonAnyRead:
+    """Build the Read model from a Mongo document. If fields are given, return a partial Read with only those fields,
+    computing only what is required. The age can be given if it was already computed (see _ages).
+    Documents are only validated if the validate_reads setting is enabled"""
+    revision = _document_revision(document)
+    if fields:
+        birth = document.get("birth")
+        document = {
+            field.document_field: document[field.document_field]
+            for field in fields if field.document_field in document
+        }
+        if PersonField.age in fields and birth:
+            document["age"] = get_age(date.fromisoformat(birth)) if age is None else age
+        if mongo_settings.validate_reads:
+            person = PersonPartialRead(**document)
+        else:
+            person = PersonPartialRead.construct_from_document(document)
+    elif mongo_settings.validate_reads:
+        person = PersonRead(**document)
+    else:
+        person = PersonRead.construct_from_document(document, age=age)
+    return person.set_revision(revision)
+
+
+def _ages(documents: List[dict], fields: Fields) -> List[Optional[int]]:
+    """Compute the ages of a batch of documents at once (None for the documents without birth,
+    or for all the documents if the age is not a read field)"""
+    if fields and PersonField.age not in fields:
+        return [None] * len(documents)
+    return age_calculator.ages(
+        date.fromisoformat(document["birth"]) if document.get("birth") else None
+        for document in documents
+    )
+
+
+def _filters_query(filters: Optional[PeopleFilters]) -> dict:
+    """Build the Mongo filter for the given list filters. All the filtered fields are covered by an index"""
+    query = dict()
+    if not filters:
+        return query
+
+    name = dict()
+    if filters.name is not None:
+        name["$eq"] = filters.name
+    if filters.name_prefix is not None:
+        # Anchored, case-sensitive regex, so it is served by the name index bounds
+        name["$regex"] = "^" + re.escape(filters.name_prefix)
+    if name:
+        query["name"] = name
+
+    for field, value in (
+            ("address.city", filters.city),
+            ("address.state", filters.state),
+            ("address.zip_code", filters.zip_code)
+    ):
+        if value is not None:
+            query[field] = value
+
+    # Birth is stored as isoformat string (see PersonUpdate.dict), which keeps the date ordering
+    birth_from = filters.birth_from.isoformat() if filters.birth_from else None
+    birth_to = filters.birth_to.isoformat() if filters.birth_to else None
+    for field, value_from, value_to in (
+            ("birth", birth_from, birth_to),
+            ("created", filters.created_from, filters.created_to),
+            ("updated", filters.updated_from, filters.updated_to)
+    ):
+        condition = dict()
+        if value_from is not None:
+            condition["$gte"] = value_from
+        if value_to is not None:
+            condition["$lte"] = value_to
+        if condition:
+            query[field] = condition
+
+    return query
+
+
+_SORT_VALUES = {sort.value for sort in PeopleSort}
+_ORDER_VALUES = {order.value for order in SortOrder}
+
+
+def _list_query(
+        filters: Optional[PeopleFilters], sort: PeopleSort, order: SortOrder, cursor: Optional[str]
+) -> Tuple[dict, List[tuple]]:
+    """Build the Mongo filter and sort specification for a page of the list of persons (keyset pagination).
+    The sorting field plus _id (as tiebreaker) are covered by an index, so each page is an index range scan"""
+    direction = ASCENDING if order == SortOrder.asc else DESCENDING
+    sorting = [(sort.value, direction), ("_id", direction)]
+    query = _filters_query(filters)
+    if not cursor:
+        return query, sorting
+
+    try:
+        cursor_sort, cursor_order, last_value, last_id = decode_token(cursor)
+        valid = cursor_sort in _SORT_VALUES and cursor_order in _ORDER_VALUES and isinstance(last_id, str)
+        valid = valid and (last_value is None or isinstance(last_value, (str, int, float)))
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise InvalidCursorException()
+    if cursor_sort != sort.value or cursor_order != order.value:
+        raise InvalidCursorException(message="The pagination cursor was generated for a different sorting")
+
+    operator_inclusive, operator = ("$gte", "$gt") if direction == ASCENDING else ("$lte", "$lt")
+    cursor_query = {
+        sort.value: {operator_inclusive: last_value},
+        "$or": [{sort.value: {operator: last_value}}, {"_id": {operator: last_id}}]
+    }
+    return ({"$and": [query, cursor_query]} if query else cursor_query), sorting
+
+
+def _list_find(
+        filters: Optional[PeopleFilters], sort: PeopleSort, order: SortOrder, limit: Optional[int],
+        cursor: Optional[str], projection: Optional[dict]
+) -> dict:
+    """Build the arguments of the Mongo find of a page of the list of persons, reading the given projection"""
+    query, sorting = _list_query(filters, sort, order, cursor)
+    return dict(filter=query, projection=projection, sort=sorting, limit=_fetch_limit(limit))
+
+
+def _fetch_limit(limit: Optional[int]) -> int:
+    """Number of documents to fetch for a page: one more than the page size, to know if there is a next page"""
+    return limit + 1 if limit else 0
+
+
+def _split_page(
+        documents: List[dict], sort: PeopleSort, order: SortOrder, limit: Optional[int]
+) -> Tuple[List[dict], Optional[str]]:
+    """Split the fetched documents (fetched using _fetch_limit) into the documents of the page,
+    and the cursor of the next page (if any)"""
+    if not limit or len(documents) <= limit:
+        return documents, None
+
+    documents = documents[:limit]
+    last = documents[-1]
+    return documents, encode_token([sort.value, order.value, last[sort.value], last["_id"]])
+
+
+def _page_revision(documents: List[dict], next_cursor: Optional[str]) -> str:
+    """Revision of a page of persons, from the revisions of its documents"""
+    revisions = ",".join(f"{document['_id']}:{_document_revision(document)}" for document in documents)
+    return f"{revisions}|{next_cursor or ''}"
+
+
+@profiled("models")
+def _list_page(
+        documents: List[dict], sort: PeopleSort, order: SortOrder, limit: Optional[int], fields: Fields
+) -> PeoplePage:
+    """Build the page of persons from the fetched documents (fetched using _fetch_limit)"""
+    documents, next_cursor = _split_page(documents, sort, order, limit)
+    # The page is built from trusted Read models, so it does not require validation
+    page = PeoplePage.construct(
+        people=[_read(document, fields, age) for document, age in zip(documents, _ages(documents, fields))],
+        next_cursor=next_cursor
+    )
+    return page.set_revision(_page_revision(documents, next_cursor))
+
+
+_TEXT_SCORE = {"$meta": "textScore"}
+_PREFIX_SEARCH_STAGES = ("name", "city")
+"""Fields matched by the prefix search, in the order their matches are returned"""
+
+
+def _search_cursor(cursor: str, mode: PeopleSearchMode, query: str) -> list:
+    """Decode the cursor of a search page, checking it was generated for the same search.
+    Returns the position of the page on the search results"""
+    try:
+        data = decode_token(cursor)
+    except ValueError:
+        raise InvalidCursorException()
+    if not isinstance(data, list) or len(data) < 2:
+        raise InvalidCursorException()
+    cursor_mode, cursor_query, *position = data
+    if cursor_mode != mode.value or cursor_query != query:
+        raise InvalidCursorException(message="The pagination cursor was generated for a different search")
+    return position
+
+
+def _text_search(query: str, cursor: Optional[str], limit: int, fields: Fields) -> Tuple[dict, int]:
+    """Build the arguments of the Mongo find of a page of a text search (one more than the limit), and its offset.
+    Results are ranked by the text score, so the pages are requested by offset (given by the cursor)"""
+    offset = 0
+    if cursor:
+        position = _search_cursor(cursor, PeopleSearchMode.text, query)
+        if len(position) != 1 or not isinstance(position[0], int) or position[0] < 0:
+            raise InvalidCursorException()
+        offset, = position
+    projection = {**(_projection(fields, "_id") or dict()), "score": _TEXT_SCORE}
+    sorting = [("score", _TEXT_SCORE), ("_id", ASCENDING)]
+    find = dict(filter={"$text": {"$search": query}}, projection=projection, sort=sorting, skip=offset, limit=limit + 1)
+    return find, offset
+
+
+def _text_search_page(
+        documents: List[dict], query: str, offset: int, limit: int, fields: Fields
+) -> PeoplePage:
+    """Build the page of a text search from the fetched documents (one more than the limit)"""
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_token([PeopleSearchMode.text.value, query, offset + limit])
+    return _search_page(documents, next_cursor, fields)
+
+
+def _prefix_searches(prefix: str, cursor: Optional[str], fields: Fields) -> List[Tuple[str, dict]]:
+    """Build the arguments of the Mongo finds (but the limit) of the searches for a page of a prefix search: the names
+    starting with the prefix, then the cities starting with the prefix (of persons whose name does not match), each
+    one sorted by the matched field. The searches before the cursor are skipped, and the first one starts after it.
+    The prefix is matched by an anchored, case-sensitive regex on the normalized fields, served by their index"""
+    regex = {"$regex": "^" + re.escape(prefix)}
+    stages = _PREFIX_SEARCH_STAGES
+    after = None
+    if cursor:
+        position = _search_cursor(cursor, PeopleSearchMode.prefix, prefix)
+        valid = len(position) == 3 and position[0] in _PREFIX_SEARCH_STAGES
+        if not valid or not all(isinstance(value, str) for value in position[1:]):
+            raise InvalidCursorException()
+        stage, last_value, last_id = position
+        stages = stages[_PREFIX_SEARCH_STAGES.index(stage):]
+        after = (last_value, last_id)
+
+    searches = list()
+    for stage in stages:
+        field = f"search.{stage}"
+        query = {field: regex}
+        if stage != _PREFIX_SEARCH_STAGES[0]:
+            query["search.name"] = {"$not": regex}
+        if after:
+            last_value, last_id = after
+            query = {"$and": [query, {
+                field: {"$gte": last_value}, "$or": [{field: {"$gt": last_value}}, {"_id": {"$gt": last_id}}]
+            }]}
+            after = None
+        searches.append((stage, dict(
+            filter=query, projection=_projection(fields, "_id", "search"), sort=[(field, ASCENDING), ("_id", ASCENDING)]
+        )))
+    return searches
+
+
+def _prefix_search_page(found: List[Tuple[str, dict]], prefix: str, limit: int, fields: Fields) -> PeoplePage:
+    """Build the page of a prefix search from the fetched documents (one more than the limit), with the
+    search stage they were found by"""
+    next_cursor = None
+    if len(found) > limit:
+        found = found[:limit]
+        stage, last = found[-1]
+        next_cursor = encode_token([PeopleSearchMode.prefix.value, prefix, stage, last["search"][stage], last["_id"]])
+    return _search_page([document for _, document in found], next_cursor, fields)
+
+
+def _search_page(documents: List[dict], next_cursor: Optional[str], fields: Fields) -> PeoplePage:
+    return PeoplePage.construct(
+        people=[_read(document, fields, age) for document, age in zip(documents, _ages(documents, fields))],
+        next_cursor=next_cursor
+    )
+
+
+_CHANGES_STAGES = ("people", "deleted")
+"""Parts of the changes, in the order they are returned: changed persons, then deleted ids"""
+_SYNC_OVERLAP = 5
+"""Seconds before the start of a sync from which the next sync reads the changes again. Writes are timestamped before
+they are committed, so the writes in flight when a sync starts are not missed (changes can be returned twice)"""
+_TOMBSTONE_PROJECTION = {"_id": True, "person_id": True, "deleted": True}
+
+
+def _tombstone(document: dict, deleted: int) -> dict:
+    """Build the tombstone of a deleted person from its document as deleted (with the _REVISION_PROJECTION),
+    expiring after the configured TTL. Its id is given by the deleted revision, so a delete can only insert its
+    tombstone once"""
+    person_id = document["_id"]
+    expires = datetime.fromtimestamp(deleted + api_settings.tombstones_ttl, tz=timezone.utc)
+    return {
+        "_id": f"{person_id}:{_document_revision(document)}",
+        "person_id": person_id, "deleted": deleted, "expires": expires
+    }
+
+
+def _tombstones(documents: List[dict]) -> List[dict]:
+    """Build the tombstones of the persons deleted together"""
+    deleted = get_time()
+    return [_tombstone(document, deleted) for document in documents]
+
+
+def _check_tombstones_error(error: BulkWriteError):
+    """Check the error of an (unordered) insert of tombstones: the tombstones already inserted (duplicate ids) are
+    ignored, and other errors raised"""
+    details = error.details
+    if details.get("writeConcernErrors") or any(
+            write_error.get("code") != _DUPLICATE_KEY_ERROR for write_error in details["writeErrors"]
+    ):
+        raise error
+
+
+def _changes_position(since: Optional[str]) -> Tuple[Optional[int], int, str, Optional[list]]:
+    """Decode the sync token of a changes request into: the time from which the changes are read (None to read all
+    the persons), the start time of the sync (now, when starting it), the stage (part of the changes) and the position
+    to continue after on that stage (last value and id, if any)"""
+    if not since:
+        return None, get_time(), _CHANGES_STAGES[0], None
+    try:
+        since_time, started, stage, after = decode_token(since)
+        # Without since time (reading all the persons), the token must be a page of a sync (with its start time)
+        valid = isinstance(since_time, int) or (since_time is None and isinstance(started, int))
+        valid = valid and stage in _CHANGES_STAGES and (after is None or len(after) == 2)
+    except (ValueError, TypeError):
+        valid = False
+    if not valid:
+        raise InvalidSyncTokenException()
+    if since_time is not None and since_time < get_time() - api_settings.tombstones_ttl:
+        # The tombstones of the persons deleted since then may have expired
+        raise SyncTokenExpiredException()
+    return since_time, started or get_time(), stage, after
+
+
+def _changes_query(field: str, since: Optional[int], after: Optional[list]) -> Tuple[dict, List[tuple]]:
+    """Build the Mongo filter and sort specification of a page of changes: the documents written (field) since the
+    given time, continuing after the given position (keyset pagination, served by the field+_id index)"""
+    sorting = [(field, ASCENDING), ("_id", ASCENDING)]
+    if after:
+        last_value, last_id = after
+        return {field: {"$gte": last_value}, "$or": [{field: {"$gt": last_value}}, {"_id": {"$gt": last_id}}]}, sorting
+    return ({field: {"$gte": since}} if since is not None else dict()), sorting
+
+
+def _changes_people_find(
+        stage: str, since: Optional[int], after: Optional[list], limit: int, fields: Fields
+) -> Optional[dict]:
+    """Build the arguments of the Mongo find of the persons changed for a page of changes (one more than the limit).
+    None if the page starts on the deleted ids"""
+    if stage != _CHANGES_STAGES[0]:
+        return None
+    query, sorting = _changes_query("updated", since, after)
+    return dict(filter=query, projection=_projection(fields, "_id", "updated"), sort=sorting, limit=limit + 1)
+
+
+def _changes_tombstones_find(stage: str, since: Optional[int], after: Optional[list], remaining: int) -> Optional[dict]:
+    """Build the arguments of the Mongo find of the tombstones for a page of changes, given the remaining page size
+    after the persons changed (one more than it). None if there are no deleted ids to read: when reading all the
+    persons (no since time), or if the persons changed fill the page"""
+    if since is None or remaining < 0:
+        return None
+    query, sorting = _changes_query("deleted", since, after if stage == _CHANGES_STAGES[1] else None)
+    return dict(filter=query, projection=_TOMBSTONE_PROJECTION, sort=sorting, limit=remaining + 1)
+
+
+@profiled("models")
+def _changes_page(
+        documents: List[dict], tombstones: List[dict], since: Optional[int], started: int, limit: int, fields: Fields
+) -> PeopleChanges:
+    """Build the page of changes from the fetched documents and tombstones (up to one more than the limit, in total),
+    with the sync token to request the next page, or the following sync if there are no more changes"""
+    if len(documents) > limit:
+        documents = documents[:limit]
+        token = [since, started, _CHANGES_STAGES[0], [documents[-1]["updated"], documents[-1]["_id"]]]
+    elif len(documents) + len(tombstones) > limit:
+        tombstones = tombstones[:limit - len(documents)]
+        after = [tombstones[-1]["deleted"], tombstones[-1]["_id"]] if tombstones else None
+        token = [since, started, _CHANGES_STAGES[1], after]
+    else:
+        token = [started - _SYNC_OVERLAP, None, _CHANGES_STAGES[0], None]
+
+    return PeopleChanges.construct(
+        people=[_read(document, fields, age) for document, age in zip(documents, _ages(documents, fields))],
+        deleted=[
+            PersonTombstone.construct(person_id=tombstone["person_id"], deleted=tombstone["deleted"])
+            for tombstone in tombstones
+        ],
+        sync_token=encode_token(token),
+        more=token[1] is not None
+    )
+
+
+class ThreadedRepository:
+    """Wrap a sync repository (like PeopleRepository), exposing its methods as coroutines that run the
+    blocking calls on the threadpool. Used by the async route handlers when the async driver is disabled"""
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+
+        def _sampled_method(*args, **kwargs):
+            with sampled_thread():
+                return method(*args, **kwargs)
+
+        async def _threaded_method(*args, **kwargs):
+            return await run_in_threadpool(_sampled_method, *args, **kwargs)
+        return _threaded_method
+
+
+class ProfiledRepository:
+    """Wrap an async repository (like AsyncPeopleRepository or a ThreadedRepository), measuring the time spent on
+    each method call as part of the profile of the current request (see profiling.py)"""
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+        span_name = f"repository.{name}"
+
+        async def _profiled_method(*args, **kwargs):
+            with span(span_name):
+                return await method(*args, **kwargs)
+        return _profiled_method
+
+
+class PublishingRepository:
+    """Wrap an async repository (like AsyncPeopleRepository or a ThreadedRepository), publishing the persons written
+    through it on the change feed (see changes.py), unless the feed reads them from a Mongo change stream.
+    Other methods are called on the wrapped repository"""
+    def __init__(self, repository, feed: ChangeFeed):
+        self._repository = repository
+        self.feed = feed
+
+    def __getattr__(self, name):
+        return getattr(self._repository, name)
+
+    @property
+    def _publishing(self) -> bool:
+        return self.feed.source == ChangesSource.repository
+
+    async def create(self, create: PersonCreate) -> PersonRead:
+        person = await self._repository.create(create)
+        if self._publishing:
+            self.feed.publish(ChangeOperation.create, person.person_id, person=person)
+        return person
+
+    async def update(self, person_id: str, update: PersonUpdate, revisions: Optional[List[str]] = None) -> PersonRead:
+        person = await self._repository.update(person_id, update, revisions=revisions)
+        if self._publishing:
+            self.feed.publish(ChangeOperation.update, person_id, update=update)
+        return person
+
+    async def delete(self, person_id: str):
+        await self._repository.delete(person_id)
+        if self._publishing:
+            self.feed.publish(ChangeOperation.delete, person_id)
+
+    async def create_many(self, creates: List[PersonCreate]) -> BulkResults:
+        results = await self._repository.create_many(creates)
+        if self._publishing:
+            for result in results.results:
+                if result.person:
+                    self.feed.publish(ChangeOperation.create, result.person_id, person=result.person)
+        return results
+
+    async def update_many(self, updates: List[PersonBulkUpdate]) -> BulkResults:
+        results = await self._repository.update_many(updates)
+        if self._publishing:
+            for item, result in zip(updates, results.results):
+                if not result.error:
+                    self.feed.publish(ChangeOperation.update, item.person_id, update=item.update)
+        return results
+
+    async def delete_many(self, person_ids: List[str]) -> BulkResults:
+        results = await self._repository.delete_many(person_ids)
+        if self._publishing:
+            for result in results.results:
+                if not result.error:
+                    self.feed.publish(ChangeOperation.delete, result.person_id)
+        return results
+
+
+class CoalescingRepository:
+    """Wrap an async repository (like AsyncPeopleRepository or a ThreadedRepository), coalescing the concurrent
+    identical reads (get and list, single-flight): a read with the same arguments as a read in flight shares its result
+    (or its exception), instead of querying the database again. Unlike a cache, nothing is kept once the read completes,
+    and the writes through this repository detach the reads in flight they could affect, so reads started after a write
+    never get the result of a read started before it. Other methods are called on the wrapped repository.
+    Coalescing is bypassed when the client requests to read its writes (with a causal consistency token)"""
+    def __init__(self, repository):
+        self._repository = repository
+        self._gets: Dict[Hashable, asyncio.Future] = dict()
+        self._lists: Dict[Hashable, asyncio.Future] = dict()
+
+    def __getattr__(self, name):
+        return getattr(self._repository, name)
+
+    async def get(self, person_id: str, fields: Fields = None) -> PersonAnyRead:
+        if causal_token_requested():
+            return await self._repository.get(person_id, fields=fields)
+        key = (person_id, _fields_key(fields))
+        return await self._coalesce("get", self._gets, key, lambda: self._repository.get(person_id, fields=fields))
+
+    async def list(
+            self,
+            filters: Optional[PeopleFilters] = None,
+            sort: PeopleSort = PeopleSort.created,
+            order: SortOrder = SortOrder.asc,
+            limit: Optional[int] = None,
+            cursor: Optional[str] = None,
+            fields: Fields = None
+    ) -> PeoplePage:
+        def _list():
+            return self._repository.list(
+                filters=filters, sort=sort, order=order, limit=limit, cursor=cursor, fields=fields
+            )
+
+        if causal_token_requested():
+            return await _list()
+        filters_key = tuple(filters.dict(exclude_none=True).items()) if filters else ()
+        key = (filters_key, sort, order, limit, cursor, _fields_key(fields))
+        return await self._coalesce("list", self._lists, key, _list)
+
+    async def _coalesce(
+            self, method: str, in_flight: Dict[Hashable, asyncio.Future], key: Hashable, read: Callable[[], Awaitable]
+    ):
+        """Share the read in flight with the given key, or start it. The read runs on its own task, so it completes
+        for the rest of the callers even if the one that started it is cancelled"""
+        future = in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(read())
+            in_flight[key] = future
+            future.add_done_callback(lambda _: _discard_flight(in_flight, key, future))
+            outcome = "executed"
+        else:
+            outcome = "coalesced"
+        if metrics_settings.enabled:
+            coalescing_reads.inc(method, outcome)
+        return await asyncio.shield(future)
+
+    def _detach(self, person_ids: List[str]):
+        """Detach the reads in flight that could be affected by writing the given persons: gets of those persons,
+        and all the lists. They complete for their current callers, but are not shared anymore"""
+        person_ids = set(person_ids)
+        for key in [key for key in self._gets if key[0] in person_ids]:
+            del self._gets[key]
+        self._lists.clear()
+
+    async def create(self, create: PersonCreate) -> PersonRead:
+        person = await self._repository.create(create)
+        self._detach([person.person_id])
+        return person
+
+    async def update(self, person_id: str, update: PersonUpdate, revisions: Optional[List[str]] = None) -> PersonRead:
+        try:
+            return await self._repository.update(person_id, update, revisions=revisions)
+        finally:
+            self._detach([person_id])
+
+    async def delete(self, person_id: str):
+        try:
+            return await self._repository.delete(person_id)
+        finally:
+            self._detach([person_id])
+
+    async def create_many(self, creates: List[PersonCreate]) -> BulkResults:
+        results = await self._repository.create_many(creates)
+        self._detach([result.person_id for result in results.results])
+        return results
+
+    async def update_many(self, updates: List[PersonBulkUpdate]) -> BulkResults:
+        try:
+            return await self._repository.update_many(updates)
+        finally:
+            self._detach([item.person_id for item in updates])
+
+    async def delete_many(self, person_ids: List[str]) -> BulkResults:
+        try:
+            return await self._repository.delete_many(person_ids)
+        finally:
+            self._detach(person_ids)
+
+
+def _fields_key(fields: Fields) -> Optional[frozenset]:
+    return frozenset(fields) if fields else None
+
+
+def _discard_flight(in_flight: Dict[Hashable, asyncio.Future], key: Hashable, future: asyncio.Future):
+    """Remove a completed read from the reads in flight (unless detached and replaced by a newer one). Its exception
+    is retrieved, as all its callers may have been cancelled"""
+    if in_flight.get(key) is future:
+        del in_flight[key]
+    if not future.cancelled():
+        future.exception()
+
+
+class CachedRepository:
+    """Wrap an async repository (like AsyncPeopleRepository or a ThreadedRepository), caching the persons read by id
+    (when all their fields are read), including the ids not found. The entries are invalidated when the person is
+    written through this repository (with multiple workers, also when written by other processes: see app.py).
+    Other methods are called on the wrapped repository.
+    The cache is bypassed when the client requests to read its writes (with a causal consistency token)"""
+    def __init__(self, repository, cache: LRUCache, not_found_ttl: float):
+        self._repository = repository
+        self.cache = cache
+        self.not_found_ttl = not_found_ttl
+
+    def __getattr__(self, name):
+        return getattr(self._repository, name)
+
+    @property
+    def wrapped(self):
+        """The repository wrapped by the cache"""
+        return self._repository
+
+    async def get(self, person_id: str, fields: Fields = None) -> PersonAnyRead:
+        if fields or causal_token_requested():
+            return await self._repository.get(person_id, fields=fields)
+
+        found, person = self.cache.get(person_id)
+        if found:
+            if person is None:
+                raise PersonNotFoundException(person_id)
+            return person
+
+        version = self.cache.version
+        try:
+            person = await self._repository.get(person_id)
+        except PersonNotFoundException:
+            self.cache.set(person_id, None, version, ttl=self.not_found_ttl)
+            raise
+
+        self.cache.set(person_id, person, version)
+        return person
+
+    async def get_revision(self, person_id: str) -> str:
+        found, person = (False, None) if causal_token_requested() else self.cache.get(person_id)
+        if not found:
+            return await self._repository.get_revision(person_id)
+        if person is None:
+            raise PersonNotFoundException(person_id)
+        return person.revision
+
+    async def create(self, create: PersonCreate) -> PersonRead:
+        person = await self._repository.create(create)
+        self.cache.invalidate(person.person_id)
+        return person
+
+    async def update(self, person_id: str, update: PersonUpdate, revisions: Optional[List[str]] = None) -> PersonRead:
+        try:
+            return await self._repository.update(person_id, update, revisions=revisions)
+        finally:
+            self.cache.invalidate(person_id)
+
+    async def delete(self, person_id: str):
+        try:
+            return await self._repository.delete(person_id)
+        finally:
+            self.cache.invalidate(person_id)
+
+    async def create_many(self, creates: List[PersonCreate]) -> BulkResults:
+        results = await self._repository.create_many(creates)
+        for result in results.results:
+            self.cache.invalidate(result.person_id)
+        return results
+
+    async def update_many(self, updates: List[PersonBulkUpdate]) -> BulkResults:
+        try:
+            return await self._repository.update_many(updates)
+        finally:
+            for item in updates:
+                self.cache.invalidate(item.person_id)
+
+    async def delete_many(self, person_ids: List[str]) -> BulkResults:
+        try:
+            return await self._repository.delete_many(person_ids)
+        finally:
+            for person_id in person_ids:
+                self.cache.invalidate(person_id)
@@ -0,0 +1,130 @@
+"""RESPONSES
+Custom response classes and body generators used by the API routes
+"""
+
+# # Native # #
+from typing import Any, Union, Iterable, AsyncIterable, Iterator, AsyncIterator
+
+# # Installed # #
+import orjson
+import pydantic
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+
+# # Package # #
+from .models import PersonRead, PersonChange
+from .changes import Subscription, SubscriptionLagged
+from .profiling import span
+
+__all__ = (
+    "FastJSONResponse", "NDJSONStreamingResponse", "JSONStreamingResponse", "EventStreamResponse", "MetricsResponse",
+    "stream_ndjson", "stream_json_array", "stream_events"
+)
+
+People = Union[Iterable[PersonRead], AsyncIterable[PersonRead]]
+Chunks = Union[Iterator[bytes], AsyncIterator[bytes]]
+
+
+def _default(obj: Any) -> Any:
+    """Encode the objects not natively supported by orjson"""
+    if isinstance(obj, pydantic.BaseModel):
+        return obj.dict()
+    raise TypeError
+
+
+def _dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson, that accepts our models as content (encoded using their dict() method).
+    Route handlers return this response directly with the Read models, so FastAPI does not validate and encode
+    them again against the response_model (which is still used for the OpenAPI documentation)"""
+    def render(self, content: Any) -> bytes:
+        with span("serialization"):
+            return _dumps(content)
+
+
+class MetricsResponse(PlainTextResponse):
+    """Metrics in the Prometheus text exposition format"""
+    media_type = "text/plain; version=0.0.4"
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+
+class JSONStreamingResponse(StreamingResponse):
+    media_type = "application/json"
+
+
+class EventStreamResponse(StreamingResponse):
+    """Server-Sent Events stream. Proxies must not buffer nor cache it"""
+    media_type = "text/event-stream"
+
+    def __init__(self, content: Chunks, status_code: int = 200, **kwargs):
+        super().__init__(content, status_code=status_code, **kwargs)
+        self.headers.setdefault("Cache-Control", "no-cache")
+        self.headers.setdefault("X-Accel-Buffering", "no")
+
+
+def _encode(person: PersonRead) -> bytes:
+    return _dumps(person)
+
+
+def _stream(people: People, start=b"", separator=b"", suffix=b"", end=b"") -> Chunks:
+    """Encode each person as soon as it is read, yielding the start, the encoded persons (each one followed by
+    the suffix) joined by the separator, and the end.
+    Sync iterables return a sync generator (StreamingResponse iterates it on the threadpool),
+    while async iterables return an async generator"""
+    def _sync_stream():
+        if start:
+            yield start
+        for i, person in enumerate(people):
+            yield (separator if i else b"") + _encode(person) + suffix
+        if end:
+            yield end
+
+    async def _async_stream():
+        if start:
+            yield start
+        i = 0
+        async for person in people:
+            yield (separator if i else b"") + _encode(person) + suffix
+            i += 1
+        if end:
+            yield end
+
+    return _async_stream() if hasattr(people, "__aiter__") else _sync_stream()
+
+
+def stream_ndjson(people: People) -> Chunks:
+    """Stream persons as newline-delimited JSON (one JSON object per line)"""
+    return _stream(people, suffix=b"\n")
+
+
+def stream_json_array(people: People) -> Chunks:
+    """Stream persons as a JSON array"""
+    return _stream(people, start=b"[", separator=b",", end=b"]")
+
+
+def _encode_event(event: PersonChange) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event.event_id.encode(), event.operation.value.encode(), _dumps(event))
+
+
+async def stream_events(subscription: Subscription, heartbeat_seconds: float) -> AsyncIterator[bytes]:
+    """Stream the events of a change feed subscription as Server-Sent Events (the id of each event is its event_id,
+    and the event type its operation). A heartbeat comment is sent when no event is published for a while.
+    If the subscriber lags behind, a "lagged" event is sent and the stream ends: the client must reconnect, resuming
+    after the last event it received (EventSource clients do it automatically, sending the Last-Event-ID header)"""
+    try:
+        yield b": subscribed\n\n"
+        while True:
+            try:
+                event = await subscription.get(timeout=heartbeat_seconds)
+            except SubscriptionLagged:
+                message = {"message": "Events were published faster than consumed; resume from the last event received"}
+                yield b"event: lagged\ndata: %s\n\n" % _dumps(message)
+                return
+            yield b": heartbeat\n\n" if event is None else _encode_event(event)
+    finally:
+        subscription.close()
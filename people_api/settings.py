@@ -2,10 +2,18 @@
 Settings loaders using Pydantic BaseSettings classes (load from environment variables / dotenv file)
 """
 
+# # Native # #
+from enum import Enum
+from typing import Optional
+
 # # Installed # #
 import pydantic
 
-__all__ = ("api_settings", "mongo_settings")
+__all__ = (
+    "api_settings", "mongo_settings", "cache_settings", "storage_settings", "metrics_settings",
+    "profiling_settings", "changes_settings", "compression_settings", "admission_settings", "coalescing_settings",
+    "StorageEngine", "ReadPreferenceMode", "ChangesSource"
+)
 
 
 class BaseSettings(pydantic.BaseSettings):
@@ -18,19 +26,252 @@ class APISettings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 5000
     log_level: str = "INFO"
+    openapi_file: Optional[str] = None
+    """JSON file with the OpenAPI schema of the API, precomputed at build time (python -m people_api.openapi FILE),
+    served instead of generating it on each worker. Must be generated from the same version of the API"""
+    workers: int = pydantic.Field(1, ge=1)
+    """Number of worker processes serving the API. With more than one, Uvicorn supervises them: the workers that die
+    or stop answering its health checks are replaced, SIGHUP replaces them all one by one (graceful reload), and
+    SIGINT/SIGTERM shut them down. Each worker has its own Mongo clients, cache, change feed, metrics and profiler"""
+    graceful_shutdown_timeout: Optional[int] = None
+    """Seconds given to the requests in progress (and open change streams) to finish when a worker shuts down,
+    before closing their connections (unlimited if not set)"""
+    worker_healthcheck_timeout: int = 5
+    """Seconds a worker has to answer the health checks of the supervisor (and to start up, on reloads) before being
+    replaced. Only applied with Uvicorn 0.37 or newer"""
+    list_limit: int = 100
+    """Default number of persons returned per page on the list endpoint"""
+    list_max_limit: int = 1000
+    """Maximum number of persons that can be requested per page on the list endpoint"""
+    export_batch_size: int = 1000
+    """Default number of documents fetched from the database on each round trip, when exporting all the persons"""
+    export_max_batch_size: int = 10000
+    """Maximum export batch size that can be requested"""
+    bulk_max_items: int = 1000
+    """Maximum number of items that can be sent on a single bulk request"""
+    search_limit: int = 20
+    """Default number of persons returned per page on the search endpoint"""
+    search_max_length: int = 100
+    """Maximum length of the searched text"""
+    changes_limit: int = 1000
+    """Default number of changes (changed persons plus deleted ids) returned per request on the changes endpoint"""
+    tombstones_ttl: int = 7 * 24 * 3600
+    """Seconds the ids of the deleted persons are kept, to be returned by the changes endpoint. Clients syncing less
+    often must read all the persons again"""
 
     class Config(BaseSettings.Config):
         env_prefix = "API_"
 
 
+class ReadPreferenceMode(str, Enum):
+    primary = "primary"
+    primary_preferred = "primaryPreferred"
+    secondary = "secondary"
+    secondary_preferred = "secondaryPreferred"
+    nearest = "nearest"
+
+
 class MongoSettings(BaseSettings):
     uri: str = "mongodb://127.0.0.1:27017"
     database: str = "fastapi+pydantic+mongo-example"
     collection: str = "people"
+    tombstones_collection: str = "people_tombstones"
+    """Collection with the ids of the deleted persons (expired with a TTL index)"""
+    async_driver: bool = False
+    """If True, use the async (asyncio) Mongo client for the API requests; otherwise, the sync client is used,
+    running the blocking database calls on the threadpool"""
+    validate_reads: bool = False
+    """If True, the documents read from the database are validated by the Read models; otherwise, they are trusted
+    (as they were written by the API) and the models are built without validation"""
+    max_pool_size: int = 100
+    """Maximum number of connections of the pool of each client (sync and async)"""
+    min_pool_size: int = 0
+    warmup_connections: int = pydantic.Field(1, ge=0)
+    """Connections opened on startup (on each worker) on the pool of the client used by the requests, by sending that
+    many concurrent pings, so the first requests do not pay for connecting. 0 to connect on the first request"""
+    max_idle_time_ms: Optional[int] = None
+    """Milliseconds a connection can remain idle on the pool before being closed (None for no limit)"""
+    wait_queue_timeout_ms: Optional[int] = None
+    """Milliseconds an operation can wait for a free connection of the pool before failing (None for no limit)"""
+    socket_timeout_ms: Optional[int] = None
+    """Milliseconds to wait for the response of an operation before failing (None for no limit)"""
+    connect_timeout_ms: int = 20000
+    server_selection_timeout_ms: int = 30000
+    compressors: Optional[str] = None
+    """Comma-separated list of compressors for the traffic with the server, by preference (snappy, zlib, zstd)"""
+    write_concern: Optional[str] = None
+    """Write concern: "majority", number of nodes, or tag set name, that must acknowledge the writes
+    (None for the server default)"""
+    write_concern_journal: Optional[bool] = None
+    write_concern_timeout_ms: Optional[int] = None
+    read_preference: ReadPreferenceMode = ReadPreferenceMode.primary
+    """Read preference of the reads performed by the GET endpoints, which can be served by secondaries.
+    Writes (and the reads performed by them) always go to the primary"""
+    max_staleness_seconds: Optional[int] = None
+    """Maximum replication lag of the secondaries to read from (at least 90 seconds; not valid for primary reads)"""
+    causal_consistency: bool = False
+    """If True, the operations run on causal sessions, and responses return a token (X-Causal-Token header) that
+    clients can send on following requests to read their own writes (even when reading from secondaries)"""
+
+    @pydantic.validator("max_staleness_seconds")
+    def _validate_max_staleness(cls, value, values):
+        if value is not None and values.get("read_preference") == ReadPreferenceMode.primary:
+            raise ValueError("max_staleness_seconds is not valid with the primary read preference")
+        return value
 
     class Config(BaseSettings.Config):
         env_prefix = "MONGO_"
 
 
+class CacheSettings(BaseSettings):
+    enabled: bool = False
+    """If True, single persons read by id are cached in-process"""
+    max_entries: int = 10000
+    ttl: float = 60
+    """Seconds a read person is kept on the cache (unless written before by this process)"""
+    not_found_ttl: float = 5
+    """Seconds a not found person id is kept on the cache"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "CACHE_"
+
+
+class CoalescingSettings(BaseSettings):
+    enabled: bool = True
+    """If True, the concurrent identical reads (persons by id, and pages of the list) share a single read in flight
+    (and its result or error), instead of querying the database once each"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "COALESCING_"
+
+
+class StorageEngine(str, Enum):
+    mongo = "mongo"
+    memory = "memory"
+
+
+class StorageSettings(BaseSettings):
+    engine: StorageEngine = StorageEngine.mongo
+    """Storage backend used by the repositories: MongoDB, or the in-process in-memory engine (the data is lost
+    when the process ends, and is not shared between processes)"""
+    snapshot: Optional[str] = None
+    """Path of a file with persons, as exported by the export endpoint (JSON array or NDJSON), loaded on startup
+    when using the memory engine"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "STORAGE_"
+
+
+class MetricsSettings(BaseSettings):
+    enabled: bool = True
+    """If True, metrics of the requests and the Mongo clients are collected, and exposed on the /metrics endpoint
+    (Prometheus text format)"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "METRICS_"
+
+
+class ProfilingSettings(BaseSettings):
+    enabled: bool = True
+    """If True, the time spent on each part of the request pipeline is measured, and the slow requests are recorded
+    (readable on the /admin/profiling/requests endpoint)"""
+    slow_threshold_ms: float = 500
+    """Requests slower than this (in milliseconds) are recorded"""
+    max_recorded: int = 100
+    """Maximum number of recorded requests (the oldest are discarded)"""
+    sampling_header: Optional[str] = None
+    """Requests sending this header (like X-Profile) are profiled with the sampling profiler, and always recorded.
+    As any client can send it, it should only be set where the clients are trusted (disabled by default)"""
+    admin_enabled: bool = False
+    """If True, the profiler can be updated through PATCH /admin/profiling (enabling the sampling profiler for all
+    the requests). As the endpoint is not authenticated, it is disabled by default"""
+    sampling_interval_ms: float = 1
+    """Interval between the stack samples taken by the sampling profiler, in milliseconds"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "PROFILING_"
+
+
+class ChangesSource(str, Enum):
+    auto = "auto"
+    repository = "repository"
+    change_stream = "change_stream"
+
+
+class ChangesSettings(BaseSettings):
+    enabled: bool = True
+    """If True, the persons created, updated and deleted are published on the change feed, pushed to the clients of
+    the /people/changes/stream endpoint (Server-Sent Events)"""
+    source: ChangesSource = ChangesSource.auto
+    """Where the events come from: the writes performed by the repositories of this process (repository), or a Mongo
+    change stream, that also sees the writes of other processes (change_stream; requires a replica set or sharded
+    cluster). With auto, the change stream is used if the Mongo server supports it"""
+    history_size: int = 10000
+    """Number of recent events kept to resume the feed (the clients that reconnect get the events they missed)"""
+    queue_size: int = 1000
+    """Maximum number of events pending to be sent to each subscriber. Subscribers whose queue fills up (slow
+    clients) are disconnected, and can resume the feed from the last event they received"""
+    heartbeat_seconds: float = 15
+    """Seconds without events after which a heartbeat (SSE comment) is sent, to keep idle connections alive"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "CHANGES_"
+
+
+class CompressionSettings(BaseSettings):
+    enabled: bool = True
+    """If True, the responses are compressed with the encoding negotiated with the client (Accept-Encoding)"""
+    encodings: str = "br,gzip"
+    """Comma-separated encodings that can be used, by preference when the client accepts several of them equally
+    (br requires the brotli package; it is ignored if not installed)"""
+    min_size: int = 1024
+    """Responses with a smaller body (like single persons and errors) are sent uncompressed. Streamed responses
+    are always compressed"""
+    gzip_level: int = pydantic.Field(6, ge=1, le=9)
+    brotli_quality: int = pydantic.Field(4, ge=0, le=11)
+    """Quality of the brotli compression; the highest qualities are too slow for compressing responses on the fly"""
+
+    class Config(BaseSettings.Config):
+        env_prefix = "COMPRESSION_"
+
+
+class AdmissionSettings(BaseSettings):
+    enabled: bool = True
+    """If True, the number of requests processed at once on the /people endpoints is limited (per worker), separately
+    for reads and writes. Requests over the limit wait on a bounded queue, and are rejected with 503 when the queue
+    is full or they wait for longer than the queue timeout"""
+    read_limit: int = pydantic.Field(32, ge=1)
+    """Maximum number of reads (GET requests) processed at once (the initial limit, with adaptive limits)"""
+    write_limit: int = pydantic.Field(16, ge=1)
+    """Maximum number of writes (POST, PATCH and DELETE requests) processed at once"""
+    read_queue_size: int = pydantic.Field(64, ge=0)
+    """Maximum number of reads waiting to be processed"""
+    write_queue_size: int = pydantic.Field(32, ge=0)
+    """Maximum number of writes waiting to be processed"""
+    queue_timeout_ms: int = 1000
+    """Milliseconds a request can wait on the queue before being rejected"""
+    retry_after_seconds: int = 1
+    """Value of the Retry-After header of the rejected requests"""
+    adaptive: bool = True
+    """If True, the limits adapt to the latency of the requests (AIMD): they are decreased (multiplied by
+    the backoff) when the requests take longer than the latency target, and increased by one request per round of
+    requests completed within it, up to the configured limits"""
+    latency_target_ms: int = 250
+    min_limit: int = pydantic.Field(4, ge=1)
+    """Minimum limit the adaptive limits can be decreased to"""
+    backoff: float = pydantic.Field(0.9, gt=0, lt=1)
+
+    class Config(BaseSettings.Config):
+        env_prefix = "ADMISSION_"
+
+
 api_settings = APISettings()
 mongo_settings = MongoSettings()
+cache_settings = CacheSettings()
+coalescing_settings = CoalescingSettings()
+storage_settings = StorageSettings()
+metrics_settings = MetricsSettings()
+profiling_settings = ProfilingSettings()
+changes_settings = ChangesSettings()
+compression_settings = CompressionSettings()
+admission_settings = AdmissionSettings()
@@ -0,0 +1,162 @@
+"""STORAGE - BASE
+Interface of the storage backends used by the repositories. The interface is the subset of the pymongo Collection
+(and AsyncCollection) API used by the repositories, so the Mongo collections implement it as they are.
+Queries, projections, sorting and update operations are given as Mongo documents; backends other than Mongo must
+support at least the operators used by the repositories:
+- query: equality, $eq, $gt, $gte, $lt, $lte, $in, $regex, $not (on dotted fields), $and, $or, and $text searches
+  (requires a text index)
+- projection: inclusion ({field: True}, optionally excluding _id), and {"$meta": "textScore"} on text searches
+- update: $set, $inc
+The session argument (Mongo causal session) and the read preference can be ignored by backends without replication
+"""
+
+# # Native # #
+import abc
+from typing import Optional, Iterable, Iterator, AsyncIterator, Sequence, List, Tuple, Union, Any
+
+# # Installed # #
+from pymongo import IndexModel, ReturnDocument
+from pymongo.collection import Collection
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+
+__all__ = ("StorageCollection", "AsyncStorageCollection", "Sort")
+
+Sort = Sequence[Tuple[str, Union[int, dict]]]
+"""Sorting specification: list of (field, direction), being direction ASCENDING (1) or DESCENDING (-1),
+or {"$meta": "textScore"} to sort by relevance on text searches"""
+
+
+class StorageCollection(abc.ABC):
+    """Collection of documents, used by the sync repositories.
+    Write methods raise the pymongo exceptions (DuplicateKeyError, BulkWriteError) on write errors"""
+    @abc.abstractmethod
+    def find_one(self, filter: dict, projection: Optional[dict] = None, session: Any = None) -> Optional[dict]:
+        pass
+
+    @abc.abstractmethod
+    def find(
+            self, filter: Optional[dict] = None, projection: Optional[dict] = None,
+            sort: Optional[Sort] = None, limit: int = 0, batch_size: int = 0, skip: int = 0, session: Any = None
+    ) -> Iterator[dict]:
+        pass
+
+    @abc.abstractmethod
+    def insert_one(self, document: dict, session: Any = None) -> InsertOneResult:
+        pass
+
+    @abc.abstractmethod
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, session: Any = None) -> InsertManyResult:
+        pass
+
+    @abc.abstractmethod
+    def update_one(self, filter: dict, update: dict, session: Any = None) -> UpdateResult:
+        pass
+
+    @abc.abstractmethod
+    def find_one_and_update(
+            self, filter: dict, update: dict, projection: Optional[dict] = None,
+            return_document: bool = ReturnDocument.BEFORE, session: Any = None
+    ) -> Optional[dict]:
+        """Update the first document matching the filter atomically, returning it as it was before the update,
+        or after it (ReturnDocument.AFTER). None if no document matched"""
+        pass
+
+    @abc.abstractmethod
+    def bulk_write(self, requests: Sequence[Any], ordered: bool = True, session: Any = None) -> BulkWriteResult:
+        """Perform the given write operations (pymongo's InsertOne, UpdateOne, DeleteOne...)"""
+        pass
+
+    @abc.abstractmethod
+    def delete_one(self, filter: dict, session: Any = None) -> DeleteResult:
+        pass
+
+    @abc.abstractmethod
+    def find_one_and_delete(
+            self, filter: dict, projection: Optional[dict] = None, session: Any = None
+    ) -> Optional[dict]:
+        """Delete the first document matching the filter atomically, returning it as it was before the delete.
+        None if no document matched"""
+        pass
+
+    @abc.abstractmethod
+    def delete_many(self, filter: dict, session: Any = None) -> DeleteResult:
+        pass
+
+    @abc.abstractmethod
+    def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        pass
+
+    @abc.abstractmethod
+    def with_options(self, read_preference: Any = None) -> "StorageCollection":
+        """Get the same collection, using the given read preference for its reads"""
+        pass
+
+
+class AsyncStorageCollection(abc.ABC):
+    """Same as StorageCollection, for the async repositories: all the methods are coroutines,
+    but find, which returns an async iterator"""
+    @abc.abstractmethod
+    async def find_one(self, filter: dict, projection: Optional[dict] = None, session: Any = None) -> Optional[dict]:
+        pass
+
+    @abc.abstractmethod
+    def find(
+            self, filter: Optional[dict] = None, projection: Optional[dict] = None,
+            sort: Optional[Sort] = None, limit: int = 0, batch_size: int = 0, skip: int = 0, session: Any = None
+    ) -> AsyncIterator[dict]:
+        pass
+
+    @abc.abstractmethod
+    async def insert_one(self, document: dict, session: Any = None) -> InsertOneResult:
+        pass
+
+    @abc.abstractmethod
+    async def insert_many(
+            self, documents: Iterable[dict], ordered: bool = True, session: Any = None
+    ) -> InsertManyResult:
+        pass
+
+    @abc.abstractmethod
+    async def update_one(self, filter: dict, update: dict, session: Any = None) -> UpdateResult:
+        pass
+
+    @abc.abstractmethod
+    async def find_one_and_update(
+            self, filter: dict, update: dict, projection: Optional[dict] = None,
+            return_document: bool = ReturnDocument.BEFORE, session: Any = None
+    ) -> Optional[dict]:
+        pass
+
+    @abc.abstractmethod
+    async def bulk_write(
+            self, requests: Sequence[Any], ordered: bool = True, session: Any = None
+    ) -> BulkWriteResult:
+        pass
+
+    @abc.abstractmethod
+    async def delete_one(self, filter: dict, session: Any = None) -> DeleteResult:
+        pass
+
+    @abc.abstractmethod
+    async def find_one_and_delete(
+            self, filter: dict, projection: Optional[dict] = None, session: Any = None
+    ) -> Optional[dict]:
+        pass
+
+    @abc.abstractmethod
+    async def delete_many(self, filter: dict, session: Any = None) -> DeleteResult:
+        pass
+
+    @abc.abstractmethod
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        pass
+
+    @abc.abstractmethod
+    def with_options(self, read_preference: Any = None) -> "AsyncStorageCollection":
+        pass
+
+
+# The Mongo collections are the Mongo implementation of the storage interface
+StorageCollection.register(Collection)
+AsyncStorageCollection.register(AsyncCollection)
@@ -0,0 +1,742 @@
+"""STORAGE - MEMORY
+In-memory storage engine. Documents are kept on a dict by _id (hash index), plus sorted secondary indexes declared
+the same way as for Mongo (create_indexes with IndexModels), used to serve equality, range and prefix queries, and
+the sorting of the results, and a text index serving the $text searches. TTL indexes expire documents as Mongo does
+(checked by the writes, at most once per second). Useful for serving read-mostly snapshots, tests and benchmarks.
+Documents are never modified in place (updates replace them), so the found documents can be read without locking.
+Array fields are not supported
+"""
+
+# # Native # #
+import re
+import heapq
+import bisect
+import threading
+from time import monotonic
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, Iterable, Iterator, AsyncIterator, Sequence, Dict, List, Tuple, Any
+
+# # Installed # #
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING, TEXT, InsertOne, UpdateOne, DeleteOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError, OperationFailure
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+
+# # Package # #
+from .base import StorageCollection, AsyncStorageCollection, Sort
+from ..utils import normalize_search
+
+__all__ = ("MemoryCollection", "AsyncMemoryCollection")
+
+_DUPLICATE_KEY_ERROR = 11000
+_INDEX_NOT_FOUND_ERROR = 27
+_MISSING = object()
+_MAX_KEY = (99,)
+_REGEX_SPECIAL_CHARS = set(".^$*+?{}[]|()\\")
+_BATCH_INDEXING_SIZE = 64
+"""Number of documents inserted at once from which the indexes are re-sorted, instead of inserting each key"""
+_EXPIRE_INTERVAL = 1
+"""Minimum seconds between the checks of the documents expired by the TTL indexes"""
+
+
+def _key(value: Any) -> tuple:
+    """Sorting key of a value, ordering the values of different types like Mongo does (null, numbers, strings...),
+    so values of different types can be compared"""
+    if value is None or value is _MISSING:
+        return 0,
+    if isinstance(value, bool):
+        return 5, value
+    if isinstance(value, (int, float)):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    if isinstance(value, dict):
+        return 3,
+    if isinstance(value, list):
+        return 4,
+    return 6, value
+
+
+def _get(document: dict, field: str) -> Any:
+    """Get the value of a (dotted) field of a document, or _MISSING"""
+    value = document
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _copy(value: Any) -> Any:
+    """Copy the dicts and lists of a value"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+@lru_cache(maxsize=256)
+def _regex(pattern: str, options: str) -> re.Pattern:
+    flags = re.IGNORECASE if "i" in options else 0
+    return re.compile(pattern, flags)
+
+
+def _regex_prefix(pattern: str, options: str) -> Optional[str]:
+    """Literal prefix that all the strings matching the given anchored regex start with, if any"""
+    if not pattern.startswith("^") or "|" in pattern or "i" in options:
+        return None
+    prefix = list()
+    position = 1
+    while position < len(pattern):
+        char = pattern[position]
+        if char == "\\":
+            literal = pattern[position + 1:position + 2]
+            if not literal or literal.isalnum():
+                break
+            width = 2
+        elif char in _REGEX_SPECIAL_CHARS:
+            break
+        else:
+            literal, width = char, 1
+        # A quantifier after the char may make it optional
+        if pattern[position + width:position + width + 1] in ("*", "?", "{"):
+            break
+        prefix.append(literal)
+        position += width
+    return "".join(prefix) or None
+
+
+def _equals(value: Any, operand: Any) -> bool:
+    if operand is None:
+        return value is None or value is _MISSING
+    return value is not _MISSING and value == operand
+
+
+def _compare(value: Any, operand: Any) -> Optional[int]:
+    """Compare a value with an operand of a range operator. Values of different types do not match (None)"""
+    value_key, operand_key = _key(value), _key(operand)
+    if value_key[0] != operand_key[0]:
+        return None
+    return (value_key > operand_key) - (value_key < operand_key)
+
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or not condition or not next(iter(condition)).startswith("$"):
+        return _equals(value, condition)
+
+    for operator, operand in condition.items():
+        if operator == "$eq":
+            matched = _equals(value, operand)
+        elif operator == "$ne":
+            matched = not _equals(value, operand)
+        elif operator == "$in":
+            matched = any(_equals(value, item) for item in operand)
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            comparison = _compare(value, operand)
+            matched = comparison is not None and {
+                "$gt": comparison > 0, "$gte": comparison >= 0, "$lt": comparison < 0, "$lte": comparison <= 0
+            }[operator]
+        elif operator == "$regex":
+            matched = isinstance(value, str) and bool(_regex(operand, condition.get("$options", "")).search(value))
+        elif operator == "$options":
+            matched = True
+        elif operator == "$not":
+            matched = not _matches_condition(value, operand)
+        else:
+            raise ValueError(f"Query operator {operator} is not supported")
+        if not matched:
+            return False
+    return True
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """Check if a document matches a Mongo query"""
+    for field, condition in query.items():
+        if field == "$and":
+            matched = all(_matches(document, item) for item in condition)
+        elif field == "$or":
+            matched = any(_matches(document, item) for item in condition)
+        elif field.startswith("$"):
+            raise ValueError(f"Query operator {field} is not supported")
+        else:
+            matched = _matches_condition(_get(document, field), condition)
+        if not matched:
+            return False
+    return True
+
+
+def _project(document: dict, projection: Optional[dict]) -> dict:
+    """Copy a document, with only the fields included by the given projection (inclusion or exclusion)"""
+    if not projection:
+        return _copy(document)
+
+    if any(value for field, value in projection.items() if field != "_id") or all(projection.values()):
+        result = dict()
+        if projection.get("_id", True) and "_id" in document:
+            result["_id"] = document["_id"]
+        for field, included in projection.items():
+            if not included or field == "_id":
+                continue
+            value = _get(document, field)
+            if value is _MISSING:
+                continue
+            *parents, last = field.split(".")
+            target = result
+            for parent in parents:
+                target = target.setdefault(parent, dict())
+            target[last] = _copy(value)
+        return result
+
+    excluded = {field for field, value in projection.items() if not value}
+    return {field: _copy(value) for field, value in document.items() if field not in excluded}
+
+
+def _sorted(documents: List[dict], sort: Sort, scores: Optional[Dict[Any, float]] = None) -> List[dict]:
+    """Sort the documents by the given fields. Fields sorted by {"$meta": "textScore"} are sorted by the given
+    text search scores (descending)"""
+    for field, direction in reversed(sort):
+        if isinstance(direction, dict):
+            documents.sort(key=lambda document: scores[document["_id"]], reverse=True)
+        else:
+            documents.sort(key=lambda document: _key(_get(document, field)), reverse=direction == DESCENDING)
+    return documents
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", normalize_search(text))
+
+
+def _apply_update(document: dict, update: dict) -> dict:
+    """Return a copy of the document with the given update operation applied"""
+    result = _copy(document)
+    for operator, fields in update.items():
+        if operator not in ("$set", "$inc", "$unset"):
+            raise ValueError(f"Update operator {operator} is not supported")
+        for field, value in fields.items():
+            if field == "_id":
+                raise ValueError("The _id field can not be updated")
+            *parents, last = field.split(".")
+            target = result
+            for parent in parents:
+                target = target.setdefault(parent, dict())
+            if operator == "$set":
+                target[last] = _copy(value)
+            elif operator == "$inc":
+                target[last] = target.get(last, 0) + value
+            else:
+                target.pop(last, None)
+    return result
+
+
+class _Bounds:
+    """Bounds of the values of a field, given by the conditions of a query"""
+    def __init__(self):
+        self.equals = _MISSING
+        self.lower: Optional[tuple] = None
+        self.upper: Optional[tuple] = None
+
+    def set_lower(self, key: tuple):
+        self.lower = key if self.lower is None else max(self.lower, key)
+
+    def set_upper(self, key: tuple):
+        self.upper = key if self.upper is None else min(self.upper, key)
+
+    def add(self, condition: Any):
+        if not isinstance(condition, dict) or not condition or not next(iter(condition)).startswith("$"):
+            self.equals = condition
+            return
+
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                self.equals = operand
+            elif operator == "$gte":
+                self.set_lower((_key(operand),))
+            elif operator == "$gt":
+                self.set_lower((_key(operand), _MAX_KEY))
+            elif operator == "$lte":
+                self.set_upper((_key(operand), _MAX_KEY))
+            elif operator == "$lt":
+                self.set_upper((_key(operand),))
+            elif operator == "$regex":
+                prefix = _regex_prefix(operand, condition.get("$options", ""))
+                if prefix:
+                    self.set_lower((_key(prefix),))
+                    self.set_upper((_key(prefix + "\U0010ffff"), _MAX_KEY))
+
+    @classmethod
+    def from_query(cls, query: dict, bounds: Optional[Dict[str, "_Bounds"]] = None) -> Dict[str, "_Bounds"]:
+        """Bounds of the fields of a query (only the conditions that all the matching documents must satisfy)"""
+        bounds = dict() if bounds is None else bounds
+        for field, condition in query.items():
+            if field == "$and":
+                for item in condition:
+                    cls.from_query(item, bounds)
+            elif not field.startswith("$"):
+                bounds.setdefault(field, cls()).add(condition)
+        return bounds
+
+
+class _SortedIndex:
+    """Secondary index: sorted list with the keys of the indexed fields of each document, plus its _id"""
+    def __init__(self, name: str, fields: List[str]):
+        self.name = name
+        self.fields = tuple(fields if fields[-1] == "_id" else [*fields, "_id"])
+        self.keys: List[tuple] = list()
+
+    def key(self, document: dict) -> tuple:
+        return tuple(_key(_get(document, field)) for field in self.fields)
+
+    def add(self, documents: List[dict]):
+        if len(documents) >= _BATCH_INDEXING_SIZE:
+            self.keys.extend(self.key(document) for document in documents)
+            self.keys.sort()
+            return
+        for document in documents:
+            bisect.insort(self.keys, self.key(document))
+
+    def remove(self, document: dict):
+        key = self.key(document)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+
+    def plan(self, bounds: Dict[str, _Bounds], sort: Optional[Sort]) -> Tuple[int, bool, tuple, tuple, bool]:
+        """Check how this index can serve a query with the given bounds and sorting.
+        Return the selectivity (number of bounded fields), if the index serves the sorting,
+        the lower and upper keys to scan, and if the scan must be reversed"""
+        prefix = list()
+        for field in self.fields:
+            field_bounds = bounds.get(field)
+            if field_bounds is None or field_bounds.equals is _MISSING:
+                break
+            prefix.append(_key(field_bounds.equals))
+        prefix = tuple(prefix)
+        selectivity = len(prefix)
+
+        lower, upper = prefix, prefix + (_MAX_KEY,)
+        if len(prefix) < len(self.fields):
+            field_bounds = bounds.get(self.fields[len(prefix)])
+            if field_bounds is not None and (field_bounds.lower or field_bounds.upper):
+                selectivity += 1
+                if field_bounds.lower:
+                    lower = prefix + field_bounds.lower
+                if field_bounds.upper:
+                    upper = prefix + field_bounds.upper
+
+        serves_sort, reverse = True, False
+        if sort:
+            sort_fields = tuple(field for field, _ in sort)
+            directions = {direction for _, direction in sort}
+            serves_sort = len(directions) == 1 and self.fields[len(prefix):len(prefix) + len(sort)] == sort_fields
+            reverse = directions == {DESCENDING}
+        return selectivity, serves_sort, lower, upper, reverse
+
+    def scan(self, lower: tuple, upper: tuple, reverse: bool) -> Iterator[Any]:
+        """Iterate over the _id of the documents with keys between the given bounds"""
+        start, end = bisect.bisect_left(self.keys, lower), bisect.bisect_left(self.keys, upper)
+        positions = range(end - 1, start - 1, -1) if reverse else range(start, end)
+        for position in positions:
+            yield self.keys[position][-1][-1]
+
+
+class _TextIndex:
+    """Full-text index: the words of the indexed fields of each document (case and diacritic insensitive, without
+    stemming nor stop words, like Mongo with the "none" language), with the weights of the fields they appear on.
+    The score of a document is the sum of the weights of the searched words it contains; it ranks the documents
+    like Mongo does for short fields (as names and addresses), but the values are not the same"""
+    def __init__(self, name: str, weights: Dict[str, float]):
+        self.name = name
+        self.weights = weights
+        self.postings: Dict[str, Dict[Any, float]] = dict()  # word: {_id: weight}
+
+    def key(self, document: dict) -> Dict[str, float]:
+        words = dict()
+        for field, weight in self.weights.items():
+            value = _get(document, field)
+            if isinstance(value, str):
+                for word in _words(value):
+                    words[word] = words.get(word, 0) + weight
+        return words
+
+    def add(self, documents: List[dict]):
+        for document in documents:
+            for word, weight in self.key(document).items():
+                self.postings.setdefault(word, dict())[document["_id"]] = weight
+
+    def remove(self, document: dict):
+        for word in self.key(document):
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.pop(document["_id"], None)
+                if not postings:
+                    del self.postings[word]
+
+    def search(self, text: str) -> Dict[Any, float]:
+        """Return the score of the documents containing any of the words of the given text, by _id.
+        Phrases and negated words are not supported (searched as words)"""
+        scores = dict()
+        for word in set(_words(text)):
+            for identifier, weight in self.postings.get(word, dict()).items():
+                scores[identifier] = scores.get(identifier, 0) + weight
+        return scores
+
+
+class MemoryCollection(StorageCollection):
+    def __init__(self):
+        self._documents: Dict[Any, dict] = dict()
+        self._indexes: Dict[str, _SortedIndex] = dict()
+        self._text_index: Optional[_TextIndex] = None
+        self._ttl: Dict[str, float] = dict()
+        """Seconds after the date of each field with a TTL index when the documents expire"""
+        self._expired_at = 0.0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    # # Reads # #
+
+    def _find(self, query: Optional[dict], sort: Optional[Sort], limit: int) -> List[dict]:
+        """Find the documents matching the query, choosing the index that better serves the query (or scanning
+        the whole collection if none does). Must be called with the lock acquired"""
+        query = query or dict()
+        identifier = query.get("_id", _MISSING)
+        if identifier is not _MISSING:
+            if isinstance(identifier, dict) and set(identifier) == {"$in"}:
+                candidates = (self._documents.get(item) for item in dict.fromkeys(identifier["$in"]))
+            elif isinstance(identifier, dict) and set(identifier) == {"$eq"}:
+                candidates = (self._documents.get(identifier["$eq"]),)
+            elif not isinstance(identifier, dict):
+                candidates = (self._documents.get(identifier),)
+            else:
+                candidates = self._documents.values()
+            return self._collect((document for document in candidates if document), query, sort, limit, False)
+
+        bounds = _Bounds.from_query(query)
+        best, best_score = None, (0, False) if limit else (False, 0)
+        for index in self._indexes.values():
+            plan = index.plan(bounds, sort)
+            selectivity, serves_sort = plan[0], plan[1] and bool(sort)
+            score = (serves_sort, selectivity) if limit else (selectivity, serves_sort)
+            if (selectivity or serves_sort) and score > best_score:
+                best, best_score = (index, plan), score
+
+        if not best:
+            return self._collect(self._documents.values(), query, sort, limit, False)
+        index, (_, serves_sort, lower, upper, reverse) = best
+        candidates = (self._documents[identifier] for identifier in index.scan(lower, upper, reverse))
+        return self._collect(candidates, query, sort, limit, serves_sort)
+
+    @staticmethod
+    def _collect(candidates: Iterable[dict], query: dict, sort: Optional[Sort], limit: int, sorted_: bool):
+        """Filter the candidate documents, sorting them if they are not sorted, up to the limit (if any)"""
+        if sorted_ or not sort:
+            documents = list()
+            for document in candidates:
+                if _matches(document, query):
+                    documents.append(document)
+                    if len(documents) == limit:
+                        break
+            return documents
+
+        documents = _sorted([document for document in candidates if _matches(document, query)], sort)
+        return documents[:limit] if limit else documents
+
+    def find_one(self, filter: dict, projection: Optional[dict] = None, session: Any = None) -> Optional[dict]:
+        with self._lock:
+            documents = self._find(filter, None, 1)
+        return _project(documents[0], projection) if documents else None
+
+    def _find_text(self, query: dict, sort: Optional[Sort], limit: int) -> Tuple[List[dict], Dict[Any, float]]:
+        """Find the documents matching a query with a $text search, returning them with their text search scores.
+        Must be called with the lock acquired"""
+        if self._text_index is None:
+            raise OperationFailure("text index required for $text query", _INDEX_NOT_FOUND_ERROR)
+        scores = self._text_index.search(query["$text"]["$search"])
+        query = {field: condition for field, condition in query.items() if field != "$text"}
+        if limit and sort and len(sort) == 2 and isinstance(sort[0][1], dict) and tuple(sort[1]) == ("_id", ASCENDING):
+            # Ranking by relevance, with _id as tiebreaker (the ids of the collection are of the same type):
+            # only the top results are required (usually a small page), so there is no need to sort all of them
+            identifiers = (
+                identifier for identifier in scores if not query or _matches(self._documents[identifier], query)
+            )
+            identifiers = heapq.nsmallest(limit, identifiers, key=lambda identifier: (-scores[identifier], identifier))
+            return [self._documents[identifier] for identifier in identifiers], scores
+
+        documents = [self._documents[identifier] for identifier in scores]
+        documents = [document for document in documents if _matches(document, query)]
+        if sort:
+            _sorted(documents, sort, scores)
+        return (documents[:limit] if limit else documents), scores
+
+    def find(
+            self, filter: Optional[dict] = None, projection: Optional[dict] = None,
+            sort: Optional[Sort] = None, limit: int = 0, batch_size: int = 0, skip: int = 0, session: Any = None
+    ) -> Iterator[dict]:
+        """Find the documents matching the filter. Text searches ($text) can project and sort by their score
+        ({"$meta": "textScore"})"""
+        fetch_limit = limit + skip if limit else 0
+        with self._lock:
+            if filter and "$text" in filter:
+                documents, scores = self._find_text(filter, sort, fetch_limit)
+            else:
+                documents, scores = self._find(filter, sort, fetch_limit), None
+        documents = documents[skip:] if skip else documents
+
+        meta_fields = [field for field, value in (projection or dict()).items() if isinstance(value, dict)]
+        if not meta_fields:
+            return (_project(document, projection) for document in documents)
+
+        projection = {field: value for field, value in projection.items() if field not in meta_fields}
+        return (
+            {**_project(document, projection), **{field: scores[document["_id"]] for field in meta_fields}}
+            for document in documents
+        )
+
+    # # Writes # #
+
+    def _insert(self, document: dict) -> Any:
+        """Insert a document (without indexing it). Must be called with the lock acquired"""
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        identifier = document["_id"]
+        if identifier in self._documents:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error, dup key: {{ _id: {identifier!r} }}", _DUPLICATE_KEY_ERROR,
+                {"code": _DUPLICATE_KEY_ERROR, "keyValue": {"_id": identifier}}
+            )
+        self._documents[identifier] = _copy(document)
+        return identifier
+
+    def _all_indexes(self) -> List[Any]:
+        indexes = list(self._indexes.values())
+        if self._text_index is not None:
+            indexes.append(self._text_index)
+        return indexes
+
+    def _index(self, documents: List[dict]):
+        for index in self._all_indexes():
+            index.add(documents)
+
+    def _replace(self, document: dict, replacement: dict):
+        """Replace a stored document with an updated version. Must be called with the lock acquired"""
+        self._documents[document["_id"]] = replacement
+        for index in self._all_indexes():
+            if index.key(document) != index.key(replacement):
+                index.remove(document)
+                index.add([replacement])
+
+    def _delete(self, document: dict):
+        """Delete a stored document. Must be called with the lock acquired"""
+        del self._documents[document["_id"]]
+        for index in self._all_indexes():
+            index.remove(document)
+
+    def _expire(self):
+        """Delete the documents expired by the TTL indexes, if not checked during the last second. The TTL fields
+        must hold timezone-aware datetimes. Must be called with the lock acquired"""
+        if not self._ttl or monotonic() - self._expired_at < _EXPIRE_INTERVAL:
+            return
+        self._expired_at = monotonic()
+        now = datetime.now(timezone.utc)
+        for field, seconds in self._ttl.items():
+            for document in self._find({field: {"$lte": now - timedelta(seconds=seconds)}}, None, 0):
+                self._delete(document)
+
+    def _update(self, query: dict, update: dict) -> Tuple[Optional[dict], Optional[dict]]:
+        """Update the first document matching the query, returning it before and after the update (both None if no
+        document matched). Must be called with the lock acquired"""
+        documents = self._find(query, None, 1)
+        if not documents:
+            return None, None
+        document = documents[0]
+        updated = _apply_update(document, update)
+        if updated != document:
+            self._replace(document, updated)
+        return document, updated
+
+    def insert_one(self, document: dict, session: Any = None) -> InsertOneResult:
+        with self._lock:
+            self._expire()
+            identifier = self._insert(document)
+            self._index([self._documents[identifier]])
+        return InsertOneResult(identifier, True)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, session: Any = None) -> InsertManyResult:
+        return self._bulk_write([InsertOne(document) for document in documents], ordered, insert_many=True)
+
+    def update_one(self, filter: dict, update: dict, session: Any = None) -> UpdateResult:
+        with self._lock:
+            document, updated = self._update(filter, update)
+        return UpdateResult({"n": int(document is not None), "nModified": int(document != updated), "ok": 1.0}, True)
+
+    def find_one_and_update(
+            self, filter: dict, update: dict, projection: Optional[dict] = None,
+            return_document: bool = ReturnDocument.BEFORE, session: Any = None
+    ) -> Optional[dict]:
+        with self._lock:
+            document, updated = self._update(filter, update)
+        document = updated if return_document == ReturnDocument.AFTER else document
+        return _project(document, projection) if document is not None else None
+
+    def bulk_write(self, requests: Sequence[Any], ordered: bool = True, session: Any = None) -> BulkWriteResult:
+        return self._bulk_write(requests, ordered)
+
+    def _bulk_write(self, requests: Sequence[Any], ordered: bool, insert_many: bool = False):
+        result = {
+            "writeErrors": list(), "writeConcernErrors": list(), "upserted": list(),
+            "nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0
+        }
+        inserted = list()
+        with self._lock:
+            self._expire()
+            try:
+                for index, request in enumerate(requests):
+                    if isinstance(request, InsertOne):
+                        try:
+                            inserted.append(self._insert(request._doc))
+                            result["nInserted"] += 1
+                        except DuplicateKeyError as ex:
+                            result["writeErrors"].append(
+                                {"index": index, "code": ex.code, "errmsg": str(ex), "op": request._doc}
+                            )
+                            if ordered:
+                                break
+                    elif isinstance(request, UpdateOne):
+                        document, updated = self._update(request._filter, request._doc)
+                        result["nMatched"] += document is not None
+                        result["nModified"] += document != updated
+                    elif isinstance(request, DeleteOne):
+                        documents = self._find(request._filter, None, 1)
+                        if documents:
+                            self._delete(documents[0])
+                            result["nRemoved"] += 1
+                    else:
+                        raise ValueError(f"Write operation {type(request).__name__} is not supported")
+            finally:
+                self._index([self._documents[identifier] for identifier in inserted])
+
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        if insert_many:
+            return InsertManyResult(inserted, True)
+        return BulkWriteResult(result, True)
+
+    def delete_one(self, filter: dict, session: Any = None) -> DeleteResult:
+        with self._lock:
+            documents = self._find(filter, None, 1)
+            for document in documents:
+                self._delete(document)
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    def find_one_and_delete(
+            self, filter: dict, projection: Optional[dict] = None, session: Any = None
+    ) -> Optional[dict]:
+        with self._lock:
+            documents = self._find(filter, None, 1)
+            for document in documents:
+                self._delete(document)
+        return _project(documents[0], projection) if documents else None
+
+    def delete_many(self, filter: dict, session: Any = None) -> DeleteResult:
+        with self._lock:
+            documents = self._find(filter, None, 0)
+            for document in documents:
+                self._delete(document)
+        return DeleteResult({"n": len(documents), "ok": 1.0}, True)
+
+    def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        """Create the given indexes (if they do not exist). For sorted indexes, only the indexed fields are taken into
+        account: the direction of each field and the other options (like unique) are ignored, but the TTL
+        (expireAfterSeconds, on single field indexes). For the text index (only one per collection), the indexed fields
+        and their weights"""
+        names = list()
+        with self._lock:
+            for index_model in indexes:
+                document = index_model.document
+                names.append(document["name"])
+                text_fields = [field for field, kind in document["key"].items() if kind == TEXT]
+                if text_fields:
+                    if self._text_index is None:
+                        weights = document.get("weights", dict())
+                        self._text_index = _TextIndex(
+                            document["name"], {field: weights.get(field, 1) for field in text_fields}
+                        )
+                        self._text_index.add(list(self._documents.values()))
+                    continue
+
+                if "expireAfterSeconds" in document:
+                    self._ttl[next(iter(document["key"]))] = document["expireAfterSeconds"]
+                index = _SortedIndex(document["name"], list(document["key"]))
+                if index.name not in self._indexes:
+                    index.add(list(self._documents.values()))
+                    self._indexes[index.name] = index
+        return names
+
+    def with_options(self, read_preference: Any = None) -> "MemoryCollection":
+        """The memory engine has no replicas, so the read preference is ignored"""
+        return self
+
+
+async def _iterate(documents: Iterator[dict]) -> AsyncIterator[dict]:
+    for document in documents:
+        yield document
+
+
+class AsyncMemoryCollection(AsyncStorageCollection):
+    """Async interface of a MemoryCollection. The operations are performed in memory, without I/O,
+    so they are run directly on the event loop"""
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+
+    async def find_one(self, filter: dict, projection: Optional[dict] = None, session: Any = None) -> Optional[dict]:
+        return self.collection.find_one(filter, projection)
+
+    def find(
+            self, filter: Optional[dict] = None, projection: Optional[dict] = None,
+            sort: Optional[Sort] = None, limit: int = 0, batch_size: int = 0, skip: int = 0, session: Any = None
+    ) -> AsyncIterator[dict]:
+        return _iterate(self.collection.find(filter, projection, sort, limit, batch_size, skip))
+
+    async def insert_one(self, document: dict, session: Any = None) -> InsertOneResult:
+        return self.collection.insert_one(document)
+
+    async def insert_many(
+            self, documents: Iterable[dict], ordered: bool = True, session: Any = None
+    ) -> InsertManyResult:
+        return self.collection.insert_many(documents, ordered)
+
+    async def update_one(self, filter: dict, update: dict, session: Any = None) -> UpdateResult:
+        return self.collection.update_one(filter, update)
+
+    async def find_one_and_update(
+            self, filter: dict, update: dict, projection: Optional[dict] = None,
+            return_document: bool = ReturnDocument.BEFORE, session: Any = None
+    ) -> Optional[dict]:
+        return self.collection.find_one_and_update(filter, update, projection, return_document)
+
+    async def bulk_write(
+            self, requests: Sequence[Any], ordered: bool = True, session: Any = None
+    ) -> BulkWriteResult:
+        return self.collection.bulk_write(requests, ordered)
+
+    async def delete_one(self, filter: dict, session: Any = None) -> DeleteResult:
+        return self.collection.delete_one(filter)
+
+    async def find_one_and_delete(
+            self, filter: dict, projection: Optional[dict] = None, session: Any = None
+    ) -> Optional[dict]:
+        return self.collection.find_one_and_delete(filter, projection)
+
+    async def delete_many(self, filter: dict, session: Any = None) -> DeleteResult:
+        return self.collection.delete_many(filter)
+
+    async def create_indexes(self, indexes: List[IndexModel]) -> List[str]:
+        return self.collection.create_indexes(indexes)
+
+    def with_options(self, read_preference: Any = None) -> "AsyncMemoryCollection":
+        return self
@@ -3,11 +3,22 @@ Misc helpers/utils functions
 """
 
 # # Native # #
+import json
+import base64
+import hashlib
+import unicodedata
 from time import time
 from uuid import uuid4
-from typing import Union
+from datetime import date
+from typing import Union, Optional, List, Any
 
-__all__ = ("get_time", "get_uuid")
+# # Package # #
+from .age import age_calculator
+
+__all__ = (
+    "get_time", "get_uuid", "get_age", "encode_token", "decode_token", "get_etag", "get_revision_etag",
+    "get_encoded_etag", "etag_matches", "etag_revisions", "normalize_search", "get_search_fields"
+)
 
 
 def get_time(seconds_precision=True) -> Union[int, float]:
@@ -18,3 +29,83 @@ def get_time(seconds_precision=True) -> Union[int, float]:
 def get_uuid() -> str:
     """Returns an unique UUID (UUID4)"""
     return str(uuid4())
+
+
+def get_age(birth: date) -> int:
+    """Returns the current age (in years) of someone born on the given date"""
+    return age_calculator.age(birth)
+
+
+def encode_token(data: Any) -> str:
+    """Encode JSON-serializable data as an opaque, URL-safe token"""
+    encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode())
+    return encoded.decode().rstrip("=")
+
+
+def decode_token(token: str) -> Any:
+    """Decode a token encoded with encode_token. Raises ValueError if the token is not valid"""
+    try:
+        padding = "=" * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(token + padding))
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as ex:
+        raise ValueError("Invalid token") from ex
+
+
+def get_etag(*values: Any) -> str:
+    """Returns a strong ETag (quoted) generated from the given values"""
+    digest = hashlib.sha1("|".join(str(value) for value in values).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def get_revision_etag(revision: str, *values: Any) -> str:
+    """Returns a strong ETag (quoted) of a representation of a document: its revision, followed by a digest of the
+    revision and the given values. The revision can be read back from the ETag (see etag_revisions)"""
+    return f'"{revision}-{get_etag(revision, *values)[1:]}'
+
+
+def get_encoded_etag(etag: str, encoding: str) -> str:
+    """Returns the ETag of a representation encoded with the given content coding (like gzip). The encoded
+    representations differ byte by byte, so strong ETags get the encoding appended ("value+gzip"); weak ETags are kept.
+    The validators compare the ETags without the encoding (see etag_matches and etag_revisions)"""
+    if not etag.startswith('"'):
+        return etag
+    return f'{etag[:-1]}+{encoding}"'
+
+
+def _unencoded_etag(tag: str) -> str:
+    """Returns the ETag of the unencoded representation of an ETag (see get_encoded_etag)"""
+    if tag.startswith('"') and tag.endswith('"') and "+" in tag:
+        return tag[:tag.rindex("+")] + '"'
+    return tag
+
+
+def etag_revisions(if_match: str) -> Optional[List[str]]:
+    """Returns the revisions of the ETags (generated by get_revision_etag) on an If-Match header value, or None if it
+    matches any current representation ("*"). Weak ETags never match (strong comparison), nor other ETags"""
+    if if_match.strip() == "*":
+        return None
+    tags = (_unencoded_etag(tag.strip()) for tag in if_match.split(","))
+    return [
+        tag[1:-1].rpartition("-")[0] for tag in tags
+        if len(tag) > 2 and tag.startswith('"') and tag.endswith('"') and "-" in tag
+    ]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Returns True if the given If-None-Match header value matches the ETag (weak comparison)"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (_unencoded_etag(tag[2:] if tag.startswith("W/") else tag) for tag in tags)
+
+
+def normalize_search(text: str) -> str:
+    """Normalize a text for case and diacritic insensitive searches (lowercase, without accents)"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def get_search_fields(name: str, city: Optional[str]) -> dict:
+    """Returns the normalized values of a person stored for prefix searches (autocomplete) on its document,
+    under the "search" field"""
+    return {"name": normalize_search(name), "city": normalize_search(city or "")}
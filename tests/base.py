@@ -11,7 +11,7 @@ from wait4it import wait_for, get_free_port
 
 # # Project # #
 from people_api import run
-from people_api.database import collection
+from people_api.database import collection, tombstones_collection
 from people_api.settings import api_settings
 
 __all__ = ("BaseTest",)
@@ -37,18 +37,29 @@ class BaseTest:
 
     @classmethod
     def teardown_method(cls):
-        # Delete all documents from collection after each test
+        # Delete all documents from collections after each test
         collection.delete_many({})
+        tombstones_collection.delete_many({})
 
     # # API Methods # #
 
-    def get_person(self, person_id: str, statuscode: int = 200):
-        r = httpx.get(f"{self.api_url}/people/{person_id}")
+    def get_person(self, person_id: str, statuscode: int = 200, headers: dict = None, **params):
+        r = httpx.get(f"{self.api_url}/people/{person_id}", params=params, headers=headers)
         assert r.status_code == statuscode, r.text
         return r
 
-    def list_people(self, statuscode: int = 200):
-        r = httpx.get(f"{self.api_url}/people")
+    def list_people(self, statuscode: int = 200, headers: dict = None, **params):
+        r = httpx.get(f"{self.api_url}/people", params=params, headers=headers)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def get_changes(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people/changes", params=params)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def export_people(self, statuscode: int = 200, **params):
+        r = httpx.get(f"{self.api_url}/people/export", params=params)
         assert r.status_code == statuscode, r.text
         return r
 
@@ -57,8 +68,8 @@ class BaseTest:
         assert r.status_code == statuscode, r.text
         return r
 
-    def update_person(self, person_id: str, update: dict, statuscode: int = 204):
-        r = httpx.patch(f"{self.api_url}/people/{person_id}", json=update)
+    def update_person(self, person_id: str, update: dict, statuscode: int = 204, headers: dict = None):
+        r = httpx.patch(f"{self.api_url}/people/{person_id}", json=update, headers=headers)
         assert r.status_code == statuscode, r.text
         return r
 
@@ -66,3 +77,18 @@ class BaseTest:
         r = httpx.delete(f"{self.api_url}/people/{person_id}")
         assert r.status_code == statuscode, r.text
         return r
+
+    def create_people(self, creates: list, statuscode: int = 200):
+        r = httpx.post(f"{self.api_url}/people/bulk", json=creates)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def update_people(self, updates: list, statuscode: int = 200):
+        r = httpx.patch(f"{self.api_url}/people/bulk", json=updates)
+        assert r.status_code == statuscode, r.text
+        return r
+
+    def delete_people(self, person_ids: list, statuscode: int = 200):
+        r = httpx.request("DELETE", f"{self.api_url}/people/bulk", json=person_ids)
+        assert r.status_code == statuscode, r.text
+        return r
@@ -0,0 +1,214 @@
+"""TEST ADMISSION
+Test the admission control of the requests: limits of the requests processed at once, wait queue, rejections
+and adaptive limits
+"""
+
+# # Native # #
+import asyncio
+
+# # Installed # #
+import pytest
+
+# # Project # #
+from people_api.admission import *
+from people_api.exceptions import ServiceOverloadedException
+from people_api.settings import AdmissionSettings
+
+
+def _limiter(**kwargs) -> AdmissionLimiter:
+    options = dict(name="read", limit=2, queue_size=2, queue_timeout=1, retry_after=3)
+    options.update(kwargs)
+    return AdmissionLimiter(**options)
+
+
+class TestAdmissionLimiter:
+    def test_limit_and_queue(self):
+        """Acquire more slots than the limit, then release them.
+        Should queue the requests over the limit, and admit them in order as the slots are released"""
+        async def _test():
+            limiter = _limiter()
+            admitted = list()
+
+            async def request(i):
+                await limiter.acquire()
+                admitted.append(i)
+
+            await request(0)
+            await request(1)
+            waiting = [asyncio.ensure_future(request(i)) for i in (2, 3)]
+            await asyncio.sleep(0.01)
+            assert (admitted, limiter.in_flight, limiter.queued) == ([0, 1], 2, 2)
+
+            limiter.release()
+            await asyncio.sleep(0.01)
+            assert admitted == [0, 1, 2] and limiter.queued == 1
+            limiter.release()
+            await asyncio.gather(*waiting)
+            assert admitted == [0, 1, 2, 3] and limiter.in_flight == 2
+        asyncio.run(_test())
+
+    def test_queue_full(self):
+        """Acquire a slot with the limit reached and the queue full.
+        Should be rejected right away, with the Retry-After of the limiter"""
+        async def _test():
+            limiter = _limiter(limit=1, queue_size=0)
+            await limiter.acquire()
+            with pytest.raises(ServiceOverloadedException) as ex:
+                await limiter.acquire()
+            assert ex.value.response().headers["Retry-After"] == "3"
+            assert ex.value.response().status_code == 503
+        asyncio.run(_test())
+
+    def test_queue_timeout(self):
+        """Wait for a slot for longer than the queue timeout.
+        Should be rejected, leaving the queue"""
+        async def _test():
+            limiter = _limiter(limit=1, queue_timeout=0.01)
+            await limiter.acquire()
+            with pytest.raises(ServiceOverloadedException):
+                await limiter.acquire()
+            assert limiter.queued == 0 and limiter.in_flight == 1
+        asyncio.run(_test())
+
+    def test_cancelled_waiter(self):
+        """Cancel a request waiting for a slot.
+        Should leave the queue, and the released slot is given to the next request"""
+        async def _test():
+            limiter = _limiter(limit=1)
+            await limiter.acquire()
+            cancelled = asyncio.ensure_future(limiter.acquire())
+            waiting = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            assert limiter.queued == 1
+            limiter.release()
+            await waiting
+            assert limiter.in_flight == 1 and limiter.queued == 0
+        asyncio.run(_test())
+
+    def test_adaptive_decrease(self):
+        """Release slow requests completing together, with adaptive limits.
+        Should decrease the limit once, and not under the minimum"""
+        limiter = _limiter(limit=10, adaptive=True, latency_target=0.1, min_limit=8, backoff=0.5)
+        for _ in range(3):
+            limiter.in_flight += 1
+            limiter.release(latency=10)
+        assert limiter.limit == 8
+
+    def test_adaptive_increase(self):
+        """Release fast requests while the limit is in use, after decreasing it.
+        Should increase the limit by about one per round of requests, up to the configured limit"""
+        limiter = _limiter(limit=10, adaptive=True, latency_target=0.1, min_limit=1, backoff=0.5)
+        limiter.in_flight += 1
+        limiter.release(latency=1)
+        assert limiter.limit == 5
+
+        # Each fast request increases the limit by 1/limit
+        limiter.in_flight = 5
+        for _ in range(6):
+            limiter.in_flight += 1
+            limiter.release(latency=0.01)
+        assert limiter.limit == 6
+
+        for _ in range(100):
+            limiter.in_flight += 1
+            limiter.release(latency=0.01)
+        assert limiter.limit == 10
+
+
+class TestRouteClass:
+    @pytest.mark.parametrize("method, path, expected", [
+        ("GET", "/people", "read"),
+        ("GET", "/people/some-id", "read"),
+        ("POST", "/people/bulk", "write"),
+        ("DELETE", "/people/some-id", "write"),
+        ("GET", "/people/changes/stream", None),
+        ("GET", "/metrics", None),
+        ("GET", "/ready", None),
+    ])
+    def test_route_class(self, method, path, expected):
+        """Get the route class of requests.
+        Should classify the /people requests by method, and not limit the streams and internal endpoints"""
+        assert route_class(method, path) == expected
+
+
+def _controller() -> AdmissionController:
+    """Controller admitting a single read at once, rejecting the reads over it"""
+    return AdmissionController(AdmissionSettings(enabled=True, read_limit=1, read_queue_size=0, adaptive=False))
+
+
+def _request(app, method: str = "GET", path: str = "/people") -> asyncio.Future:
+    """Send a request to the given ASGI app, returning the future of the messages sent"""
+    messages = list()
+    scope = {"type": "http", "method": method, "path": path, "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def _run():
+        await app(scope, receive, send)
+        return messages
+    return asyncio.ensure_future(_run())
+
+
+class TestAdmissionMiddleware:
+    def test_streamed_response(self):
+        """Send a streamed response, while another request arrives.
+        Should hold the slot until the last message of the body is sent, rejecting the other request meanwhile"""
+        async def _test():
+            controller = _controller()
+            limiter = controller.limiters["read"]
+            sent_last = asyncio.Event()
+
+            async def app(scope, receive, send):
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b"first", "more_body": True})
+                await sent_last.wait()
+                await send({"type": "http.response.body", "body": b"last", "more_body": False})
+
+            middleware = AdmissionMiddleware(app, controller)
+            streamed = _request(middleware)
+            await asyncio.sleep(0.01)
+            assert limiter.in_flight == 1
+
+            rejected = await _request(middleware)
+            assert rejected[0]["status"] == 503
+            assert (b"retry-after", b"1") in rejected[0]["headers"]
+
+            sent_last.set()
+            assert [message.get("body") for message in await streamed] == [None, b"first", b"last"]
+            assert limiter.in_flight == 0
+        asyncio.run(_test())
+
+    def test_failed_request(self):
+        """Process a request that fails before sending its response.
+        Should release its slot"""
+        async def _test():
+            controller = _controller()
+
+            async def app(scope, receive, send):
+                raise ValueError()
+
+            with pytest.raises(ValueError):
+                await _request(AdmissionMiddleware(app, controller))
+            assert controller.limiters["read"].in_flight == 0
+        asyncio.run(_test())
+
+    def test_not_limited(self):
+        """Process a request of an internal endpoint, with the read limit in use.
+        Should process it"""
+        async def _test():
+            controller = _controller()
+            await controller.limiters["read"].acquire()
+
+            async def app(scope, receive, send):
+                await send({"type": "http.response.start", "status": 200, "headers": []})
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+            messages = await _request(AdmissionMiddleware(app, controller), path="/metrics")
+            assert messages[0]["status"] == 200
+        asyncio.run(_test())
@@ -0,0 +1,59 @@
+"""TEST AGE
+Test the AgeCalculator, comparing its results with dateutil's relativedelta
+"""
+
+# # Native # #
+from datetime import date, timedelta
+
+# # Installed # #
+from dateutil.relativedelta import relativedelta
+from freezegun import freeze_time
+
+# # Project # #
+from people_api.age import AgeCalculator
+
+
+class TestAgeCalculator:
+    @staticmethod
+    def _assert_ages(today: date, births: list):
+        with freeze_time(today.isoformat()):
+            calculator = AgeCalculator()
+            expected = [relativedelta(today, birth).years for birth in births]
+            assert [calculator.age(birth) for birth in births] == expected
+            assert calculator.ages(births) == expected
+
+    def test_match_relativedelta(self):
+        """Calculate the ages of the births of every day of the past 10 years and the next 4 years,
+        on different days (including leap days). Should match relativedelta"""
+        for today in (date(2020, 2, 28), date(2020, 2, 29), date(2021, 2, 28), date(2021, 3, 1), date(2023, 12, 31)):
+            births = [today - timedelta(days=days) for days in range(0, 365 * 10)]
+            births += [today + timedelta(days=days) for days in range(1, 365 * 4)]
+            self._assert_ages(today, births)
+
+    def test_leap_day_birthday(self):
+        """Calculate the age of someone born on Feb 29, on non-leap years.
+        Should have the birthday on Feb 28 (same as relativedelta)"""
+        birth = date(2000, 2, 29)
+        with freeze_time("2021-02-27"):
+            assert AgeCalculator().age(birth) == 20
+        with freeze_time("2021-02-28"):
+            assert AgeCalculator().age(birth) == 21
+        with freeze_time("2024-02-29"):
+            assert AgeCalculator().age(birth) == 24
+
+    def test_ages_missing_births(self):
+        """Calculate the ages of a batch with missing births. Should return None for them"""
+        with freeze_time("2021-06-15"):
+            assert AgeCalculator().ages([date(2000, 6, 15), None, date(2000, 6, 16)]) == [21, None, 20]
+
+    def test_day_change(self):
+        """Calculate an age on the day before a birthday, and again on the next day, with the same calculator.
+        Should refresh the cached current day"""
+        calculator = AgeCalculator()
+        birth = date(2000, 6, 15)
+        with freeze_time("2021-06-14 23:59:59"):
+            assert calculator.age(birth) == 20
+        with freeze_time("2021-06-15 00:00:00"):
+            assert calculator.age(birth) == 21
+        with freeze_time("2020-01-01"):
+            assert calculator.age(birth) == 19
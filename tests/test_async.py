@@ -0,0 +1,121 @@
+"""TEST ASYNC
+Test the AsyncPeopleRepository and the async request path, using an in-process Mongo stand-in (mongomock-motor)
+instead of a real Mongo database
+"""
+
+# # Native # #
+import json
+import asyncio
+import importlib
+
+# # Installed # #
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from fastapi import status as statuscode
+
+# # Project # #
+from people_api import repositories
+from people_api.exceptions import PersonNotFoundException
+from people_api.models import *
+from people_api.repositories import AsyncPeopleRepository
+
+# # Package # #
+from .utils import *
+
+app_module = importlib.import_module("people_api.app")
+
+
+class TestAsyncRepository:
+    original_collection = repositories.async_collection
+    original_tombstones_collection = repositories.async_tombstones_collection
+    original_repository = app_module.repository
+
+    @classmethod
+    def setup_method(cls):
+        # Each test uses new in-process collections (the deletes keep tombstones), and the API uses the async repository
+        client = AsyncMongoMockClient()
+        repositories.async_collection = client["test"]["people"]
+        repositories.async_tombstones_collection = client["test"]["tombstones"]
+        app_module.repository = AsyncPeopleRepository
+
+    @classmethod
+    def teardown_method(cls):
+        repositories.async_collection = cls.original_collection
+        repositories.async_tombstones_collection = cls.original_tombstones_collection
+        app_module.repository = cls.original_repository
+
+    @staticmethod
+    def run(coroutine):
+        return asyncio.run(coroutine)
+
+    @staticmethod
+    async def request(method: str, url: str, **kwargs) -> httpx.Response:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+
+    def test_create_get_person(self):
+        """Create a person with the async repository, then get it.
+        Should return the same person"""
+        async def _test():
+            created = await AsyncPeopleRepository.create(get_person_create())
+            read = await AsyncPeopleRepository.get(created.person_id)
+            assert read == created
+        self.run(_test())
+
+    def test_get_nonexisting_person(self):
+        """Get a person that does not exist.
+        Should raise PersonNotFoundException"""
+        with pytest.raises(PersonNotFoundException):
+            self.run(AsyncPeopleRepository.get(get_uuid()))
+
+    def test_update_delete_person(self):
+        """Update a person, then delete it.
+        Should update the name, and end raising PersonNotFoundException"""
+        async def _test():
+            created = await AsyncPeopleRepository.create(get_person_create())
+            new_name = get_uuid()
+            await AsyncPeopleRepository.update(created.person_id, PersonUpdate(name=new_name))
+            assert (await AsyncPeopleRepository.get(created.person_id)).name == new_name
+
+            await AsyncPeopleRepository.delete(created.person_id)
+            with pytest.raises(PersonNotFoundException):
+                await AsyncPeopleRepository.get(created.person_id)
+        self.run(_test())
+
+    def test_api_create_list_people(self):
+        """Create multiple persons through the API (async route handlers), then list them.
+        Should return all of them in array"""
+        async def _test():
+            created = list()
+            for _ in range(3):
+                response = await self.request("POST", "/people", json=get_person_create().dict())
+                assert response.status_code == statuscode.HTTP_201_CREATED, response.text
+                created.append(response.json())
+
+            created.sort(key=lambda p: (p["created"], p["person_id"]))
+
+            response = await self.request("GET", "/people")
+            assert response.status_code == statuscode.HTTP_200_OK, response.text
+            assert response.json() == {"people": created}
+        self.run(_test())
+
+    def test_api_get_nonexisting_person(self):
+        """Get a person that does not exist through the API.
+        Should return not found 404 error and the identifier"""
+        person_id = get_uuid()
+        response = self.run(self.request("GET", f"/people/{person_id}"))
+        assert response.status_code == statuscode.HTTP_404_NOT_FOUND, response.text
+        assert response.json()["identifier"] == person_id
+
+    def test_api_export_people(self):
+        """Create multiple persons, then export them through the API as NDJSON.
+        Should stream all of them, one per line"""
+        async def _test():
+            created = [(await AsyncPeopleRepository.create(get_person_create())).dict() for _ in range(3)]
+
+            response = await self.request("GET", "/people/export", params={"batch_size": 2})
+            assert response.status_code == statuscode.HTTP_200_OK, response.text
+            assert [json.loads(line) for line in response.text.splitlines()] == created
+        self.run(_test())
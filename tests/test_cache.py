@@ -0,0 +1,156 @@
+"""TEST CACHE
+Test the in-process LRU cache and the CachedRepository, using an in-process Mongo stand-in (mongomock-motor)
+"""
+
+# # Native # #
+import asyncio
+import importlib
+
+# # Installed # #
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# # Project # #
+from people_api import repositories
+from people_api.cache import LRUCache
+from people_api.changes import ChangeFeed
+from people_api.exceptions import PersonNotFoundException
+from people_api.models import *
+from people_api.repositories import AsyncPeopleRepository, CachedRepository
+from people_api.settings import ChangesSource
+
+# # Package # #
+from .utils import *
+
+app_module = importlib.import_module("people_api.app")
+
+
+class TestLRUCache:
+    def test_evict_least_recently_used(self):
+        """Fill the cache over its maximum size, after reading the first key.
+        Should evict the least recently used key"""
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set("a", 1, cache.version)
+        cache.set("b", 2, cache.version)
+        assert cache.get("a") == (True, 1)
+
+        cache.set("c", 3, cache.version)
+        assert cache.get("b") == (False, None)
+        assert cache.get("a") == (True, 1)
+        assert cache.get("c") == (True, 3)
+
+        stats = cache.stats()
+        assert (stats.entries, stats.hits, stats.misses, stats.evictions) == (2, 3, 1, 1)
+
+    def test_expire(self):
+        """Set a key with no TTL, then get it.
+        Should not be found, counting as expired"""
+        cache = LRUCache(max_entries=10, ttl=60)
+        cache.set("a", 1, cache.version, ttl=0)
+
+        assert cache.get("a") == (False, None)
+        assert cache.stats().expirations == 1
+
+    def test_invalidate_while_fetching(self):
+        """Read the version, invalidate a key, then set a value with the version read before.
+        Should not store the (potentially stale) value"""
+        cache = LRUCache(max_entries=10, ttl=60)
+        version = cache.version
+        cache.invalidate("a")
+        cache.set("a", 1, version)
+
+        assert cache.get("a") == (False, None)
+
+
+class TestCachedRepository:
+    original_collection = repositories.async_collection
+    original_tombstones_collection = repositories.async_tombstones_collection
+
+    def setup_method(self):
+        client = AsyncMongoMockClient()
+        repositories.async_collection = client["test"]["people"]
+        repositories.async_tombstones_collection = client["test"]["tombstones"]
+        self.repository = CachedRepository(
+            AsyncPeopleRepository,
+            cache=LRUCache(max_entries=10, ttl=60),
+            not_found_ttl=60
+        )
+
+    @classmethod
+    def teardown_method(cls):
+        repositories.async_collection = cls.original_collection
+        repositories.async_tombstones_collection = cls.original_tombstones_collection
+
+    @staticmethod
+    def run(coroutine):
+        return asyncio.run(coroutine)
+
+    def test_get_cached(self):
+        """Get a person twice, after modifying it directly on the database.
+        Should return the cached person the second time"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            assert await self.repository.get(person.person_id) == person
+
+            await repositories.async_collection.update_one({"_id": person.person_id}, {"$set": {"name": "foo"}})
+            assert await self.repository.get(person.person_id) == person
+            assert self.repository.cache.stats().hits == 1
+        self.run(_test())
+
+    def test_update_invalidates(self):
+        """Get a person, update it through the repository, and get it again.
+        Should return the updated person"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            await self.repository.get(person.person_id)
+
+            new_name = get_uuid()
+            await self.repository.update(person.person_id, PersonUpdate(name=new_name))
+            assert (await self.repository.get(person.person_id)).name == new_name
+        self.run(_test())
+
+    def test_not_found_cached(self):
+        """Get a person that does not exist twice, then delete it.
+        Should raise PersonNotFoundException, the second time from the cache"""
+        async def _test():
+            person_id = get_uuid()
+            for _ in range(2):
+                with pytest.raises(PersonNotFoundException):
+                    await self.repository.get(person_id)
+            assert self.repository.cache.stats().hits == 1
+
+            with pytest.raises(PersonNotFoundException):
+                await self.repository.delete(person_id)
+            assert self.repository.cache.stats().entries == 0
+        self.run(_test())
+
+
+class TestMultipleWorkers:
+    @pytest.fixture(autouse=True)
+    def _app(self, monkeypatch):
+        # The API runs on two workers, with the cache enabled
+        self.feed = ChangeFeed(history_size=10, queue_size=10)
+        self.repository = CachedRepository(
+            AsyncPeopleRepository, cache=LRUCache(max_entries=10, ttl=60), not_found_ttl=60
+        )
+        monkeypatch.setattr(app_module.settings, "workers", 2)
+        monkeypatch.setattr(app_module.changes_settings, "enabled", True)
+        monkeypatch.setattr(app_module, "change_feed", self.feed)
+        monkeypatch.setattr(app_module, "repository", self.repository)
+
+    def test_invalidated_by_change_stream(self):
+        """Start the API reading the change feed from the change stream, then publish a change of a cached person.
+        Should keep the cache, invalidating the person"""
+        self.feed.source = ChangesSource.change_stream
+        app_module._bind_cache()
+        assert app_module.repository is self.repository
+
+        self.repository.cache.set("foo", None, self.repository.cache.version)
+        self.feed.publish(ChangeOperation.delete, "foo")
+        assert self.repository.cache.get("foo") == (False, None)
+
+    def test_disabled_without_change_stream(self):
+        """Start the API publishing the change feed from the writes of the repositories (not seeing other workers).
+        Should disable the cache"""
+        app_module._bind_cache()
+        assert app_module.repository is AsyncPeopleRepository
@@ -0,0 +1,321 @@
+"""TEST CHANGES
+Test the change feed: the in-process event bus (resume tokens, bounded subscriber queues), the translation of Mongo
+change stream events, and the Server-Sent Events endpoint
+"""
+
+# # Native # #
+import json
+import time
+import asyncio
+
+# # Installed # #
+import httpx
+import pytest
+from pymongo.errors import OperationFailure
+
+# # Project # #
+from people_api import changes
+from people_api.changes import *
+from people_api.models import ChangeOperation
+from people_api.exceptions import InvalidResumeTokenException, ResumeTokenExpiredException
+from people_api.settings import changes_settings, ChangesSource
+from people_api.utils import encode_token
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+def _consume(subscription: Subscription, count: int) -> list:
+    async def _get():
+        return [await subscription.get(timeout=1) for _ in range(count)]
+    return asyncio.run(_get())
+
+
+def _delete_change(person_id: str) -> dict:
+    """Change of the Mongo change stream of a deleted person (its resume token depends on the person_id)"""
+    return {"_id": {"_data": person_id}, "operationType": "delete", "documentKey": {"_id": person_id}}
+
+
+class _ChangeStream:
+    """Stand-in of a Mongo change stream, returning the given changes"""
+    def __init__(self, changes: list):
+        self._changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def try_next(self):
+        if not self._changes:
+            return None
+        change = self._changes.pop(0)
+        self.resume_token = change["_id"]
+        return change
+
+
+class _ChangeStreamCollection:
+    """Stand-in of a collection, whose change streams return the given changes (or raise the given exceptions),
+    one per opened stream. Records the resume token given when opening each stream"""
+    def __init__(self, *streams):
+        self._streams = list(streams)
+        self.resumed_after = list()
+
+    def watch(self, resume_after=None, **kwargs):
+        self.resumed_after.append(resume_after)
+        stream = self._streams.pop(0) if self._streams else list()
+        if isinstance(stream, Exception):
+            raise stream
+        return _ChangeStream(stream)
+
+
+class TestChangeFeed:
+    def test_publish(self):
+        """Subscribe to a feed, and publish events.
+        Should receive the events published after subscribing, in order"""
+        feed = ChangeFeed(history_size=10, queue_size=10)
+        feed.publish(ChangeOperation.delete, "before")
+        subscription = feed.subscribe()
+        feed.publish(ChangeOperation.delete, "first")
+        feed.publish(ChangeOperation.delete, "second")
+        assert [event.person_id for event in _consume(subscription, 2)] == ["first", "second"]
+
+    def test_resume(self):
+        """Subscribe resuming after a published event.
+        Should receive the events published after it first"""
+        feed = ChangeFeed(history_size=10, queue_size=10)
+        first = feed.publish(ChangeOperation.delete, "first")
+        feed.publish(ChangeOperation.delete, "second")
+        subscription = feed.subscribe(first.event_id)
+        feed.publish(ChangeOperation.delete, "third")
+        assert [event.person_id for event in _consume(subscription, 2)] == ["second", "third"]
+
+        last = feed.publish(ChangeOperation.delete, "last")
+        assert _consume(feed.subscribe(last.event_id), 0) == []
+
+    def test_resume_expired(self):
+        """Subscribe resuming after an event no longer kept, or published by another feed.
+        Should raise ResumeTokenExpiredException"""
+        feed = ChangeFeed(history_size=2, queue_size=10)
+        first = feed.publish(ChangeOperation.delete, "first")
+        feed.publish(ChangeOperation.delete, "second")
+        feed.publish(ChangeOperation.delete, "third")
+        feed.subscribe(first.event_id)
+        feed.publish(ChangeOperation.delete, "fourth")
+
+        with pytest.raises(ResumeTokenExpiredException):
+            feed.subscribe(first.event_id)
+        with pytest.raises(ResumeTokenExpiredException):
+            ChangeFeed(history_size=2, queue_size=10).subscribe(first.event_id)
+
+    @pytest.mark.parametrize("token", ["invalid", encode_token(["feed"]), "future"])
+    def test_resume_invalid(self, token):
+        """Subscribe resuming after an invalid token, or an event not published yet.
+        Should raise InvalidResumeTokenException"""
+        feed = ChangeFeed(history_size=2, queue_size=10)
+        if token == "future":
+            token = encode_token([feed.feed_id, 1])
+        with pytest.raises(InvalidResumeTokenException):
+            feed.subscribe(token)
+
+    def test_lagged(self):
+        """Publish more events than the queue size of a subscriber.
+        Should receive the queued events, then be lagged (and no longer subscribed)"""
+        feed = ChangeFeed(history_size=10, queue_size=2)
+        subscription = feed.subscribe()
+        for person_id in ("first", "second", "third"):
+            feed.publish(ChangeOperation.delete, person_id)
+        assert subscription.lagged and feed.subscribers == 0
+        assert [event.person_id for event in _consume(subscription, 2)] == ["first", "second"]
+        with pytest.raises(SubscriptionLagged):
+            _consume(subscription, 1)
+
+    def test_heartbeat(self):
+        """Wait for an event when none is published.
+        Should return None after the timeout"""
+        subscription = ChangeFeed(history_size=2, queue_size=2).subscribe()
+        assert asyncio.run(subscription.get(timeout=0.01)) is None
+
+
+class TestChangeStreamEvents:
+    def test_insert(self):
+        """Translate an insert change.
+        Should return a create event with the inserted person"""
+        document = {"_id": get_uuid(), **get_person_create().dict(), "created": 1, "updated": 1, "search": {}}
+        operation, person_id, person = change_stream_event({
+            "operationType": "insert", "documentKey": {"_id": document["_id"]}, "fullDocument": document
+        })
+        assert operation == ChangeOperation.create and person_id == document["_id"]
+        assert person.person_id == document["_id"] and person.name == document["name"]
+
+    def test_update(self):
+        """Translate an update change of person fields, and one of internal fields only.
+        Should return an update event with the updated person fields, and ignore the other one"""
+        person_id = get_uuid()
+        operation, event_person_id, person, update = change_stream_event({
+            "operationType": "update", "documentKey": {"_id": person_id},
+            "updateDescription": {"updatedFields": {"name": "Foo", "birth": "1990-01-31", "search.name": "foo"}}
+        })
+        assert (operation, event_person_id, person) == (ChangeOperation.update, person_id, None)
+        assert update.dict() == {"name": "Foo", "birth": "1990-01-31"}
+
+        assert change_stream_event({
+            "operationType": "update", "documentKey": {"_id": person_id},
+            "updateDescription": {"updatedFields": {"search": {"name": "foo", "city": "bar"}}}
+        }) is None
+
+    def test_delete(self):
+        """Translate a delete change.
+        Should return a delete event"""
+        person_id = get_uuid()
+        assert change_stream_event({"operationType": "delete", "documentKey": {"_id": person_id}}) == \
+            (ChangeOperation.delete, person_id)
+
+    @pytest.mark.parametrize("operation", ["drop", "rename", "dropDatabase", "invalidate"])
+    def test_collection_change(self, operation):
+        """Translate a change of the collection (without documentKey).
+        Should be ignored"""
+        assert change_stream_event({"operationType": operation, "ns": {"db": "test", "coll": "people"}}) is None
+
+
+class _RecordingFeed:
+    def __init__(self):
+        self.published = list()
+
+    def publish_threadsafe(self, *args, **kwargs):
+        self.published.append((args, kwargs))
+
+
+class TestChangeStreamWatcher:
+    def test_unexpected_error(self):
+        """Watch a change stream that fails with an unexpected error when opened, then returns a change.
+        Should reopen the stream, publishing the change with its resume token as event id"""
+        feed = _RecordingFeed()
+        collection = _ChangeStreamCollection(RuntimeError("unexpected"), [_delete_change("foo")])
+        watcher = ChangeStreamWatcher(feed, collection, retry_seconds=0.01)
+        watcher.start()
+        try:
+            for _ in range(100):
+                if feed.published:
+                    break
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+
+        assert feed.published[0] == (
+            (ChangeOperation.delete, "foo"), {"event_id": change_event_id(_delete_change("foo"))}
+        )
+        assert collection.resumed_after[:2] == [None, None]
+
+
+class TestChangeStreamResume:
+    @pytest.fixture(autouse=True)
+    def _feed(self, monkeypatch):
+        self.feed = ChangeFeed(history_size=10, queue_size=10)
+        self.feed.source = ChangesSource.change_stream
+        monkeypatch.setattr(changes, "change_feed", self.feed)
+
+    def test_resume_from_change_stream(self):
+        """Subscribe resuming after an event read by another process, with one of the events after it published
+        meanwhile on this process.
+        Should resume the change stream after the event, receiving each event after it once, in order"""
+        first, second, third = (_delete_change(person_id) for person_id in ("first", "second", "third"))
+        collection = _ChangeStreamCollection([second, third])
+
+        async def _test():
+            subscription = await subscribe_change_feed(change_event_id(first), collection)
+            self.feed.publish(ChangeOperation.delete, "third", event_id=change_event_id(third))
+            self.feed.publish(ChangeOperation.delete, "fourth", event_id=change_event_id(_delete_change("fourth")))
+            events = [await subscription.get(timeout=1) for _ in range(3)]
+            assert await subscription.get(timeout=0.01) is None
+            return events
+
+        events = asyncio.run(_test())
+        assert [event.person_id for event in events] == ["second", "third", "fourth"]
+        assert events[0].event_id == change_event_id(second)
+        assert collection.resumed_after == [first["_id"]]
+
+    def test_resume_from_history(self):
+        """Subscribe resuming after an event read by this process.
+        Should receive the events after it from the feed, without reading the change stream"""
+        first, second = (_delete_change(person_id) for person_id in ("first", "second"))
+        for change in (first, second):
+            self.feed.publish(*change_stream_event(change), event_id=change_event_id(change))
+        collection = _ChangeStreamCollection()
+
+        subscription = asyncio.run(subscribe_change_feed(change_event_id(first), collection))
+        assert [event.person_id for event in _consume(subscription, 1)] == ["second"]
+        assert collection.resumed_after == []
+
+    @pytest.mark.parametrize("code, exception", [
+        (286, ResumeTokenExpiredException), (260, InvalidResumeTokenException)
+    ])
+    def test_resume_failed(self, code, exception):
+        """Subscribe resuming after an event no longer on the oplog, or an invalid resume token.
+        Should raise the corresponding exception, without keeping the subscription"""
+        collection = _ChangeStreamCollection(OperationFailure("failed", code=code))
+        with pytest.raises(exception):
+            asyncio.run(subscribe_change_feed(change_event_id(_delete_change("first")), collection))
+        assert self.feed.subscribers == 0
+
+    def test_resume_repository_source(self):
+        """Subscribe resuming after an event read from the change stream, on a feed of the repository writes.
+        Should raise ResumeTokenExpiredException"""
+        self.feed.source = ChangesSource.repository
+        with pytest.raises(ResumeTokenExpiredException):
+            asyncio.run(subscribe_change_feed(change_event_id(_delete_change("first")), _ChangeStreamCollection()))
+
+
+@pytest.mark.skipif(not changes_settings.enabled, reason="change feed disabled")
+class TestChangesStream(BaseTest):
+    @staticmethod
+    def _read_events(response: httpx.Response, count: int) -> list:
+        """Read the given number of events from a Server-Sent Events response, as (id, event, data)"""
+        events = list()
+        fields = dict()
+        for line in response.iter_lines():
+            if line.startswith(":"):
+                continue
+            if line:
+                name, value = line.split(": ", 1)
+                fields[name] = value
+                continue
+            if not fields:
+                # End of a comment (like the heartbeats)
+                continue
+            events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+            fields = dict()
+            if len(events) == count:
+                return events
+
+    def test_stream(self):
+        """Subscribe to the stream, then create, update and delete a person.
+        Should stream the events, with the created person and the updated fields"""
+        with httpx.stream("GET", f"{self.api_url}/people/changes/stream", timeout=5) as response:
+            assert response.status_code == 200
+            assert response.headers["Content-Type"].startswith("text/event-stream")
+            person_id = self.create_person(get_person_create().dict()).json()["person_id"]
+            self.update_person(person_id, {"name": "Foo"})
+            self.delete_person(person_id)
+            events = self._read_events(response, 3)
+
+        assert [event for _, event, _ in events] == ["create", "update", "delete"]
+        created, updated, deleted = (data for _, _, data in events)
+        assert created["person"]["person_id"] == person_id
+        assert updated["update"] == {"name": "Foo"}
+        assert deleted["person_id"] == person_id and "person" not in deleted and "update" not in deleted
+        assert [event_id for event_id, _, _ in events] == [data["event_id"] for _, _, data in events]
+
+        # Resume after the first event
+        headers = {"Last-Event-ID": events[0][0]}
+        with httpx.stream("GET", f"{self.api_url}/people/changes/stream", headers=headers, timeout=5) as response:
+            assert [event for _, event, _ in self._read_events(response, 2)] == ["update", "delete"]
+
+    def test_resume_expired(self):
+        """Subscribe resuming after an event of another feed.
+        Should return 410"""
+        r = httpx.get(f"{self.api_url}/people/changes/stream", params={"since": encode_token([get_uuid(), 1])})
+        assert r.status_code == 410, r.text
@@ -0,0 +1,103 @@
+"""TEST CLI
+Test the import and export commands, on the in-memory storage engine and an in-process Mongo stand-in (mongomock)
+"""
+
+# # Native # #
+import io
+import csv
+import json
+
+# # Installed # #
+import pytest
+import mongomock
+
+# # Project # #
+from people_api import repositories
+from people_api.cli import import_people, export_people
+from people_api.models import *
+from people_api.models.indexes import PEOPLE_INDEXES
+from people_api.storage import MemoryCollection
+
+# # Package # #
+from .utils import *
+
+
+def _lines(*items) -> list:
+    """Encode the given items as lines of a NDJSON file (strings are written as they are)"""
+    return [(item if isinstance(item, str) else json.dumps(item)).encode() + b"\n" for item in items]
+
+
+def _import(lines: list, **kwargs):
+    """Import the given lines, returning the stats and the errors"""
+    errors = list()
+    stats = import_people(lines, on_error=lambda number, message: errors.append((number, message)), **kwargs)
+    return stats, errors
+
+
+class TestImportExport:
+    @pytest.fixture(autouse=True, params=["memory", "mongomock"])
+    def _collection(self, request, monkeypatch):
+        if request.param == "memory":
+            self.collection = MemoryCollection()
+        else:
+            self.collection = mongomock.MongoClient()["test"]["people"]
+        self.collection.create_indexes(PEOPLE_INDEXES)
+        monkeypatch.setattr(repositories, "collection", self.collection)
+
+    def test_import(self):
+        """Import persons in small batches on multiple workers.
+        Should create all of them, reporting the progress after each batch"""
+        creates = [get_person_create() for _ in range(25)]
+        progress = list()
+        stats, errors = _import(
+            _lines(*(create.dict() for create in creates)), batch_size=4, workers=3,
+            on_progress=lambda current: progress.append(current.imported)
+        )
+        assert (stats.imported, stats.failed, errors) == (25, 0, [])
+        assert len(progress) == 7 and progress[-1] == 25
+        assert sorted(document["name"] for document in self.collection.find()) == sorted(c.name for c in creates)
+
+    def test_import_errors(self):
+        """Import a file with invalid JSON, invalid persons, blank lines and a person that already exists.
+        Should import the valid persons, reporting the errors of the others by line number"""
+        person_id = get_uuid()
+        lines = _lines(
+            get_person_create().dict(),
+            "{not json",
+            {"name": "Foo"},
+            "",
+            {**get_person_create().dict(), "person_id": person_id},
+            {**get_person_create().dict(), "person_id": person_id},
+            [1, 2]
+        )
+        stats, errors = _import(lines, batch_size=10, workers=1)
+        assert (stats.imported, stats.failed) == (2, 4)
+        assert [number for number, _ in errors] == [2, 3, 6, 7]
+        assert "address: field required" in errors[1][1]
+        assert errors[2][1] == "The person already exists"
+
+    def test_export_import_ndjson(self):
+        """Create persons, export them as NDJSON, and import the export on another collection.
+        Should export all the persons, and import them keeping their ids"""
+        person_ids = {repositories.PeopleRepository.create(get_person_create()).person_id for _ in range(5)}
+        output = io.BytesIO()
+        assert export_people(output, batch_size=2) == 5
+        lines = output.getvalue().splitlines(keepends=True)
+        assert {json.loads(line)["person_id"] for line in lines} == person_ids
+
+        repositories.collection = MemoryCollection()
+        stats, errors = _import(lines)
+        assert (stats.imported, errors) == (5, [])
+        assert {document["_id"] for document in repositories.collection.find()} == person_ids
+
+    def test_export_csv(self):
+        """Create a person, and export the persons as CSV, with some fields.
+        Should write the header and a row per person, with the address flattened"""
+        person = repositories.PeopleRepository.create(get_person_create())
+        output = io.BytesIO()
+        export_people(output, format="csv", fields={PersonField.name, PersonField.address})
+        rows = list(csv.DictReader(io.StringIO(output.getvalue().decode())))
+        assert rows == [{
+            "name": person.name, "address.street": person.address.street, "address.city": person.address.city,
+            "address.state": person.address.state, "address.zip_code": person.address.zip_code
+        }]
@@ -0,0 +1,145 @@
+"""TEST COALESCING
+Test the CoalescingRepository (single-flight of concurrent identical reads), using an in-process Mongo stand-in
+(mongomock-motor), with reads slowed down so they overlap
+"""
+
+# # Native # #
+import asyncio
+from collections import Counter
+
+# # Installed # #
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# # Project # #
+from people_api import repositories
+from people_api.exceptions import PersonNotFoundException
+from people_api.metrics import coalescing_reads
+from people_api.models import *
+from people_api.repositories import AsyncPeopleRepository, CoalescingRepository
+from people_api.settings import metrics_settings
+
+# # Package # #
+from .utils import *
+
+
+class _SlowRepository:
+    """Wrap the AsyncPeopleRepository, delaying the reads and counting the calls of each method"""
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        method = getattr(AsyncPeopleRepository, name)
+
+        async def _slow_method(*args, **kwargs):
+            self.calls[name] += 1
+            if name in ("get", "list"):
+                await asyncio.sleep(self.delay)
+            return await method(*args, **kwargs)
+        return _slow_method
+
+
+class TestCoalescingRepository:
+    original_collection = repositories.async_collection
+
+    def setup_method(self):
+        repositories.async_collection = AsyncMongoMockClient()["test"]["people"]
+        self.slow_repository = _SlowRepository()
+        self.repository = CoalescingRepository(self.slow_repository)
+
+    @classmethod
+    def teardown_method(cls):
+        repositories.async_collection = cls.original_collection
+
+    @staticmethod
+    def run(coroutine):
+        return asyncio.run(coroutine)
+
+    def test_get_coalesced(self):
+        """Get the same person concurrently many times.
+        Should read it once, returning the same result to all the callers"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            results = await asyncio.gather(*(self.repository.get(person.person_id) for _ in range(10)))
+            assert all(result is results[0] for result in results)
+            assert results[0] == person
+            assert self.slow_repository.calls["get"] == 1
+            assert not self.repository._gets
+        self.run(_test())
+
+    def test_different_arguments(self):
+        """Get a person concurrently with and without fields, and list persons with two page sizes.
+        Should not coalesce reads with different arguments"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            await asyncio.gather(
+                self.repository.get(person.person_id),
+                self.repository.get(person.person_id, fields={PersonField.name}),
+                self.repository.list(limit=1),
+                self.repository.list(limit=2),
+                self.repository.list(limit=2),
+            )
+            assert self.slow_repository.calls["get"] == 2
+            assert self.slow_repository.calls["list"] == 2
+        self.run(_test())
+
+    def test_not_found_shared(self):
+        """Get a person that does not exist concurrently.
+        Should read it once, raising PersonNotFoundException to all the callers"""
+        async def _test():
+            person_id = get_uuid()
+            results = await asyncio.gather(
+                *(self.repository.get(person_id) for _ in range(5)), return_exceptions=True
+            )
+            assert all(isinstance(result, PersonNotFoundException) for result in results)
+            assert self.slow_repository.calls["get"] == 1
+        self.run(_test())
+
+    def test_not_kept(self):
+        """Get the same person twice, one after the other.
+        Should read it twice"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            for _ in range(2):
+                await self.repository.get(person.person_id)
+            assert self.slow_repository.calls["get"] == 2
+        self.run(_test())
+
+    def test_write_detaches(self):
+        """Get a person, update it while the read is in flight, then get it again before the first read completes.
+        Should read it again, returning the updated person to the second read"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            first = asyncio.ensure_future(self.repository.get(person.person_id))
+            await asyncio.sleep(0)
+            await self.repository.update(person.person_id, PersonUpdate(name="Foo"))
+            second = await self.repository.get(person.person_id)
+            await first
+            assert second.name == "Foo"
+            assert self.slow_repository.calls["get"] == 2
+        self.run(_test())
+
+    def test_caller_cancelled(self):
+        """Get the same person concurrently twice, cancelling the first caller.
+        Should complete the read for the second caller"""
+        async def _test():
+            person = await self.repository.create(get_person_create())
+            first = asyncio.ensure_future(self.repository.get(person.person_id))
+            second = asyncio.ensure_future(self.repository.get(person.person_id))
+            await asyncio.sleep(0)
+            first.cancel()
+            assert (await second) == person
+            assert first.cancelled()
+        self.run(_test())
+
+    @pytest.mark.skipif(not metrics_settings.enabled, reason="metrics disabled")
+    def test_metrics(self):
+        """List persons concurrently three times.
+        Should count one executed read, and two coalesced ones"""
+        async def _test():
+            executed, coalesced = coalescing_reads.get("list", "executed"), coalescing_reads.get("list", "coalesced")
+            await asyncio.gather(*(self.repository.list() for _ in range(3)))
+            assert coalescing_reads.get("list", "executed") == executed + 1
+            assert coalescing_reads.get("list", "coalesced") == coalesced + 2
+        self.run(_test())
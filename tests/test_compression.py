@@ -0,0 +1,192 @@
+"""TEST COMPRESSION
+Test the negotiation of the response encoding, and the compression of complete and streamed responses
+"""
+
+# # Native # #
+import zlib
+import asyncio
+
+# # Installed # #
+import httpx
+import pytest
+
+# # Project # #
+from people_api.compression import *
+from people_api.metrics import compressed_responses, compression_input_bytes
+from people_api.settings import CompressionSettings, compression_settings, metrics_settings
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class TestNegotiation:
+    @pytest.mark.parametrize("accept_encoding, expected", [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("br;q=0, gzip", "gzip"),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("identity", None),
+        ("gzip;q=0", None),
+        ("", None),
+    ])
+    def test_negotiate(self, accept_encoding, expected):
+        """Choose the encoding from the Accept-Encoding header.
+        Should choose the one with the highest quality, or the preferred one on ties"""
+        assert negotiate_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+    def test_unavailable_encodings(self):
+        """Get the encodings available from the settings.
+        Should ignore the unknown ones, keeping the preference order"""
+        settings = CompressionSettings(encodings="zstd, gzip")
+        assert available_encodings(settings) == ["gzip"]
+
+
+def _run_app(app, accept_encoding: str, settings: CompressionSettings) -> list:
+    """Send a request to the given ASGI app wrapped by the CompressionMiddleware, returning the messages sent"""
+    messages = list()
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(CompressionMiddleware(app, settings)(scope, receive, send))
+    return messages
+
+
+def _streaming_app(chunks: list, content_type: bytes):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return app
+
+
+def _complete_app(body: bytes, headers: list):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+    return app
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.parametrize("etag, expected", [('"abc"', b'"abc+gzip"'), ('W/"abc"', b'W/"abc"')])
+    def test_etag(self, etag, expected):
+        """Compress a response with a strong ETag, and one with a weak ETag.
+        Should append the encoding to the strong ETag, keeping the weak one, and vary by Accept-Encoding"""
+        app = _complete_app(b"x" * 100, [(b"content-type", b"application/json"), (b"etag", etag.encode())])
+        messages = _run_app(app, "gzip", CompressionSettings(enabled=True, encodings="gzip", min_size=10))
+        headers = dict(messages[0]["headers"])
+        assert headers[b"etag"] == expected and headers[b"content-encoding"] == b"gzip"
+        assert b"Accept-Encoding" in headers[b"vary"]
+
+    def test_streamed_chunks(self):
+        """Stream an event stream response, compressed with gzip.
+        Should send each chunk compressed and flushed as it is sent, decompressing to the original chunks"""
+        chunks = [b"data: %d\n\n" % i for i in range(5)]
+        messages = _run_app(
+            _streaming_app(chunks, b"text/event-stream"), "gzip", CompressionSettings(enabled=True, encodings="gzip")
+        )
+        start, bodies = messages[0], messages[1:]
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert [decompressor.decompress(message["body"]) for message in bodies[:len(chunks)]] == chunks
+        assert bodies[-1]["more_body"] is False
+
+    def test_streamed_without_flush(self):
+        """Stream a NDJSON response, compressed with gzip.
+        Should decompress to the whole body, sending less messages than chunks"""
+        chunks = [b'{"name": "Person %d"}\n' % i for i in range(1000)]
+        messages = _run_app(
+            _streaming_app(chunks, b"application/x-ndjson"), "gzip", CompressionSettings(enabled=True, encodings="gzip")
+        )
+        body = b"".join(message["body"] for message in messages[1:])
+        assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == b"".join(chunks)
+        assert len(messages) - 1 < len(chunks)
+
+    @pytest.mark.skipif(not metrics_settings.enabled, reason="metrics disabled")
+    def test_metrics(self):
+        """Compress a response.
+        Should count the compressed response and its bytes by encoding"""
+        responses, input_bytes = compressed_responses.get("gzip"), compression_input_bytes.get("gzip")
+        settings = CompressionSettings(enabled=True, encodings="gzip")
+        _run_app(_streaming_app([b"x" * 100], b"text/plain"), "gzip", settings)
+        assert compressed_responses.get("gzip") == responses + 1
+        assert compression_input_bytes.get("gzip") == input_bytes + 100
+
+
+@pytest.mark.skipif(not compression_settings.enabled, reason="compression disabled")
+class TestCompressedResponses(BaseTest):
+    def _list_people(self, accept_encoding: str) -> httpx.Response:
+        r = httpx.get(f"{self.api_url}/people", headers={"Accept-Encoding": accept_encoding})
+        assert r.status_code == 200, r.text
+        return r
+
+    def test_list_gzip(self):
+        """List persons accepting gzip.
+        Should return the list compressed with gzip"""
+        for _ in range(10):
+            get_existing_person()
+        uncompressed = self._list_people("identity")
+        r = self._list_people("gzip")
+        assert r.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in r.headers["Vary"]
+        assert int(r.headers["Content-Length"]) < len(uncompressed.content)
+        assert r.json() == uncompressed.json()
+        assert "Content-Encoding" not in uncompressed.headers
+
+    @pytest.mark.skipif(brotli is None, reason="brotli not installed")
+    def test_list_brotli(self):
+        """List persons accepting brotli and gzip.
+        Should return the list compressed with brotli"""
+        for _ in range(10):
+            get_existing_person()
+        r = self._list_people("gzip, br")
+        assert r.headers["Content-Encoding"] == "br"
+        assert len(r.json()["people"]) == 10
+
+    def test_export_streamed(self):
+        """Export persons accepting gzip.
+        Should stream the export compressed with gzip"""
+        person_ids = {get_existing_person().person_id for _ in range(10)}
+        r = httpx.get(f"{self.api_url}/people/export", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["Content-Encoding"] == "gzip" and "Content-Length" not in r.headers
+        assert {line.split('"person_id":"')[1][:36] for line in r.text.splitlines()} == person_ids
+
+    def test_list_etag(self):
+        """List persons accepting gzip, then list them again sending the returned ETag.
+        Should return the ETag with the encoding, and not modified 304"""
+        for _ in range(10):
+            get_existing_person()
+        etag = self._list_people("gzip").headers["ETag"]
+        assert etag.endswith('+gzip"') and etag != self._list_people("identity").headers["ETag"]
+        r = httpx.get(f"{self.api_url}/people", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert r.status_code == 304, r.text
+
+    def test_small_not_compressed(self):
+        """Get a single person, smaller than the compression threshold, accepting gzip.
+        Should return it uncompressed"""
+        person = get_existing_person()
+        r = httpx.get(f"{self.api_url}/people/{person.person_id}", headers={"Accept-Encoding": "gzip"})
+        assert len(r.content) < compression_settings.min_size
+        assert "Content-Encoding" not in r.headers
+
+    def test_error_not_compressed(self):
+        """Get a person that does not exist, accepting gzip.
+        Should return the error uncompressed"""
+        r = httpx.get(f"{self.api_url}/people/{get_uuid()}", headers={"Accept-Encoding": "gzip"})
+        assert r.status_code == 404
+        assert "Content-Encoding" not in r.headers
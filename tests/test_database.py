@@ -0,0 +1,176 @@
+"""TEST DATABASE
+Test the options of the Mongo clients and read preference taken from the settings, and the causal consistency tokens
+"""
+
+# # Native # #
+import asyncio
+import multiprocessing
+from types import SimpleNamespace
+
+# # Installed # #
+import pytest
+import pydantic
+from bson import Timestamp
+from pymongo.read_preferences import SecondaryPreferred, Nearest
+
+# # Project # #
+from people_api import database
+from people_api.consistency import *
+from people_api.exceptions import InvalidCausalTokenException
+from people_api.settings import MongoSettings, ReadPreferenceMode, storage_settings, StorageEngine
+
+
+def _check_forked_client(parent_client_id: int):
+    """Target of the forked process of TestLazyClients: exit with error if the client of the parent is reused"""
+    raise SystemExit(0 if id(database.get_client()) != parent_client_id else 1)
+
+
+@pytest.mark.skipif(storage_settings.engine != StorageEngine.mongo, reason="only the mongo engine has clients")
+class TestLazyClients:
+    def test_same_client(self):
+        """Get the clients of the process, and use a collection.
+        Should return the same clients each time, with the collection bound to them"""
+        client = database.get_client()
+        assert database.get_client() is client
+        assert database.get_async_client() is database.get_async_client()
+        assert database.collection.database.client is client
+
+    def test_forked_process(self):
+        """Get the client on a process forked after the parent created its own.
+        Should create a new client on the child"""
+        client = database.get_client()
+        process = multiprocessing.get_context("fork").Process(target=_check_forked_client, args=(id(client),))
+        process.start()
+        process.join(10)
+        assert process.exitcode == 0
+        assert database.get_client() is client
+
+
+class TestClientOptions:
+    def test_client_options(self, monkeypatch):
+        """Build the client options from the settings.
+        Should map the settings to the driver options, leaving out the ones not set"""
+        settings = MongoSettings(
+            max_pool_size=50, wait_queue_timeout_ms=1000, compressors="zstd,snappy", write_concern="majority"
+        )
+        monkeypatch.setattr(database, "settings", settings)
+        options = database._client_options()
+        assert options["maxPoolSize"] == 50
+        assert options["waitQueueTimeoutMS"] == 1000
+        assert options["compressors"] == "zstd,snappy"
+        assert options["w"] == "majority"
+        assert "socketTimeoutMS" not in options
+        assert "journal" not in options
+
+    def test_numeric_write_concern(self, monkeypatch):
+        """Build the client options with a numeric write concern.
+        Should pass it as an int"""
+        monkeypatch.setattr(database, "settings", MongoSettings(write_concern="2", write_concern_journal=True))
+        options = database._client_options()
+        assert options["w"] == 2
+        assert options["journal"] is True
+
+    def test_read_preference(self, monkeypatch):
+        """Build the read preference from the settings.
+        Should be None for primary, and the read preference with max staleness otherwise"""
+        monkeypatch.setattr(database, "settings", MongoSettings(read_preference=ReadPreferenceMode.primary))
+        assert database._read_preference() is None
+
+        monkeypatch.setattr(database, "settings", MongoSettings(
+            read_preference=ReadPreferenceMode.secondary_preferred, max_staleness_seconds=120
+        ))
+        assert database._read_preference() == SecondaryPreferred(max_staleness=120)
+
+        monkeypatch.setattr(database, "settings", MongoSettings(read_preference=ReadPreferenceMode.nearest))
+        assert database._read_preference() == Nearest()
+
+    def test_max_staleness_with_primary(self):
+        """Set max staleness with the primary read preference.
+        Should fail validation"""
+        with pytest.raises(pydantic.ValidationError):
+            MongoSettings(read_preference=ReadPreferenceMode.primary, max_staleness_seconds=120)
+
+
+class _FakeSession:
+    """Stand-in of a causal session of the driver, keeping the times it is advanced to"""
+    def __init__(self):
+        self.operation_time = None
+        self.cluster_time = None
+
+    def advance_operation_time(self, operation_time):
+        self.operation_time = operation_time
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class TestCausalSession:
+    @pytest.fixture(autouse=True)
+    def _collection(self, monkeypatch):
+        from people_api import consistency
+        monkeypatch.setattr(consistency.mongo_settings, "causal_consistency", True)
+        self.sessions = list()
+
+        def _start_session(causal_consistency):
+            assert causal_consistency
+            self.sessions.append(_FakeSession())
+            return self.sessions[-1]
+
+        client = SimpleNamespace(start_session=_start_session)
+        self.collection = SimpleNamespace(database=SimpleNamespace(client=client))
+
+    def test_token_roundtrip(self):
+        """Run an operation without token, then another one sending the returned token.
+        Should return a token, and advance the second session to its times"""
+        context = set_causal_context(None)
+        with causal_session(self.collection) as session:
+            session.advance_operation_time(Timestamp(1600000000, 3))
+            session.advance_cluster_time({"clusterTime": Timestamp(1600000000, 4)})
+        assert context.token and not causal_token_requested()
+
+        context = set_causal_context(context.token)
+        assert causal_token_requested()
+        with causal_session(self.collection) as session:
+            assert session.operation_time == Timestamp(1600000000, 3)
+            assert session.cluster_time == {"clusterTime": Timestamp(1600000000, 4)}
+
+    def test_async_token_roundtrip(self):
+        """Same as test_token_roundtrip, using the async context manager"""
+        async def _roundtrip():
+            context = set_causal_context(None)
+            async with async_causal_session(self.collection) as session:
+                session.advance_operation_time(Timestamp(1600000000, 3))
+            set_causal_context(context.token)
+            async with async_causal_session(self.collection) as session:
+                return session.operation_time
+
+        assert asyncio.run(_roundtrip()) == Timestamp(1600000000, 3)
+
+    def test_invalid_token(self):
+        """Send an invalid token.
+        Should raise InvalidCausalTokenException"""
+        set_causal_context("invalid")
+        with pytest.raises(InvalidCausalTokenException):
+            with causal_session(self.collection):
+                pass
+
+    def test_disabled(self):
+        """Run an operation on a collection without client (memory engine).
+        Should not use sessions"""
+        set_causal_context(None)
+        with causal_session(SimpleNamespace()) as session:
+            assert session is None
+        assert not self.sessions
+
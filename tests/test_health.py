@@ -0,0 +1,111 @@
+"""TEST HEALTH
+Test the health endpoint of the worker processes
+"""
+
+# # Native # #
+import json
+import asyncio
+import importlib
+import threading
+from types import SimpleNamespace
+
+# # Installed # #
+import httpx
+import pytest
+import uvicorn
+
+# # Project # #
+from people_api import database, openapi
+from people_api.settings import api_settings
+
+# # Package # #
+from .base import BaseTest
+
+app_module = importlib.import_module("people_api.app")
+"""The app module (people_api.app is shadowed by the app object exported by the package)"""
+
+
+class TestHealth(BaseTest):
+    def test_health(self):
+        """Get the health of the worker.
+        Should return its process id and uptime"""
+        r = httpx.get(f"{self.api_url}/health")
+        assert r.status_code == 200, r.text
+        health = r.json()
+        assert health["status"] == "ok" and health["ready"] is True
+        assert health["workers"] == api_settings.workers
+        assert health["uptime"] >= 0 and health["started"] > 0
+        assert isinstance(health["pid"], int)
+
+    def test_ready(self):
+        """Get the readiness of a started worker.
+        Should be ready"""
+        r = httpx.get(f"{self.api_url}/ready")
+        assert r.status_code == 200, r.text
+        assert r.json()["ready"] is True
+
+    def test_openapi(self):
+        """Get the OpenAPI schema, loaded on startup.
+        Should return the schema of the app"""
+        r = httpx.get(f"{self.api_url}/openapi.json")
+        assert r.status_code == 200, r.text
+        assert "/people/{person_id}" in r.json()["paths"]
+
+
+class TestStartup:
+    def test_precomputed_openapi(self, tmp_path, monkeypatch):
+        """Precompute the OpenAPI schema to a file, and load it.
+        Should serve the schema of the file, the same as the generated one"""
+        path = tmp_path / "openapi.json"
+        openapi.main(str(path))
+        monkeypatch.setattr(api_settings, "openapi_file", str(path))
+        monkeypatch.setattr(app_module.app, "openapi_schema", None)
+        openapi.load_openapi_schema(app_module.app)
+        assert app_module.app.openapi_schema == json.loads(path.read_text())
+        assert app_module.app.openapi() is app_module.app.openapi_schema
+
+    @pytest.mark.parametrize("connections", [1, 4])
+    def test_warm_up(self, connections, monkeypatch):
+        """Warm up the pool of the sync client.
+        Should send the pings concurrently, so each one opens a different connection"""
+        barrier = threading.Barrier(connections, timeout=5)
+        pings = list()
+
+        def command(name):
+            barrier.wait()
+            pings.append(name)
+
+        client = SimpleNamespace(admin=SimpleNamespace(command=command))
+        monkeypatch.setattr(database, "_clients", SimpleNamespace(client=lambda: client))
+        monkeypatch.setattr(database.settings, "async_driver", False)
+        monkeypatch.setattr(database.settings, "warmup_connections", connections)
+        asyncio.run(database.warm_up())
+        assert pings == ["ping"] * connections
+
+
+class TestRun:
+    def test_workers(self, monkeypatch):
+        """Run the API with multiple workers.
+        Should pass the app to Uvicorn as an import string, so each worker process imports it"""
+        calls = list()
+        monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append((app, kwargs)))
+        monkeypatch.setattr(api_settings, "workers", 4)
+        app_module.run()
+        app, kwargs = calls[0]
+        assert app == "people_api.app:app"
+        assert kwargs["workers"] == 4
+
+    def test_older_uvicorn(self, monkeypatch):
+        """Run the API with a Uvicorn version without the worker health check timeout option.
+        Should not pass that option to Uvicorn"""
+        class _Config:
+            def __init__(self, app, workers=None, timeout_graceful_shutdown=None):
+                pass
+
+        calls = list()
+        monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: calls.append((app, kwargs)))
+        monkeypatch.setattr(uvicorn, "Config", _Config)
+        app_module.run()
+        _, kwargs = calls[0]
+        assert "timeout_worker_healthcheck" not in kwargs
+        assert "timeout_graceful_shutdown" in kwargs
@@ -0,0 +1,100 @@
+"""TEST METRICS
+Test the metrics collected in-process, and their exposition on the metrics endpoint
+"""
+
+# # Native # #
+from types import SimpleNamespace
+
+# # Installed # #
+import httpx
+import pytest
+
+# # Project # #
+from people_api.metrics import *
+from people_api.settings import metrics_settings
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+class TestMetricTypes:
+    def test_histogram_render(self):
+        """Observe values on a histogram with labels, and render it.
+        Should render cumulative buckets, sum and count"""
+        histogram = Histogram("latency_seconds", "Latency", labels=("route",), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, "/people")
+
+        assert histogram.get("/people") == (4, 2.65)
+        assert histogram.render().splitlines() == [
+            "# HELP latency_seconds Latency",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{route="/people",le="0.1"} 2',
+            'latency_seconds_bucket{route="/people",le="1"} 3',
+            'latency_seconds_bucket{route="/people",le="+Inf"} 4',
+            'latency_seconds_sum{route="/people"} 2.65',
+            'latency_seconds_count{route="/people"} 4'
+        ]
+
+    def test_counter_render(self):
+        """Increment a counter with labels that must be escaped, and render it.
+        Should render the escaped labels"""
+        counter = Counter("errors_total", "Errors", labels=("reason",))
+        counter.inc('say "hi"')
+        counter.inc('say "hi"', amount=2)
+        assert counter.render().splitlines()[-1] == 'errors_total{reason="say \\"hi\\""} 3'
+
+
+class TestMongoListeners:
+    def test_command_listener(self):
+        """Notify a succeeded and a failed command to the listener.
+        Should observe both durations, and count the failure"""
+        listener = MongoCommandListener()
+        count, total = mongo_command_duration.get("testcommand")
+        errors = mongo_command_errors.get("testcommand")
+
+        listener.succeeded(SimpleNamespace(command_name="testcommand", duration_micros=1500))
+        listener.failed(SimpleNamespace(command_name="testcommand", duration_micros=500))
+        assert mongo_command_duration.get("testcommand") == (count + 2, pytest.approx(total + 0.002))
+        assert mongo_command_errors.get("testcommand") == errors + 1
+
+    def test_pool_listener(self):
+        """Notify a connection checked out and checked in to the listener.
+        Should observe the wait time, and restore the connections in use"""
+        listener = MongoPoolListener()
+        count, _ = mongo_pool_checkout_wait.get()
+        in_use = mongo_pool_connections_in_use.get()
+
+        listener.connection_checked_out(SimpleNamespace(duration=0.01))
+        assert mongo_pool_connections_in_use.get() == in_use + 1
+        listener.connection_checked_in(SimpleNamespace())
+        assert mongo_pool_connections_in_use.get() == in_use
+        assert mongo_pool_checkout_wait.get()[0] == count + 1
+
+
+@pytest.mark.skipif(not metrics_settings.enabled, reason="metrics disabled")
+class TestMetricsEndpoint(BaseTest):
+    def _metrics(self) -> dict:
+        r = httpx.get(f"{self.api_url}/metrics")
+        assert r.status_code == 200, r.text
+        assert r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        return dict(line.rsplit(" ", 1) for line in r.text.splitlines() if not line.startswith("#"))
+
+    def test_request_metrics(self):
+        """Create a person, get a person that does not exist, and request an unknown path.
+        Should count the requests by route template and status, and observe their latencies"""
+        before = self._metrics()
+        self.create_person(get_person_create().dict())
+        self.get_person(get_uuid(), statuscode=404)
+        httpx.get(f"{self.api_url}/unknown/{get_uuid()}")
+        metrics = self._metrics()
+
+        def _increase(key):
+            return float(metrics.get(key, 0)) - float(before.get(key, 0))
+
+        assert _increase('http_requests_total{method="POST",route="/people",status="201"}') == 1
+        assert _increase('http_requests_total{method="GET",route="/people/{person_id}",status="404"}') == 1
+        assert _increase('http_requests_total{method="GET",route="<unmatched>",status="404"}') == 1
+        assert _increase('http_request_duration_seconds_count{method="POST",route="/people"}') == 1
+        assert metrics["http_requests_in_flight"] == "1"
@@ -0,0 +1,130 @@
+"""TEST PROFILING
+Test the request profiler: measured spans, recording of slow and sampled requests, and the profiling endpoints
+"""
+
+# # Native # #
+import time
+import asyncio
+
+# # Installed # #
+import httpx
+import pytest
+
+# # Project # #
+from people_api.profiling import *
+from people_api.settings import profiling_settings
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+@profiled("work")
+def _work(depth: int = 0):
+    time.sleep(0.01)
+    if depth:
+        _work(depth - 1)
+
+
+class TestProfiler:
+    @staticmethod
+    async def _request(profiler: Profiler, sample: bool = False, depth: int = 0):
+        """Profile a fake request, running in its own task (context) as the requests do"""
+        profile = profiler.start(sample=sample)
+        start = time.perf_counter()
+        with span("handler"):
+            _work(depth)
+        profiler.finish(profile, "GET", "/people/foo", "/people/{person_id}", 200, time.perf_counter() - start)
+
+    def test_record_slow_requests(self):
+        """Profile a fast and a slow request.
+        Should only record the slow one, with the time spent on each span (nested spans measured once)"""
+        profiler = Profiler(slow_threshold_ms=15, max_recorded=10, sampling_interval_ms=1)
+        asyncio.run(self._request(profiler))
+        asyncio.run(self._request(profiler, depth=1))
+
+        recorded, = profiler.recorded()
+        spans = {span_.name: span_ for span_ in recorded.spans}
+        assert set(spans) == {"handler", "work"}
+        assert spans["work"].count == 1
+        assert 20 <= spans["work"].duration_ms <= spans["handler"].duration_ms <= recorded.duration_ms
+        assert not recorded.sampled
+
+    def test_sampled_request(self):
+        """Profile a fast request with the sampling profiler.
+        Should record it, with samples of the stacks running it"""
+        profiler = Profiler(slow_threshold_ms=1000, max_recorded=10, sampling_interval_ms=1)
+        asyncio.run(self._request(profiler, sample=True, depth=2))
+
+        recorded, = profiler.recorded()
+        assert recorded.sampled
+        assert any(stack.endswith(f"{__name__}._work") for stack in recorded.samples)
+
+    def test_ring_buffer(self):
+        """Profile more requests than the maximum recorded.
+        Should keep the most recent ones"""
+        profiler = Profiler(slow_threshold_ms=0, max_recorded=2, sampling_interval_ms=1)
+        for _ in range(3):
+            asyncio.run(self._request(profiler))
+        assert profiler.status().recorded == 2
+        assert profiler.recorded()[0].started >= profiler.recorded()[1].started
+
+
+@pytest.mark.skipif(not profiling_settings.enabled, reason="profiling disabled")
+class TestProfilingEndpoints(BaseTest):
+    original_settings = profiling_settings.copy()
+
+    @classmethod
+    def setup_class(cls):
+        # The sampling header and the administration of the profiler are disabled by default
+        profiling_settings.sampling_header = "X-Profile"
+        profiling_settings.admin_enabled = True
+        super().setup_class()
+
+    @classmethod
+    def teardown_class(cls):
+        super().teardown_class()
+        profiling_settings.sampling_header = cls.original_settings.sampling_header
+        profiling_settings.admin_enabled = cls.original_settings.admin_enabled
+
+    def test_sampling_header(self):
+        """Create a person sending the sampling header.
+        Should record the request, with the handler and repository spans and the sampled stacks"""
+        r = httpx.post(
+            f"{self.api_url}/people", json=get_person_create().dict(),
+            headers={profiling_settings.sampling_header: "1"}
+        )
+        assert r.status_code == 201, r.text
+
+        r = httpx.get(f"{self.api_url}/admin/profiling/requests")
+        assert r.status_code == 200, r.text
+        recorded = r.json()[0]
+        assert (recorded["method"], recorded["route"], recorded["status_code"]) == ("POST", "/people", 201)
+        assert {"handler", "repository.create"} <= {span_["name"] for span_ in recorded["spans"]}
+        # Fast requests can finish before the first sample is taken
+        assert recorded["sampled"] and recorded["samples"] is not None
+
+    def test_slow_threshold(self):
+        """Set the slow requests threshold to zero, and get a person that does not exist.
+        Should record the request"""
+        r = httpx.patch(f"{self.api_url}/admin/profiling", json={"slow_threshold_ms": 0})
+        assert r.status_code == 200, r.text
+        try:
+            person_id = get_uuid()
+            self.get_person(person_id, statuscode=404)
+            recorded = httpx.get(f"{self.api_url}/admin/profiling/requests").json()
+            assert any(request["path"] == f"/people/{person_id}" for request in recorded)
+        finally:
+            threshold = profiling_settings.slow_threshold_ms
+            httpx.patch(f"{self.api_url}/admin/profiling", json={"slow_threshold_ms": threshold})
+
+
+@pytest.mark.skipif(not profiling_settings.enabled, reason="profiling disabled")
+@pytest.mark.skipif(profiling_settings.admin_enabled, reason="profiling administration enabled")
+class TestProfilingAdminDisabled(BaseTest):
+    def test_update_disabled(self):
+        """Update the profiler, with its administration disabled (default).
+        Should return not found 404 error, without enabling the sampling profiler"""
+        r = httpx.patch(f"{self.api_url}/admin/profiling", json={"sampling": True})
+        assert r.status_code == 404, r.text
+        assert httpx.get(f"{self.api_url}/admin/profiling").json()["sampling"] is False
@@ -1,10 +1,17 @@
 """TEST READ
-Test read actions (get one, list)
+Test read actions (get one, list, export)
 """
 
+# # Native # #
+import json
+from datetime import date
+
 # # Installed # #
 from fastapi import status as statuscode
 
+# # Project # #
+from people_api.utils import encode_token
+
 # # Package # #
 from .base import BaseTest
 from .utils import *
@@ -31,8 +38,239 @@ class TestGet(BaseTest):
 class TestList(BaseTest):
     def test_list_people(self):
         """Having multiple persons, list all of them.
-        Should return all of them in array"""
+        Should return all of them in array, sorted by creation time (and id), without next page"""
         people = [get_existing_person() for _ in range(4)]
+        people.sort(key=lambda p: (p.created, p.person_id))
 
         response = self.list_people()
-        assert response.json() == [p.dict() for p in people]
+        assert response.json() == {"people": [p.dict() for p in people]}
+
+    def test_list_people_paginated(self):
+        """Having multiple persons, list all of them using small pages.
+        Should return all of them, in order and without repetitions, through the next page cursors"""
+        people = [get_existing_person() for _ in range(7)]
+        people.sort(key=lambda p: (p.name, p.person_id), reverse=True)
+
+        read_people = list()
+        cursor = None
+        for _ in range(4):
+            params = dict(sort="name", order="desc", limit=2)
+            if cursor:
+                params["cursor"] = cursor
+            page = self.list_people(**params).json()
+            assert len(page["people"]) <= 2
+            read_people.extend(page["people"])
+
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+
+        assert cursor is None
+        assert read_people == [p.dict() for p in people]
+
+    def test_list_people_invalid_cursor(self):
+        """List people with a malformed cursor, and with a cursor generated for a different sorting.
+        Should return bad request 400 error"""
+        [get_existing_person() for _ in range(2)]
+        cursor = self.list_people(limit=1).json()["next_cursor"]
+
+        self.list_people(cursor="foo", statuscode=statuscode.HTTP_400_BAD_REQUEST)
+        self.list_people(cursor=cursor, sort="name", statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+    def test_list_people_malformed_cursor(self):
+        """List people with cursors that decode to data other than a cursor of the list.
+        Should return bad request 400 error"""
+        person_id = get_uuid()
+        malformed = (
+            5, [1, 2], ["foo", "asc", 1, person_id], ["created", "foo", 1, person_id], ["created", "asc", 1, 2]
+        )
+        for data in malformed:
+            self.list_people(cursor=encode_token(data), statuscode=statuscode.HTTP_400_BAD_REQUEST)
+
+
+class TestFilter(BaseTest):
+    @staticmethod
+    def person_ids(response) -> set:
+        return {p["person_id"] for p in response.json()["people"]}
+
+    def test_filter_name(self):
+        """Having multiple persons, filter them by exact name and by name prefix.
+        Should return only the matching persons"""
+        prefix = get_uuid()
+        john = get_existing_person(name=f"{prefix} John")
+        johnny = get_existing_person(name=f"{prefix} Johnny")
+        get_existing_person()
+
+        assert self.person_ids(self.list_people(name=john.name)) == {john.person_id}
+        assert self.person_ids(self.list_people(name_prefix=f"{prefix} John")) == {john.person_id, johnny.person_id}
+        assert self.person_ids(self.list_people(name_prefix="(.*)")) == set()
+
+    def test_filter_address(self):
+        """Having multiple persons, filter them by city, state and zip code.
+        Should return only the matching persons"""
+        city, state = get_uuid(), get_uuid()
+        person_a = get_existing_person(address=get_address(city=city, state=state, zip_code="1000"))
+        person_b = get_existing_person(address=get_address(city=city, state=state, zip_code="2000"))
+        get_existing_person(address=get_address(state=state))
+
+        assert self.person_ids(self.list_people(city=city)) == {person_a.person_id, person_b.person_id}
+        assert self.person_ids(self.list_people(state=state, zip_code="2000")) == {person_b.person_id}
+        assert len(self.list_people(state=state).json()["people"]) == 3
+
+    def test_filter_birth_range(self):
+        """Having multiple persons, filter them by a range of dates of birth.
+        Should return only the persons born within the range (inclusive)"""
+        people = [get_existing_person(birth=date(1990 + i, 6, 15)) for i in range(5)]
+
+        response = self.list_people(birth_from="1991-06-15", birth_to="1993-01-01")
+        assert self.person_ids(response) == {people[1].person_id, people[2].person_id}
+
+    def test_filter_paginated(self):
+        """Having multiple persons, filter them by city using small pages.
+        Should return all the matching persons through the next page cursors"""
+        city = get_uuid()
+        people = [get_existing_person(address=get_address(city=city)) for _ in range(5)]
+        get_existing_person()
+
+        read_ids = set()
+        page = self.list_people(city=city, limit=2).json()
+        read_ids.update(p["person_id"] for p in page["people"])
+        while page.get("next_cursor"):
+            page = self.list_people(city=city, limit=2, cursor=page["next_cursor"]).json()
+            read_ids.update(p["person_id"] for p in page["people"])
+
+        assert read_ids == {p.person_id for p in people}
+
+
+class TestFields(BaseTest):
+    def test_get_person_fields(self):
+        """Having an existing person, get it requesting only some fields.
+        Should return only the requested fields"""
+        person = get_existing_person()
+
+        response = self.get_person(person.person_id, fields="person_id,name")
+        assert response.json() == {"person_id": person.person_id, "name": person.name}
+
+    def test_get_person_age_without_birth(self):
+        """Having an existing person, get it requesting the age but not the birth.
+        Should return only the age, computed from the birth"""
+        person = get_existing_person()
+
+        response = self.get_person(person.person_id, fields="age")
+        assert response.json() == {"age": person.age}
+
+    def test_get_person_unset_fields(self):
+        """Having an existing person without birth, get it requesting only the birth.
+        Should return an empty object"""
+        person = get_existing_person(birth=None)
+
+        response = self.get_person(person.person_id, fields="birth")
+        assert response.json() == {}
+
+    def test_get_person_invalid_fields(self):
+        """Get a person requesting unknown fields.
+        Should return validation error 422"""
+        person = get_existing_person()
+        self.get_person(person.person_id, fields="name,foo", statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_list_people_fields_paginated(self):
+        """Having multiple persons, list them requesting only the name, sorted by creation time, using small pages.
+        Should return all of them with only the name, through the next page cursors"""
+        people = [get_existing_person() for _ in range(3)]
+        people.sort(key=lambda p: (p.created, p.person_id))
+
+        page = self.list_people(fields="name", limit=2).json()
+        read_people = page["people"]
+        page = self.list_people(fields="name", limit=2, cursor=page["next_cursor"]).json()
+        read_people.extend(page["people"])
+
+        assert "next_cursor" not in page
+        assert read_people == [{"name": p.name} for p in people]
+
+    def test_export_people_fields(self):
+        """Having multiple persons, export them requesting only the id and address.
+        Should return all of them with only those fields"""
+        people = [get_existing_person() for _ in range(2)]
+
+        exported = [json.loads(line) for line in self.export_people(fields="person_id,address").text.splitlines()]
+        expected = [{"person_id": p.person_id, "address": p.address.dict()} for p in people]
+        key = lambda p: p["person_id"]
+        assert sorted(exported, key=key) == sorted(expected, key=key)
+
+
+class TestETag(BaseTest):
+    def test_get_person_not_modified(self):
+        """Having an existing person, get it, then get it again sending the returned ETag.
+        Should return not modified 304 without body"""
+        person = get_existing_person()
+        etag = self.get_person(person.person_id).headers["ETag"]
+
+        response = self.get_person(
+            person.person_id, headers={"If-None-Match": etag}, statuscode=statuscode.HTTP_304_NOT_MODIFIED
+        )
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_get_person_modified(self):
+        """Having an existing person, get it, update it twice, and get it again sending the returned ETag.
+        Should return the person with a new ETag, even if updated within the same second"""
+        person = get_existing_person()
+        etag = self.get_person(person.person_id).headers["ETag"]
+
+        for _ in range(2):
+            self.update_person(person.person_id, {"name": get_uuid()})
+            response = self.get_person(person.person_id, headers={"If-None-Match": etag})
+            assert response.headers["ETag"] != etag
+            etag = response.headers["ETag"]
+
+    def test_get_person_fields_etag(self):
+        """Having an existing person, get it with and without requesting fields.
+        Should return different ETags"""
+        person = get_existing_person()
+        etag = self.get_person(person.person_id).headers["ETag"]
+
+        response = self.get_person(person.person_id, headers={"If-None-Match": etag}, fields="name")
+        assert response.json() == {"name": person.name}
+        assert response.headers["ETag"] != etag
+
+    def test_list_people_not_modified(self):
+        """Having multiple persons, list them, then list them again sending the returned ETag,
+        before and after deleting one of them.
+        Should return not modified 304, and then the list with a new ETag"""
+        people = [get_existing_person() for _ in range(3)]
+        etag = self.list_people().headers["ETag"]
+        self.list_people(headers={"If-None-Match": etag}, statuscode=statuscode.HTTP_304_NOT_MODIFIED)
+
+        self.delete_person(people[0].person_id)
+        response = self.list_people(headers={"If-None-Match": etag})
+        assert len(response.json()["people"]) == 2
+        assert response.headers["ETag"] != etag
+
+
+class TestExport(BaseTest):
+    def test_export_people_ndjson(self):
+        """Having multiple persons, export all of them as NDJSON, using a batch size smaller than the total.
+        Should return all of them, one per line"""
+        people = [get_existing_person() for _ in range(5)]
+
+        response = self.export_people(batch_size=2)
+        assert response.headers["content-type"] == "application/x-ndjson"
+
+        lines = response.text.splitlines()
+        exported = sorted((json.loads(line) for line in lines), key=lambda p: p["person_id"])
+        assert exported == sorted((p.dict() for p in people), key=lambda p: p["person_id"])
+
+    def test_export_people_json(self):
+        """Having multiple persons, export all of them as JSON array.
+        Should return all of them in array"""
+        people = [get_existing_person() for _ in range(3)]
+
+        response = self.export_people(format="json")
+        exported = sorted(response.json(), key=lambda p: p["person_id"])
+        assert exported == sorted((p.dict() for p in people), key=lambda p: p["person_id"])
+
+    def test_export_no_people(self):
+        """Export persons when there are none.
+        Should return an empty body as NDJSON, and an empty array as JSON"""
+        assert self.export_people().text == ""
+        assert self.export_people(format="json").json() == []
@@ -0,0 +1,149 @@
+"""TEST SEARCH
+Test the search of persons: full-text (on the in-memory engine, as the Mongo stand-in does not support text search)
+and prefix (autocomplete), including the pagination and the normalized values kept on the documents
+"""
+
+# # Installed # #
+import pytest
+import httpx
+import mongomock
+
+# # Project # #
+from people_api import repositories, database
+from people_api.exceptions import InvalidCursorException
+from people_api.models import *
+from people_api.models.indexes import PEOPLE_INDEXES
+from people_api.repositories import PeopleRepository
+from people_api.settings import storage_settings, StorageEngine
+from people_api.storage import MemoryCollection
+from people_api.utils import encode_token
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+def _search_all(query: str, mode: PeopleSearchMode, limit: int = 2):
+    """Search all the persons, page by page, returning their names"""
+    names, cursor = list(), None
+    while True:
+        page = PeopleRepository.search(query, mode, limit=limit, cursor=cursor)
+        names.extend(person.name for person in page.people)
+        cursor = page.next_cursor
+        if not cursor:
+            return names
+
+
+class TestSearchRepository:
+    original_collection = repositories.collection
+
+    @pytest.fixture(autouse=True, params=["memory", "mongomock"])
+    def _collection(self, request):
+        if request.param == "memory":
+            collection = MemoryCollection()
+        else:
+            collection = mongomock.MongoClient()["test"]["people"]
+        collection.create_indexes(PEOPLE_INDEXES)
+        repositories.collection = collection
+        for name, city in (
+                ("Ana García", "Madrid"), ("Anabel Pérez", "Sevilla"), ("Bob Smith", "Anaheim"),
+                ("Carla Ana", "Madrid"), ("Ángel Ruiz", "Málaga"), ("Anaïs Dupont", "Anaheim")
+        ):
+            PeopleRepository.create(get_person_create(name=name, address=get_address(city=city)))
+        self.collection = collection
+        yield
+        repositories.collection = self.original_collection
+
+    def test_prefix_search(self):
+        """Search by a lowercase prefix without accents, page by page.
+        Should return the names starting with it, then the cities starting with it, case and diacritic insensitive"""
+        assert _search_all("ana", PeopleSearchMode.prefix) == [
+            "Ana García", "Anabel Pérez", "Anaïs Dupont", "Bob Smith"
+        ]
+        assert _search_all("ÁN", PeopleSearchMode.prefix, limit=10) == [
+            "Ana García", "Anabel Pérez", "Anaïs Dupont", "Ángel Ruiz", "Bob Smith"
+        ]
+        # Persons with the same city are sorted by id
+        names = _search_all("ma", PeopleSearchMode.prefix)
+        assert sorted(names[:2]) == ["Ana García", "Carla Ana"] and names[2:] == ["Ángel Ruiz"]
+
+    def test_prefix_search_after_update(self):
+        """Update the name and address of a person, then search by the new values.
+        Should find the person by the updated values"""
+        person = PeopleRepository.search("bob", PeopleSearchMode.prefix).people[0]
+        PeopleRepository.update(person.person_id, PersonUpdate(name="Zoe Smith", address=get_address(city="Zaragoza")))
+        assert _search_all("bob", PeopleSearchMode.prefix) == []
+        assert _search_all("zo", PeopleSearchMode.prefix) == ["Zoe Smith"]
+        assert _search_all("zar", PeopleSearchMode.prefix) == ["Zoe Smith"]
+
+    def test_text_search(self):
+        """Search by words of the name and city (memory engine only).
+        Should rank the persons matching more words, and on the name, first"""
+        if not isinstance(self.collection, MemoryCollection):
+            pytest.skip("text search is not available on the Mongo stand-in")
+        assert _search_all("garcia MADRID", PeopleSearchMode.text) == ["Ana García", "Carla Ana"]
+        assert sorted(_search_all("anaheim", PeopleSearchMode.text)) == ["Anaïs Dupont", "Bob Smith"]
+        assert _search_all("dupont anaheim", PeopleSearchMode.text, limit=1) == ["Anaïs Dupont", "Bob Smith"]
+        assert _search_all("unknown", PeopleSearchMode.text) == []
+
+    def test_cursor_for_other_search(self):
+        """Request a page with the cursor of a different search.
+        Should raise InvalidCursorException"""
+        cursor = PeopleRepository.search("ana", PeopleSearchMode.prefix, limit=1).next_cursor
+        with pytest.raises(InvalidCursorException):
+            PeopleRepository.search("an", PeopleSearchMode.prefix, limit=1, cursor=cursor)
+        with pytest.raises(InvalidCursorException):
+            PeopleRepository.search("ana", PeopleSearchMode.text, limit=1, cursor=cursor)
+
+    @pytest.mark.parametrize("mode, data", [
+        (PeopleSearchMode.text, 5),
+        (PeopleSearchMode.text, ["text"]),
+        (PeopleSearchMode.text, ["text", "ana", "1"]),
+        (PeopleSearchMode.text, ["text", "ana", 1, 2]),
+        (PeopleSearchMode.prefix, ["prefix", "ana"]),
+        (PeopleSearchMode.prefix, ["prefix", "ana", "street", "ana", "id"]),
+        (PeopleSearchMode.prefix, ["prefix", "ana", ["name"], "ana", "id"]),
+        (PeopleSearchMode.prefix, ["prefix", "ana", "name", 1, None]),
+    ])
+    def test_malformed_cursor(self, mode, data):
+        """Request a page with cursors that decode to data other than a cursor of the search.
+        Should raise InvalidCursorException"""
+        with pytest.raises(InvalidCursorException):
+            PeopleRepository.search("ana", mode, limit=1, cursor=encode_token(data))
+
+
+class TestBackfill:
+    def test_backfill_search_fields(self, monkeypatch):
+        """Backfill the search values of documents written without them.
+        Should update them (only), so they are found by the prefix search"""
+        collection = mongomock.MongoClient()["test"]["people"]
+        documents = list()
+        for name, city in (("Élise", "Paris"), ("Eric", "Lyon")):
+            document = get_person_create(name=name, address=get_address(city=city)).dict()
+            documents.append({**document, "_id": get_uuid(), "created": 1, "updated": 1, "version": 1})
+        documents[1]["search"] = {"name": "eric", "city": "lyon"}
+        collection.insert_many(documents)
+        monkeypatch.setattr(storage_settings, "engine", StorageEngine.mongo)
+        monkeypatch.setattr(database, "collection", collection)
+        monkeypatch.setattr(repositories, "collection", collection)
+        assert database.backfill_search_fields() == 1
+        assert _search_all("e", PeopleSearchMode.prefix) == ["Élise", "Eric"]
+
+
+class TestSearchEndpoint(BaseTest):
+    def test_prefix_search(self):
+        """Create persons and search them by prefix with sparse fields, page by page.
+        Should return the matching persons with only the requested fields"""
+        prefix = get_uuid()[:8]
+        for i in range(3):
+            self.create_person(get_person_create(name=f"{prefix.upper()} {i}").dict())
+
+        params = {"q": prefix, "mode": "prefix", "limit": 2, "fields": "name"}
+        r = httpx.get(f"{self.api_url}/people/search", params=params)
+        assert r.status_code == 200, r.text
+        page = r.json()
+        assert page["people"] == [{"name": f"{prefix.upper()} 0"}, {"name": f"{prefix.upper()} 1"}]
+
+        r = httpx.get(f"{self.api_url}/people/search", params={**params, "cursor": page["next_cursor"]})
+        assert r.status_code == 200, r.text
+        assert r.json() == {"people": [{"name": f"{prefix.upper()} 2"}]}
@@ -0,0 +1,255 @@
+"""TEST STORAGE
+Test the in-memory storage engine, comparing the results of the repositories using it with the results using
+an in-process Mongo stand-in (mongomock)
+"""
+
+# # Native # #
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+
+# # Installed # #
+import pytest
+import mongomock
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+
+# # Project # #
+from people_api import repositories, database
+from people_api.exceptions import PersonNotFoundException, PersonModifiedException
+from people_api.models import *
+from people_api.models.indexes import PEOPLE_INDEXES, TOMBSTONES_INDEXES
+from people_api.repositories import PeopleRepository
+from people_api.settings import storage_settings, StorageEngine
+from people_api.storage import MemoryCollection
+
+# # Package # #
+from .utils import *
+
+
+def _documents(count: int):
+    """Generate documents with repeated values (cities, names, creation times), some of them without birth"""
+    rng = random.Random(0)
+    documents = list()
+    for i in range(count):
+        document = {
+            "_id": get_uuid(),
+            "name": rng.choice(("Ana", "Anabel", "Bob", "Bobby", "Carla")) + f" {rng.randrange(5)}",
+            "address": {
+                "street": f"Street {i}", "city": f"City {rng.randrange(4)}", "state": f"State {rng.randrange(3)}",
+                "zip_code": str(rng.randrange(10000, 10010))
+            },
+            "created": 1600000000 + rng.randrange(50),
+            "updated": 1600000000 + rng.randrange(50),
+            "version": 1
+        }
+        if rng.random() > 0.2:
+            document["birth"] = (date(1950, 1, 1) + timedelta(days=rng.randrange(20000))).isoformat()
+        documents.append(document)
+    return documents
+
+
+class TestMemoryRepository:
+    original_collection = repositories.collection
+    original_tombstones_collection = repositories.tombstones_collection
+
+    def setup_method(self):
+        documents = _documents(300)
+        self.memory = MemoryCollection()
+        self.memory.create_indexes(PEOPLE_INDEXES)
+        self.memory.insert_many([dict(document) for document in documents])
+        self.mongomock = mongomock.MongoClient()["test"]["people"]
+        self.mongomock.insert_many([dict(document) for document in documents])
+        # The deletes keep tombstones: each engine writes them to its own collection
+        self.tombstones = {
+            id(self.memory): MemoryCollection(), id(self.mongomock): mongomock.MongoClient()["test"]["tombstones"]
+        }
+        for tombstones in self.tombstones.values():
+            tombstones.create_indexes(TOMBSTONES_INDEXES)
+
+    @classmethod
+    def teardown_method(cls):
+        repositories.collection = cls.original_collection
+        repositories.tombstones_collection = cls.original_tombstones_collection
+
+    def _list_all(self, collection, **kwargs):
+        """List all the persons, page by page"""
+        repositories.collection = collection
+        people, cursor = list(), None
+        while True:
+            page = PeopleRepository.list(limit=7, cursor=cursor, **kwargs)
+            people.extend(page.people)
+            cursor = page.next_cursor
+            if not cursor:
+                return people
+
+    @pytest.mark.parametrize("sort", list(PeopleSort))
+    @pytest.mark.parametrize("order", list(SortOrder))
+    @pytest.mark.parametrize("filters", [
+        None,
+        PeopleFilters(city="City 1"),
+        PeopleFilters(state="State 2", birth_from=date(1960, 1, 1), birth_to=date(1990, 1, 1)),
+        PeopleFilters(name_prefix="Ana"),
+        PeopleFilters(name="Bob 3"),
+        PeopleFilters(created_from=1600000010, created_to=1600000020, zip_code="10003"),
+    ])
+    def test_list_same_as_mongo(self, sort, order, filters):
+        """List all the persons, page by page, with different sortings and filters.
+        Should return the same persons as using Mongo"""
+        expected = self._list_all(self.mongomock, filters=filters, sort=sort, order=order)
+        result = self._list_all(self.memory, filters=filters, sort=sort, order=order)
+        assert result == expected
+        assert expected or filters
+
+    def test_write_same_as_mongo(self):
+        """Create, update and delete persons, single and bulk.
+        Should leave the same persons as using Mongo"""
+        updated_id, deleted_id = [document["_id"] for document in self.memory.find(limit=2)]
+        creates = [get_person_create() for _ in range(3)]
+        for collection in (self.memory, self.mongomock):
+            repositories.collection = collection
+            repositories.tombstones_collection = self.tombstones[id(collection)]
+            person = PeopleRepository.create(creates[0])
+            PeopleRepository.update(person.person_id, PersonUpdate(name="Updated"))
+            PeopleRepository.update(updated_id, PersonUpdate(address=get_address(city="Updated")))
+            PeopleRepository.delete(deleted_id)
+            results = PeopleRepository.create_many(creates[1:])
+            PeopleRepository.delete_many([results.results[0].person_id, get_uuid()])
+
+        def _persons(collection):
+            return sorted(
+                (document["name"], document["address"]["city"], document["version"])
+                for document in collection.find(projection={"_id": False})
+            )
+        assert _persons(self.memory) == _persons(self.mongomock)
+        assert len(self.memory) == 301
+        assert self.memory.find_one({"address.city": "Updated"})["_id"] == updated_id
+        assert [len(list(tombstones.find())) for tombstones in self.tombstones.values()] == [2, 2]
+
+    def test_conditional_update_same_as_mongo(self):
+        """Update a person with its current revision, then with the previous one, and a person without version
+        (written before the version field existed) with its revision.
+        Should update when the revision matches, and raise PersonModifiedException otherwise, as using Mongo"""
+        for collection in (self.memory, self.mongomock):
+            repositories.collection = collection
+            person = PeopleRepository.create(get_person_create())
+            updated = PeopleRepository.update(person.person_id, PersonUpdate(name="Foo"), revisions=[person.revision])
+            assert updated.name == "Foo" and updated.revision != person.revision
+            with pytest.raises(PersonModifiedException):
+                PeopleRepository.update(person.person_id, PersonUpdate(name="Bar"), revisions=[person.revision])
+            with pytest.raises(PersonNotFoundException):
+                PeopleRepository.update(get_uuid(), PersonUpdate(name="Bar"), revisions=[person.revision])
+
+            legacy = collection.find_one({"name": "Bob 3"})
+            collection.update_one({"_id": legacy["_id"]}, {"$unset": {"version": ""}})
+            revision = f"{legacy['updated']}.0"
+            assert PeopleRepository.update(legacy["_id"], PersonUpdate(name="Baz"), revisions=[revision]).name == "Baz"
+
+
+class TestMemoryCollection:
+    def test_duplicate_key(self):
+        """Insert a document twice, one and many.
+        Should raise the same errors as Mongo"""
+        collection = MemoryCollection()
+        collection.insert_one({"_id": "a"})
+        with pytest.raises(DuplicateKeyError):
+            collection.insert_one({"_id": "a"})
+
+        with pytest.raises(BulkWriteError) as error:
+            collection.insert_many([{"_id": "b"}, {"_id": "a"}, {"_id": "c"}], ordered=False)
+        assert [write_error["index"] for write_error in error.value.details["writeErrors"]] == [1]
+        assert error.value.details["writeErrors"][0]["code"] == 11000
+        assert len(collection) == 3
+
+    def test_update_counts(self):
+        """Update a document without changes, with changes, and a document that does not exist.
+        Should return the matched and modified counts"""
+        collection = MemoryCollection()
+        collection.insert_one({"_id": "a", "name": "foo", "address": {"city": "bar"}})
+
+        result = collection.update_one({"_id": "a"}, {"$set": {"name": "foo"}})
+        assert (result.matched_count, result.modified_count) == (1, 0)
+        result = collection.update_one({"name": "foo"}, {"$set": {"address.city": "baz"}, "$inc": {"version": 1}})
+        assert (result.matched_count, result.modified_count) == (1, 1)
+        result = collection.update_one({"_id": "b"}, {"$set": {"name": "foo"}})
+        assert (result.matched_count, result.modified_count) == (0, 0)
+
+        assert collection.find_one({"address.city": "baz"}) == {
+            "_id": "a", "name": "foo", "address": {"city": "baz"}, "version": 1
+        }
+
+    def test_find_one_and_update(self):
+        """Find and update a document, returning it before and after the update, and a document that does not exist.
+        Should return the (projected) document as it was, as it is, and None"""
+        collection = MemoryCollection()
+        collection.insert_one({"_id": "a", "name": "foo", "version": 1})
+
+        before = collection.find_one_and_update(
+            {"_id": "a", "version": 1}, {"$set": {"name": "bar"}, "$inc": {"version": 1}}
+        )
+        assert before == {"_id": "a", "name": "foo", "version": 1}
+        after = collection.find_one_and_update(
+            {"_id": "a"}, {"$inc": {"version": 1}}, projection={"version": True}, return_document=ReturnDocument.AFTER
+        )
+        assert after == {"_id": "a", "version": 3}
+        assert collection.find_one_and_update({"_id": "a", "version": 1}, {"$set": {"name": "baz"}}) is None
+        assert collection.find_one({"_id": "a"})["name"] == "bar"
+
+    def test_find_one_and_delete(self):
+        """Find and delete a document, then a document that does not exist.
+        Should return the (projected) document as it was, and None"""
+        collection = MemoryCollection()
+        collection.insert_many([{"_id": "a", "name": "foo", "version": 1}, {"_id": "b", "name": "bar", "version": 1}])
+
+        deleted = collection.find_one_and_delete({"name": "foo"}, projection={"version": True})
+        assert deleted == {"_id": "a", "version": 1}
+        assert collection.find_one_and_delete({"_id": "a"}) is None
+        assert [document["_id"] for document in collection.find()] == ["b"]
+
+    def test_found_documents_are_copies(self):
+        """Modify a found document, then find it again.
+        Should not be modified"""
+        collection = MemoryCollection()
+        collection.insert_one({"_id": "a", "address": {"city": "foo"}})
+        collection.find_one({"_id": "a"})["address"]["city"] = "bar"
+        assert collection.find_one({"_id": "a"}, projection={"address.city": True, "_id": False}) == {
+            "address": {"city": "foo"}
+        }
+
+    def test_ttl_index(self):
+        """Insert a document past its expiration date on a collection with a TTL index, then insert another one.
+        Should delete the expired document"""
+        collection = MemoryCollection()
+        collection.create_indexes(TOMBSTONES_INDEXES)
+        now = datetime.now(timezone.utc)
+        collection.insert_one({"_id": "expired", "deleted": 1, "expires": now - timedelta(seconds=1)})
+        collection._expired_at = 0
+        collection.insert_one({"_id": "current", "deleted": 2, "expires": now + timedelta(days=1)})
+        assert [document["_id"] for document in collection.find()] == ["current"]
+
+    def test_unsupported_operator(self):
+        """Find documents using an unsupported query operator.
+        Should raise ValueError"""
+        collection = MemoryCollection()
+        collection.insert_one({"_id": "a"})
+        with pytest.raises(ValueError):
+            list(collection.find({"_id": {"$exists": True}, "name": {"$exists": True}}))
+
+
+class TestSnapshot:
+    def test_load_snapshot(self, tmp_path, monkeypatch):
+        """Load an exported snapshot (NDJSON) on the memory engine.
+        Should read the exported persons"""
+        people = [PersonRead(**document) for document in _documents(5)]
+        snapshot = tmp_path / "people.ndjson"
+        snapshot.write_text("\n".join(json.dumps(person.dict(), default=str) for person in people))
+
+        collection = MemoryCollection()
+        monkeypatch.setattr(storage_settings, "engine", StorageEngine.memory)
+        monkeypatch.setattr(storage_settings, "snapshot", str(snapshot))
+        monkeypatch.setattr(database, "collection", collection)
+        monkeypatch.setattr(repositories, "collection", collection)
+        database.load_snapshot()
+
+        for person in people:
+            assert PeopleRepository.get(person.person_id) == person
@@ -0,0 +1,126 @@
+"""TEST SYNC
+Test the incremental sync of persons: the changes (changed persons and tombstones of the deleted ones) since a sync
+token, paginated
+"""
+
+# # Installed # #
+import pytest
+import mongomock
+
+# # Project # #
+from people_api import repositories
+from people_api.exceptions import InvalidSyncTokenException, SyncTokenExpiredException, PersonNotFoundException
+from people_api.models import *
+from people_api.models.indexes import PEOPLE_INDEXES, TOMBSTONES_INDEXES
+from people_api.repositories import PeopleRepository
+from people_api.settings import api_settings
+from people_api.storage import MemoryCollection
+from people_api.utils import get_time, encode_token
+
+# # Package # #
+from .base import BaseTest
+from .utils import *
+
+
+def _sync(since, limit: int):
+    """Request the changes since the token until there are no more, returning the changed person ids and deleted ids
+    of each page, and the final sync token"""
+    pages = list()
+    while True:
+        changes = PeopleRepository.changes(since, limit=limit)
+        pages.append(([person.person_id for person in changes.people], [tomb.person_id for tomb in changes.deleted]))
+        since = changes.sync_token
+        if not changes.more:
+            return pages, since
+
+
+class TestChangesRepository:
+    @pytest.fixture(autouse=True, params=["memory", "mongomock"])
+    def _collections(self, request, monkeypatch):
+        if request.param == "memory":
+            collection, tombstones = MemoryCollection(), MemoryCollection()
+        else:
+            client = mongomock.MongoClient()
+            collection, tombstones = client["test"]["people"], client["test"]["people_tombstones"]
+        collection.create_indexes(PEOPLE_INDEXES)
+        tombstones.create_indexes(TOMBSTONES_INDEXES)
+        monkeypatch.setattr(repositories, "collection", collection)
+        monkeypatch.setattr(repositories, "tombstones_collection", tombstones)
+
+    def test_sync(self):
+        """Read all the persons, then delete and update some of them, and read the changes, page by page.
+        Should return the changed persons first, then the deleted ids, each one once"""
+        person_ids = [PeopleRepository.create(get_person_create()).person_id for _ in range(5)]
+        pages, token = _sync(None, limit=2)
+        assert [len(people) for people, _ in pages] == [2, 2, 1]
+        assert sorted(sum((people for people, _ in pages), [])) == sorted(person_ids)
+        assert not any(deleted for _, deleted in pages)
+
+        PeopleRepository.delete(person_ids[0])
+        PeopleRepository.delete_many(person_ids[1:3])
+        PeopleRepository.update(person_ids[3], PersonUpdate(name="Foo"))
+        pages, _ = _sync(token, limit=2)
+        # The persons written just before the previous sync are returned again (see _SYNC_OVERLAP)
+        assert [(len(people), len(deleted)) for people, deleted in pages] == [(2, 0), (0, 2), (0, 1)]
+        assert sorted(pages[0][0]) == sorted(person_ids[3:])
+        assert sorted(pages[1][1] + pages[2][1]) == sorted(person_ids[:3])
+
+    def test_overlapping_deletes(self):
+        """Delete persons in bulk, then delete again some of them (in bulk and single) along with others.
+        Should only delete (and return as deleted on the changes) each person once"""
+        person_ids = [PeopleRepository.create(get_person_create()).person_id for _ in range(3)]
+        _, token = _sync(None, limit=10)
+
+        results = PeopleRepository.delete_many(person_ids[:2])
+        assert [result.status_code for result in results.results] == [204, 204]
+        results = PeopleRepository.delete_many(person_ids[1:] + person_ids[2:])
+        assert [result.status_code for result in results.results] == [404, 204, 404]
+        with pytest.raises(PersonNotFoundException):
+            PeopleRepository.delete(person_ids[0])
+
+        pages, _ = _sync(token, limit=10)
+        assert sorted(sum((deleted for _, deleted in pages), [])) == sorted(person_ids)
+
+    def test_changed_fields(self):
+        """Read the changes, requesting some fields.
+        Should only return those fields"""
+        PeopleRepository.create(get_person_create(name="Foo"))
+        changes = PeopleRepository.changes(None, limit=10, fields={PersonField.name})
+        assert [person.dict() for person in changes.people] == [{"name": "Foo"}]
+
+    @pytest.mark.parametrize("token", ["invalid", encode_token([1, None]), encode_token(["1", None, "people", None])])
+    def test_invalid_token(self, token):
+        """Read the changes with an invalid sync token.
+        Should raise InvalidSyncTokenException"""
+        with pytest.raises(InvalidSyncTokenException):
+            PeopleRepository.changes(token)
+
+    def test_expired_token(self):
+        """Read the changes with a sync token older than the tombstones TTL.
+        Should raise SyncTokenExpiredException"""
+        since = get_time() - api_settings.tombstones_ttl - 10
+        with pytest.raises(SyncTokenExpiredException):
+            PeopleRepository.changes(encode_token([since, None, "people", None]))
+
+
+class TestChangesEndpoint(BaseTest):
+    def test_sync(self):
+        """Read all the persons, then create, update and delete persons, and read the changes.
+        Should return the written persons and the deleted ids"""
+        person_id, deleted_id = (self.create_person(get_person_create().dict()).json()["person_id"] for _ in range(2))
+        r = self.get_changes()
+        assert {person["person_id"] for person in r.json()["people"]} >= {person_id, deleted_id}
+        assert r.json()["more"] is False
+
+        self.update_person(person_id, {"name": "Foo"})
+        self.delete_person(deleted_id)
+        created_id = self.create_person(get_person_create().dict()).json()["person_id"]
+        changes = self.get_changes(since=r.json()["sync_token"]).json()
+        people = {person["person_id"]: person for person in changes["people"]}
+        assert people[person_id]["name"] == "Foo" and created_id in people and deleted_id not in people
+        assert deleted_id in {tombstone["person_id"] for tombstone in changes["deleted"]}
+
+    def test_invalid_token(self):
+        """Read the changes with an invalid sync token.
+        Should return 400"""
+        self.get_changes(statuscode=400, since="invalid")
@@ -1,5 +1,5 @@
 """TEST WRITE
-Test write actions (create, update, delete)
+Test write actions (create, update, delete), individually and in bulk
 """
 
 # # Native # #
@@ -9,8 +9,10 @@ from random import randint
 # # Project # #
 from people_api.models import *
 from people_api.repositories import PeopleRepository
+from people_api.utils import get_encoded_etag
 
 # # Installed # #
+import pytest
 import pydantic
 from freezegun import freeze_time
 from dateutil.relativedelta import relativedelta
@@ -149,3 +151,124 @@ class TestUpdate(BaseTest):
         assert read.updated == expected_timestamp
         assert read.updated != read.created
         assert read.created == person.created
+
+
+class TestConditionalUpdate(BaseTest):
+    def test_update_return_representation(self):
+        """Update a person asking for the representation.
+        Should return the updated person, with the same ETag as reading it"""
+        person = get_existing_person()
+        r = self.update_person(
+            person.person_id, {"name": "Foo"}, statuscode=statuscode.HTTP_200_OK,
+            headers={"Prefer": "return=representation"}
+        )
+        assert r.headers["Preference-Applied"] == "return=representation"
+        assert r.json() == {**person.dict(), "name": "Foo", "updated": r.json()["updated"]}
+        assert r.headers["ETag"] == self.get_person(person.person_id).headers["ETag"]
+
+    def test_update_if_match(self):
+        """Read a person, update it sending its ETag, then update it again sending the same ETag.
+        Should update it the first time, returning the new ETag, and return 412 the second time"""
+        person_id = get_existing_person().person_id
+        etag = self.get_person(person_id).headers["ETag"]
+
+        r = self.update_person(person_id, {"name": "Foo"}, headers={"If-Match": etag})
+        new_etag = r.headers["ETag"]
+        assert new_etag != etag
+        r = self.update_person(
+            person_id, {"name": "Bar"}, statuscode=statuscode.HTTP_412_PRECONDITION_FAILED, headers={"If-Match": etag}
+        )
+        assert r.json()["identifier"] == person_id
+
+        read = self.get_person(person_id)
+        assert read.json()["name"] == "Foo" and read.headers["ETag"] == new_etag
+
+    def test_update_if_match_fields_etag(self):
+        """Update a person sending the ETag of a partial read of it, and the ETag of its creation.
+        Should update it (the ETags identify the same revision)"""
+        r = self.create_person(get_person_create().dict())
+        person_id = r.json()["person_id"]
+        etag = self.get_person(person_id, fields="name").headers["ETag"]
+        assert r.headers["ETag"] != etag
+        self.update_person(person_id, {"name": "Foo"}, headers={"If-Match": f'"foo", {etag}, {r.headers["ETag"]}'})
+
+    def test_update_if_match_encoded_etag(self):
+        """Update a person sending the ETag of a compressed read of it.
+        Should update it (the ETag identifies the same revision)"""
+        person_id = get_existing_person().person_id
+        etag = get_encoded_etag(self.get_person(person_id).headers["ETag"], "gzip")
+        self.update_person(person_id, {"name": "Foo"}, headers={"If-Match": etag})
+
+    @pytest.mark.parametrize("if_match, expected", [
+        ("*", statuscode.HTTP_204_NO_CONTENT),
+        ('"invalid"', statuscode.HTTP_412_PRECONDITION_FAILED),
+    ])
+    def test_update_if_match_values(self, if_match, expected):
+        """Update a person sending If-Match any, and an ETag not generated by the API.
+        Should update it, and return 412"""
+        person_id = get_existing_person().person_id
+        self.update_person(person_id, {"name": "Foo"}, statuscode=expected, headers={"If-Match": if_match})
+
+    def test_update_if_match_nonexisting_person(self):
+        """Update a person that does not exist sending an ETag.
+        Should return not found 404"""
+        person_id = get_existing_person().person_id
+        etag = self.get_person(person_id).headers["ETag"]
+        self.update_person(
+            get_uuid(), {"name": "Foo"}, statuscode=statuscode.HTTP_404_NOT_FOUND, headers={"If-Match": etag}
+        )
+
+
+class TestBulk(BaseTest):
+    def test_create_people(self):
+        """Create multiple persons in bulk.
+        Should return the created persons, in order, and all of them should exist"""
+        creates = [get_person_create().dict() for _ in range(3)]
+
+        response = self.create_people(creates).json()
+        assert (response["succeeded"], response["failed"]) == (3, 0)
+
+        for index, (create, result) in enumerate(zip(creates, response["results"])):
+            assert result["index"] == index
+            assert result["status_code"] == statuscode.HTTP_201_CREATED
+            assert PersonAsCreate(**result["person"]).dict() == create
+            assert self.get_person(result["person_id"]).json() == result["person"]
+
+    def test_create_people_invalid(self):
+        """Create multiple persons in bulk, one of them being invalid; then create none.
+        Should return validation error 422"""
+        creates = [get_person_create().dict(), {"foo": "bar"}]
+        self.create_people(creates, statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.create_people([], statuscode=statuscode.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_update_people(self):
+        """Update multiple persons in bulk, one of them not existing.
+        Should update the existing ones, and return not found error for the other"""
+        people = [get_existing_person() for _ in range(2)]
+        nonexisting_id = get_uuid()
+        updates = [
+            {"person_id": people[0].person_id, "update": {"name": "foo"}},
+            {"person_id": nonexisting_id, "update": {"name": "bar"}},
+            {"person_id": people[1].person_id, "update": {"name": "baz"}}
+        ]
+
+        response = self.update_people(updates).json()
+        assert (response["succeeded"], response["failed"]) == (2, 1)
+        assert [r["status_code"] for r in response["results"]] == [204, 404, 204]
+        assert response["results"][1]["error"]["identifier"] == nonexisting_id
+
+        assert self.get_person(people[0].person_id).json()["name"] == "foo"
+        assert self.get_person(people[1].person_id).json()["name"] == "baz"
+
+    def test_delete_people(self):
+        """Delete multiple persons in bulk, one of them not existing.
+        Should delete the existing ones, and return not found error for the other"""
+        people = [get_existing_person() for _ in range(2)]
+        person_ids = [people[0].person_id, get_uuid(), people[1].person_id]
+
+        response = self.delete_people(person_ids).json()
+        assert [r["status_code"] for r in response["results"]] == [204, 404, 204]
+        assert response["results"][1]["error"]["identifier"] == person_ids[1]
+
+        for person in people:
+            self.get_person(person.person_id, statuscode=statuscode.HTTP_404_NOT_FOUND)
@@ -12,7 +12,7 @@ from people_api.repositories import PeopleRepository
 from people_api.utils import get_uuid
 
 __all__ = (
-    "get_person_create", "get_existing_person",
+    "get_address", "get_person_create", "get_existing_person",
     "get_uuid"
 )
 